@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Pre-aggregated review counts
+Counts reviews per (hotel, city, categories, sentiment bucket) group and day, with
+prefix sums over days, so dashboard panels cost O(cells touched) rather than O(reviews)
+"""
+
+import numpy as np
+
+from columns import concat_ranges
+
+DAY_BITS = 32
+DAY_OFFSET = np.iinfo(np.int32).min
+
+def _cell_keys(groups, days):
+    """Sortable int64 key per (group, day) cell"""
+    return (np.asarray(groups, dtype=np.int64) << DAY_BITS) | (np.asarray(days, dtype=np.int64) - DAY_OFFSET)
+
+class AggregateCube:
+    """Sparse cube of review counts keyed by group and epoch day
+
+    update() replaces arrays rather than mutating them, so a shallow copy is a
+    consistent read-only view of the cube at that point.
+    """
+
+    def __init__(self, num_buckets):
+        self.num_buckets = num_buckets
+        self.rows = 0
+
+        # Groups: one per distinct (hotel, city, categories, bucket) combination
+        self._group_ids = {}
+        self._group_attrs = []
+        self.group_hotel = np.empty(0, dtype=np.int32)
+        self.group_city = np.empty(0, dtype=np.int32)
+        self.group_category = np.empty(0, dtype=np.int32)
+        self.group_bucket = np.empty(0, dtype=np.int8)
+
+        # Cells sorted by (group, day); prefix[i] is the count of cells before i
+        self._keys = np.empty(0, dtype=np.int64)
+        self._counts = np.empty(0, dtype=np.int64)
+        self._prefix = np.zeros(1, dtype=np.int64)
+        self._years = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, hotel_code, city_code, category_code, buckets, days):
+        """Fold a batch of newly appended rows into the cube"""
+        if not len(days):
+            return
+
+        groups = np.stack([hotel_code, city_code, category_code, buckets], axis=1)
+        unique_groups, inverse = np.unique(groups, axis=0, return_inverse=True)
+        group_ids = np.array([self._group_id(tuple(group)) for group in unique_groups.tolist()], dtype=np.int64)
+        self._set_group_attrs(np.array(self._group_attrs, dtype=np.int64))
+        new_keys, new_counts = np.unique(_cell_keys(group_ids[inverse.reshape(-1)], days), return_counts=True)
+
+        # Merge with the existing cells, summing counts of cells present in both
+        keys = np.concatenate([self._keys, new_keys])
+        counts = np.concatenate([self._counts, new_counts])
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        counts = counts[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        self._keys = keys[starts]
+        self._counts = np.add.reduceat(counts, starts)
+        self._prefix = np.r_[0, np.cumsum(self._counts)]
+
+        cell_days = (self._keys & ((1 << DAY_BITS) - 1)) + DAY_OFFSET
+        self._years = cell_days.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+        self.rows += len(days)
+
+    def _set_group_attrs(self, attrs):
+        self.group_hotel = attrs[:, 0].astype(np.int32)
+        self.group_city = attrs[:, 1].astype(np.int32)
+        self.group_category = attrs[:, 2].astype(np.int32)
+        self.group_bucket = attrs[:, 3].astype(np.int8)
+
+    def _group_id(self, group):
+        group_id = self._group_ids.get(group)
+        if group_id is None:
+            group_id = len(self._group_attrs)
+            self._group_ids[group] = group_id
+            self._group_attrs.append(group)
+        return group_id
+
+    def to_arrays(self):
+        return {
+            'rows': np.array([self.rows], dtype=np.int64),
+            'groups': np.array(self._group_attrs, dtype=np.int64).reshape(-1, 4),
+            'keys': self._keys,
+            'counts': self._counts,
+            'prefix': self._prefix,
+            'years': self._years
+        }
+
+    @classmethod
+    def from_arrays(cls, num_buckets, arrays):
+        cube = cls(num_buckets)
+        cube.rows = int(arrays['rows'][0])
+        cube._group_attrs = [tuple(group) for group in arrays['groups'].tolist()]
+        cube._group_ids = {group: group_id for group_id, group in enumerate(cube._group_attrs)}
+        cube._set_group_attrs(arrays['groups'])
+        cube._keys = arrays['keys']
+        cube._counts = arrays['counts']
+        cube._prefix = arrays['prefix']
+        cube._years = arrays['years']
+        return cube
+
+    def select_groups(self, hotel_codes=None, city_codes=None):
+        """Group ids restricted to the given hotel and city codes (None means any)"""
+        mask = np.ones(len(self.group_hotel), dtype=bool)
+        if hotel_codes is not None:
+            mask &= np.isin(self.group_hotel, hotel_codes)
+        if city_codes is not None:
+            mask &= np.isin(self.group_city, city_codes)
+        return np.flatnonzero(mask)
+
+    def group_counts(self, groups, first_day, last_day):
+        """Reviews per group dated within [first_day, last_day], from the prefix sums"""
+        lo = np.searchsorted(self._keys, _cell_keys(groups, first_day), 'left')
+        hi = np.searchsorted(self._keys, _cell_keys(groups, last_day), 'right')
+        return self._prefix[hi] - self._prefix[lo]
+
+    def summarize(self, hotel_codes, city_codes, first_day, last_day, num_categories):
+        """Bucket counts, per-categories-string bucket counts and facets for a filter"""
+        groups = self.select_groups(hotel_codes, city_codes)
+        counts = self.group_counts(groups, first_day, last_day)
+        buckets = self.group_bucket[groups]
+        present = groups[counts > 0]
+        category_buckets = np.bincount(
+            self.group_category[groups].astype(np.int64) * self.num_buckets + buckets,
+            weights=counts, minlength=num_categories * self.num_buckets
+        )
+        return {
+            'buckets': np.bincount(buckets, weights=counts, minlength=self.num_buckets).astype(np.int64),
+            'category_buckets': category_buckets.astype(np.int64).reshape(-1, self.num_buckets),
+            'hotels': np.unique(self.group_hotel[present]),
+            'cities': np.unique(self.group_city[present])
+        }
+
+    def yearly(self, hotel_codes, city_codes, first_day):
+        """Bucket counts per calendar year for reviews dated on or after first_day"""
+        groups = self.select_groups(hotel_codes, city_codes)
+        lo = np.searchsorted(self._keys, _cell_keys(groups, first_day), 'left')
+        hi = np.searchsorted(self._keys, (groups.astype(np.int64) + 1) << DAY_BITS, 'left')
+        lengths = hi - lo
+        cells = concat_ranges(lo, lengths)
+        if not len(cells):
+            return {}
+
+        years = self._years[cells]
+        first_year = int(years.min())
+        num_years = int(years.max()) - first_year + 1
+        buckets = np.repeat(self.group_bucket[groups], lengths)
+        counts = np.bincount(
+            (years - first_year) * self.num_buckets + buckets,
+            weights=self._counts[cells], minlength=num_years * self.num_buckets
+        ).astype(np.int64).reshape(-1, self.num_buckets)
+
+        return {first_year + int(i): counts[i] for i in np.flatnonzero(counts.sum(axis=1))}
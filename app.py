@@ -4,349 +4,394 @@ AI Hospitality Sentiment Dashboard Server (Vercel Compatible)
 Serves the HTML dashboard and provides API endpoints for data
 """
 
-import csv
 import os
 import json
+import threading
+import time
 from datetime import datetime
 from flask import Flask, render_template_string, jsonify, request
 from flask_cors import CORS
 
+from category_classifier import CategoryClassifier
+from export import EXPORT_FORMATS, export_reviews
+from ingest import append_csv
+from metrics import Metrics, SlowRequestProfiler, finish_request, stage, start_request
+from pagination import Page, PageError, page_row_set, page_search, page_sorted
+from partitions import PartitionedDataset, is_partitioned
+from query_pool import QueryPool
+from response_cache import ResponseCache
+from row_scan import scan_rows
+from sentiment_scorer import LexiconScorer
+from sharded import ShardedExecutor
+from snapshot import load_dataset
+from review_store import (
+    ReviewStore, to_epoch_day, CATEGORIES, MISSING_DAY, MAX_DAY,
+    POSITIVE, NEGATIVE, NEUTRAL, UNDEFINED
+)
+
 app = Flask(__name__)
 CORS(app)
 
+# For Vercel deployment, we'll use a static CSV file
+DATA_FILE = os.environ.get('DATA_FILE', 'data.csv')  # You'll upload this as a static file
+SNAPSHOT_FILE = 'data.snapshot'  # Optional, compiled with: python snapshot.py
+
+# DATA_FILE may instead name a directory or glob of partition CSVs (say one per month or city),
+# loaded on first use; their manifest defaults to manifest.json beside them
+DATA_MANIFEST = os.environ.get('DATA_MANIFEST')
+
+# /api/data response cache; RESPONSE_CACHE_MB=0 disables it
+RESPONSE_CACHE_MB = float(os.environ.get('RESPONSE_CACHE_MB', 32))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 300))
+RESPONSE_GZIP = os.environ.get('RESPONSE_GZIP', '1') != '0'
+
+# Top keywords: 'exact', or 'approx' to merge counts through at most KEYWORD_CAPACITY counters
+KEYWORD_MODE = os.environ.get('KEYWORD_MODE', 'exact')
+KEYWORD_CAPACITY = int(os.environ.get('KEYWORD_CAPACITY', 1024))
+
+# Worker processes for row-level query work on stores of at least SHARD_THRESHOLD reviews (0 = in-process)
+SHARD_WORKERS = int(os.environ.get('SHARD_WORKERS', 0))
+SHARD_THRESHOLD = int(os.environ.get('SHARD_THRESHOLD', 1000000))
+
+# Threads computing uncached /api/data responses (0 = the request thread)
+QUERY_WORKERS = int(os.environ.get('QUERY_WORKERS', 0))
+
+# Scores reviews loaded without a sentiment: 'none' (stored as 0.0) or 'lexicon', across
+# SCORER_WORKERS processes, with scores kept by text hash in SENTIMENT_CACHE_FILE if set
+SENTIMENT_SCORER = os.environ.get('SENTIMENT_SCORER', 'none')
+SCORER_WORKERS = int(os.environ.get('SCORER_WORKERS', 0))
+SENTIMENT_CACHE_FILE = os.environ.get('SENTIMENT_CACHE_FILE')
+
+# JSON table mapping raw review categories to the standard ones (see category_classifier.py)
+CATEGORY_RULES_FILE = os.environ.get('CATEGORY_RULES_FILE')
+
+# Sampling profiler: stacks of requests slower than PROFILE_SLOW_MS are written to PROFILE_DIR (0 disables it)
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 0))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
 # Global variables
-reviews_data = []
+ingest_store = ReviewStore()  # Receives new rows on refresh
+review_store = ingest_store.view()  # Published read-only view used by requests
+load_stats = {}
+load_duration = 0.0  # Seconds the last load or refresh took
 last_updated = None
+refresh_lock = threading.Lock()
+data_version = 0  # Bumped whenever a new store is published
+response_cache = ResponseCache(int(RESPONSE_CACHE_MB * (1 << 20)), RESPONSE_CACHE_TTL)
+sharded_executor = ShardedExecutor(SHARD_WORKERS, SHARD_THRESHOLD)
+query_pool = QueryPool(QUERY_WORKERS)
+metrics = Metrics()
+profiler = SlowRequestProfiler(PROFILE_SLOW_MS, PROFILE_INTERVAL_MS, PROFILE_DIR)
+sentiment_scorer = LexiconScorer(SCORER_WORKERS, SENTIMENT_CACHE_FILE) if SENTIMENT_SCORER == 'lexicon' else None
+category_classifier = CategoryClassifier.from_file(CATEGORY_RULES_FILE) if CATEGORY_RULES_FILE else None
+partitioned_data = PartitionedDataset(DATA_FILE, DATA_MANIFEST, sentiment_scorer) if is_partitioned(DATA_FILE) else None
+
+scores_saved = 0  # sentiment_scorer.scored when its cache was last saved
+
+def save_scores():
+    """Persist the sentiment cache when reviews were scored since it was last saved"""
+    global scores_saved
+    if sentiment_scorer is None or sentiment_scorer.scored == scores_saved:
+        return
+    print(f"Scored {sentiment_scorer.scored - scores_saved} reviews without a sentiment "
+          f"using the {sentiment_scorer.name} scorer")
+    scores_saved = sentiment_scorer.scored
+    try:
+        sentiment_scorer.save()
+    except OSError as e:
+        print(f"Could not save sentiment cache {SENTIMENT_CACHE_FILE}: {str(e)}")
+
+def row_problems(stats):
+    """Summary of the rows a load dropped or read only in part"""
+    return (f"{stats['malformed']} malformed rows, {stats['skipped']} rows without hotel or review text, "
+            f"{stats.get('ragged', 0)} rows with a field count that does not match the header")
 
 def load_real_data():
     """Load real data from CSV file"""
-    reviews = []
+    global load_stats
     
-    # For Vercel deployment, we'll use a static CSV file
-    csv_file = 'data.csv'  # You'll upload this as a static file
+    csv_file = DATA_FILE
+    snapshot_file = SNAPSHOT_FILE
     
-    if os.path.exists(csv_file):
+    if partitioned_data is not None:
         try:
-            # Try different encodings to handle various file formats
-            encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-            file_loaded = False
-            
-            for encoding in encodings:
-                try:
-                    temp_reviews = []
-                    
-                    with open(csv_file, 'r', encoding=encoding) as file:
-                        reader = csv.DictReader(file)
-                        file_reviews = 0
-                        
-                        # Get column names for processing
-                        columns = reader.fieldnames
-                        
-                        for row in reader:
-                            # Handle different column structures
-                            hotel_name = row.get('hotel_name', '') or row.get('Hotel Name', '') or row.get('hotel', '')
-                            city = row.get('city', '') or row.get('City', '') or row.get('location', '')
-                            review_text = row.get('review_text', '') or row.get('Review Text', '') or row.get('review', '')
-                            sentiment = row.get('sentiment', '') or row.get('Sentiment', '') or row.get('sentiment_score', '')
-                            rating = row.get('rating', '') or row.get('Rating', '') or row.get('score', '')
-                            date = row.get('date', '') or row.get('Date', '') or row.get('review_date', '')
-                            categories = row.get('categories', '') or row.get('Categories', '') or row.get('category', '')
-                            keywords = row.get('keywords', '') or row.get('Keywords', '') or row.get('keyword', '')
-                            
-                            # Skip empty rows
-                            if not review_text or not hotel_name:
-                                continue
-                            
-                            # Convert rating to float if possible
-                            try:
-                                rating_float = float(rating) if rating else 0.0
-                            except (ValueError, TypeError):
-                                rating_float = 0.0
-                            
-                            # Convert sentiment to float if possible
-                            try:
-                                sentiment_float = float(sentiment) if sentiment else 0.0
-                            except (ValueError, TypeError):
-                                sentiment_float = 0.0
-                            
-                            review = {
-                                'hotel_name': hotel_name.strip(),
-                                'city': city.strip(),
-                                'review_text': review_text.strip(),
-                                'sentiment': sentiment_float,
-                                'rating': rating_float,
-                                'date': date.strip(),
-                                'categories': categories.strip(),
-                                'keywords': keywords.strip()
-                            }
-                            
-                            temp_reviews.append(review)
-                            file_reviews += 1
-                    
-                    if temp_reviews:
-                        reviews.extend(temp_reviews)
-                        file_loaded = True
-                        print(f"Loaded {file_reviews} reviews from {csv_file} using {encoding} encoding")
-                        break
-                        
-                except Exception as e:
-                    print(f"Failed to load {csv_file} with {encoding} encoding: {str(e)}")
-                    continue
-            
-            if not file_loaded:
-                print(f"Could not load {csv_file} with any encoding")
-                
+            # Only the manifest is read here; requests load the partitions they need
+            partitioned_data.reset()
+            partitioned_data.update_manifest()
+            load_stats = partitioned_data.stats()
+            print(f"Found {load_stats['rows']} reviews in {load_stats['partitions']} partitions of {csv_file} "
+                  f"({row_problems(load_stats)})")
+            save_scores()
+            return ReviewStore(category_classifier)
+        except Exception as e:
+            print(f"Error loading {csv_file}: {str(e)}")
+    elif os.path.exists(csv_file) or os.path.exists(snapshot_file):
+        try:
+            # Memory-map the snapshot when it is current, else stream the CSV in chunks
+            reviews, load_stats = load_dataset(csv_file, snapshot_file, sentiment_scorer, category_classifier)
+            if 'snapshot' not in load_stats:
+                print(f"Loaded {load_stats['rows']} reviews from {csv_file} using {load_stats['encoding']} encoding "
+                      f"({row_problems(load_stats)})")
+            save_scores()
+            return reviews
         except Exception as e:
             print(f"Error loading {csv_file}: {str(e)}")
     else:
         print(f"File {csv_file} not found")
     
-    return reviews
+    load_stats = {}
+    return ReviewStore()
+
+def refresh_reviews(full=False):
+    """Ingest rows appended to the data file, reloading it when it was rewritten"""
+    global ingest_store, review_store, load_stats, load_duration, last_updated, data_version
+    
+    with refresh_lock:
+        started = time.perf_counter()
+        stats = None
+        rows_before = len(ingest_store)
+        if not full and partitioned_data is not None:
+            try:
+                if partitioned_data.refresh(ingest_store):
+                    stats = partitioned_data.stats()
+            except Exception as e:
+                print(f"Incremental refresh of {DATA_FILE} failed: {str(e)}")
+        elif not full and os.path.exists(DATA_FILE):
+            try:
+                stats = append_csv(ingest_store, DATA_FILE, load_stats, scorer=sentiment_scorer)
+            except Exception as e:
+                print(f"Incremental refresh of {DATA_FILE} failed: {str(e)}")
+        
+        if stats is None:
+            mode = 'full'
+            ingest_store = load_real_data()
+        else:
+            mode = 'incremental'
+            if len(ingest_store) > rows_before:
+                print(f"Appended {len(ingest_store) - rows_before} reviews from {DATA_FILE}")
+            load_stats = stats
+            save_scores()
+        
+        # Publish with a single assignment; requests in flight keep the view they started with
+        review_store = ingest_store.view()
+        publish_shards(review_store)
+        load_duration = time.perf_counter() - started
+        last_updated = datetime.now()
+        data_version += 1
+        response_cache.clear()
+    
+    return mode
 
-def extract_keywords(text):
-    """Extract keywords from text"""
-    if not text:
-        return []
+def require_partitions(hotel_filter=None, city_filter=None, first_day=MISSING_DAY, last_day=MAX_DAY):
+    """Published store, once it holds every partition that can match the filters
     
-    # Simple keyword extraction
-    import re
-    words = re.findall(r'\b\w+\b', text.lower())
+    Partitions the filters rule out stay unloaded. Loading one only adds rows
+    that earlier requests' filters ruled out, so cached responses stay valid.
+    """
+    global review_store, ingest_store, data_version
     
-    # Filter out common stop words
-    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our', 'their'}
+    if partitioned_data is None or not partitioned_data.unloaded(hotel_filter, city_filter, first_day, last_day):
+        return review_store
     
-    keywords = [word for word in words if len(word) > 2 and word not in stop_words]
-    return keywords[:10]  # Return top 10 keywords
+    with refresh_lock, stage('partitions'):
+        # Another request may have loaded them while this one waited
+        partitions = partitioned_data.unloaded(hotel_filter, city_filter, first_day, last_day)
+        if partitions:
+            try:
+                added = partitioned_data.load(ingest_store, partitions)
+                print(f"Loaded {added} reviews from {len(partitions)} partitions of {DATA_FILE}")
+            except Exception as e:
+                print(f"Error loading partitions of {DATA_FILE}: {str(e)}")
+                if not partitioned_data.holds_loaded(ingest_store):
+                    # Part of a partition went in; start again from an empty store
+                    # rather than publish rows its stats do not account for
+                    ingest_store = load_real_data()
+                    data_version += 1
+                    response_cache.clear()
+            review_store = ingest_store.view()
+            publish_shards(review_store)
+            save_scores()
+        return review_store
 
-def get_top_keywords(reviews, limit=20):
-    """Get top keywords from reviews"""
-    keyword_counts = {}
+def refresh_in_background(full=False):
+    """Start refresh_reviews on a background thread; returns False if a refresh is already running"""
+    if refresh_lock.locked():
+        return False
     
-    for review in reviews:
-        # Use existing keywords if available
-        if review.get('keywords'):
-            try:
-                # Parse existing keywords (format: "keyword1:count1, keyword2:count2")
-                keyword_pairs = review['keywords'].split(',')
-                for pair in keyword_pairs:
-                    if ':' in pair:
-                        keyword, count = pair.split(':', 1)
-                        keyword = keyword.strip()
-                        try:
-                            count = int(count.strip())
-                            keyword_counts[keyword] = keyword_counts.get(keyword, 0) + count
-                        except ValueError:
-                            keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
-                    else:
-                        keyword = pair.strip()
-                        if keyword:
-                            keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
-            except:
-                # Fallback: extract keywords from review text
-                keywords = extract_keywords(review.get('review_text', ''))
-                for keyword in keywords:
-                    keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
-        else:
-            # Extract keywords from review text
-            keywords = extract_keywords(review.get('review_text', ''))
-            for keyword in keywords:
-                keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
+    def run():
+        try:
+            refresh_reviews(full)
+        except Exception as e:
+            print(f"Background refresh failed: {str(e)}")
     
-    # Sort by count and return top keywords
-    sorted_keywords = sorted(keyword_counts.items(), key=lambda x: x[1], reverse=True)
-    return sorted_keywords[:limit]
+    threading.Thread(target=run, name='refresh', daemon=True).start()
+    return True
 
-def get_category_sentiment_data(reviews):
+def publish_shards(store):
+    """Hand a newly published store to the worker pool, if sharding applies to it"""
+    try:
+        if sharded_executor.publish(store):
+            print(f"Sharded {len(store)} reviews across {sharded_executor.workers} workers")
+    except Exception as e:
+        # Queries fall back to running in-process
+        print(f"Could not shard reviews: {str(e)}")
+
+def keyword_list(store, keyword_ids, totals):
+    """(keyword, count) pairs for keyword ids"""
+    return [(store.vocabulary.values[keyword_id], int(total)) for keyword_id, total in zip(keyword_ids, totals)]
+
+def get_top_keywords(store, rows=None, limit=20, filters=None, capacity=None):
+    """Get top keywords from reviews
+    
+    filters (hotel codes, city codes, first day, last day) merge the precomputed
+    per-hotel/day counters instead of counting rows. capacity trades exactness
+    for bounded memory. Ties keep the order keywords were first seen in.
+    """
+    if filters is not None:
+        keyword_ids, totals = store.keyword_cells.top(*filters, limit, capacity)
+    else:
+        keyword_ids, totals = store.top_keywords(rows, limit, capacity)
+    
+    return keyword_list(store, keyword_ids, totals)
+
+def get_category_sentiment_data(store, category_buckets):
     """Get sentiment data by category"""
-    categories = ['room_quality', 'service_staff', 'food_dining', 'location', 'facilities', 'digital_experience', 'business_services']
-    category_data = {cat: {'positive': 0, 'negative': 0, 'neutral': 0} for cat in categories}
+    # Expand per-categories-string bucket counts to standard categories
+    totals = store.category_weights.T @ category_buckets
     
-    for review in reviews:
-        sentiment = review.get('sentiment', 0)
-        review_categories = review.get('categories', '')
-        
-        # Parse categories (handle multiple categories per review)
-        category_list = []
-        if review_categories:
-            # Split by various delimiters
-            for delimiter in [';', ',', ' and ', ' & ']:
-                if delimiter in review_categories:
-                    category_list = [cat.strip().lower() for cat in review_categories.split(delimiter)]
-                    break
-            
-            if not category_list:
-                category_list = [review_categories.strip().lower()]
-        
-        # Map to standard categories
-        mapped_categories = []
-        for cat in category_list:
-            clean_cat = cat.strip().lower()
-            if any(keyword in clean_cat for keyword in ['room', 'bed', 'bathroom', 'clean', 'comfort', 'space', 'size']):
-                mapped_categories.append('room_quality')
-            elif any(keyword in clean_cat for keyword in ['business', 'meeting', 'conference', 'corporate', 'work', 'office']):
-                mapped_categories.append('business_services')
-            elif any(keyword in clean_cat for keyword in ['service', 'staff', 'concierge', 'reception', 'hospitality', 'helpful', 'friendly']):
-                mapped_categories.append('service_staff')
-            elif any(keyword in clean_cat for keyword in ['food', 'dining', 'restaurant', 'breakfast', 'meal', 'cuisine', 'bar']):
-                mapped_categories.append('food_dining')
-            elif any(keyword in clean_cat for keyword in ['location', 'area', 'neighborhood', 'access', 'convenient', 'central', 'near']):
-                mapped_categories.append('location')
-            elif any(keyword in clean_cat for keyword in ['facility', 'facilities', 'amenity', 'amenities', 'pool', 'gym', 'spa', 'fitness', 'wellness', 'equipment', 'infrastructure']):
-                mapped_categories.append('facilities')
-            elif any(keyword in clean_cat for keyword in ['digital', 'online', 'app', 'wifi', 'internet', 'technology', 'booking', 'mobile', 'web', 'electronic']):
-                mapped_categories.append('digital_experience')
-        
-        # If no specific categories found, default to room_quality
-        if not mapped_categories:
-            mapped_categories = ['room_quality']
-        
-        # Add review to each identified category
-        for category in mapped_categories:
-            if category in category_data:
-                if sentiment > 0.1:
-                    category_data[category]['positive'] += 1
-                elif sentiment < -0.1:
-                    category_data[category]['negative'] += 1
-                else:
-                    category_data[category]['neutral'] += 1
+    category_data = {}
+    for i, category in enumerate(CATEGORIES):
+        category_data[category] = {
+            'positive': int(totals[i, POSITIVE]),
+            'negative': int(totals[i, NEGATIVE]),
+            'neutral': int(totals[i, NEUTRAL] + totals[i, UNDEFINED])
+        }
     
     return category_data
 
-def get_year_over_year_data(reviews):
+def get_year_over_year_data(yearly_buckets):
     """Get year-over-year trend data"""
     yearly_data = {}
     
-    for review in reviews:
-        date_str = review.get('date', '')
-        if not date_str:
-            continue
-            
-        try:
-            # Handle different date formats
-            if '/' in date_str:
-                # Format: M/D/YYYY or MM/DD/YYYY
-                date_obj = datetime.strptime(date_str, '%m/%d/%Y')
-            else:
-                # Format: YYYY-MM-DD
-                date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-            
-            year = date_obj.year
-            if year not in yearly_data:
-                yearly_data[year] = {'positive': 0, 'negative': 0, 'neutral': 0, 'total': 0}
-            
-            sentiment = review.get('sentiment', 0)
-            if sentiment > 0.1:
-                yearly_data[year]['positive'] += 1
-            elif sentiment < -0.1:
-                yearly_data[year]['negative'] += 1
-            else:
-                yearly_data[year]['neutral'] += 1
-            
-            yearly_data[year]['total'] += 1
-            
-        except ValueError:
-            continue
+    for year, buckets in yearly_buckets.items():
+        yearly_data[year] = {
+            'positive': int(buckets[POSITIVE]),
+            'negative': int(buckets[NEGATIVE]),
+            'neutral': int(buckets[NEUTRAL] + buckets[UNDEFINED]),
+            'total': int(buckets.sum())
+        }
     
     return yearly_data
 
-def filter_by_date(reviews, start_date=None, end_date=None):
-    """Filter reviews by date range"""
-    if not start_date and not end_date:
-        return reviews
-    
-    filtered_reviews = []
-    for review in reviews:
-        date_str = review.get('date', '')
-        if not date_str:
-            continue
-            
-        try:
-            if '/' in date_str:
-                date_obj = datetime.strptime(date_str, '%m/%d/%Y')
-            else:
-                date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-            
-            if start_date and date_obj < start_date:
-                continue
-            if end_date and date_obj > end_date:
-                continue
-                
-            filtered_reviews.append(review)
-        except ValueError:
-            continue
+def get_filter_codes(store, hotel_filter=None, city_filter=None):
+    """Hotel and city codes selected by the filters (None means no filter)"""
+    hotel_codes = None
+    city_codes = None
     
-    return filtered_reviews
-
-def filter_trend_by_hotel_city(reviews, hotel_filter=None, city_filter=None):
-    """Filter trend data by hotel or city"""
-    if not hotel_filter and not city_filter:
-        # Aggregate all data into "Total (All Hotels)"
-        return get_year_over_year_data(reviews)
-    
-    filtered_reviews = []
-    for review in reviews:
-        if hotel_filter and hotel_filter != 'all' and review.get('hotel_name', '').lower() != hotel_filter.lower():
-            continue
-        if city_filter and city_filter != 'all' and review.get('city', '').lower() != city_filter.lower():
-            continue
-        filtered_reviews.append(review)
-    
-    return get_year_over_year_data(filtered_reviews)
-
-def get_data(hotel_filter=None, city_filter=None, search_filter=None, start_date=None, end_date=None):
-    """Get filtered data for dashboard"""
-    global reviews_data
-    
-    # Filter by date range
-    filtered_reviews = filter_by_date(reviews_data, start_date, end_date)
-    
-    # Apply other filters
     if hotel_filter and hotel_filter != 'all':
-        filtered_reviews = [r for r in filtered_reviews if r.get('hotel_name', '').lower() == hotel_filter.lower()]
+        hotel_codes = store.hotels.codes_matching(hotel_filter)
     
     if city_filter and city_filter != 'all':
-        filtered_reviews = [r for r in filtered_reviews if r.get('city', '').lower() == city_filter.lower()]
+        city_codes = store.cities.codes_matching(city_filter)
+    
+    return hotel_codes, city_codes
+
+def get_day_range(start_date=None, end_date=None):
+    """Inclusive epoch-day range for the date filters"""
+    if not start_date and not end_date:
+        return MISSING_DAY, MAX_DAY
     
+    # Reviews without a parseable date never match a date filter
+    first_day = to_epoch_day(start_date) if start_date else MISSING_DAY + 1
+    last_day = to_epoch_day(end_date) if end_date else MAX_DAY
+    return first_day, last_day
+
+def filter_trend_by_hotel_city(store, hotel_codes=None, city_codes=None):
+    """Filter trend data by hotel or city"""
+    return get_year_over_year_data(store.cube.yearly(hotel_codes, city_codes, MISSING_DAY + 1))
+
+def get_data(hotel_filter=None, city_filter=None, search_filter=None, start_date=None, end_date=None, keyword_mode=None, page=None):
+    """Get filtered data for dashboard; page selects the table rows (first 20 by default)"""
+    page = page or Page()
+    with stage('filters'):
+        first_day, last_day = get_day_range(start_date, end_date)
+        store = require_partitions(hotel_filter, city_filter, first_day, last_day)
+        hotel_codes, city_codes = get_filter_codes(store, hotel_filter, city_filter)
+    filters = (hotel_codes, city_codes, first_day, last_day)
+    capacity = KEYWORD_CAPACITY if (keyword_mode or KEYWORD_MODE) == 'approx' else None
+    
+    # Answer counts from the aggregate cube; only free-text search needs the rows.
+    # A search is one fused scan, split across the worker pool for large stores,
+    # which also finds the first page in load order
+    scan = None
     if search_filter:
-        search_lower = search_filter.lower()
-        filtered_reviews = [r for r in filtered_reviews if search_lower in r.get('review_text', '').lower()]
+        with stage('scan'):
+            scan = sharded_executor.query(store, filters, search_filter, capacity, page.limit + 1)
+            if scan is None:
+                scan = scan_rows(store, filters, search_filter, capacity, page.limit + 1)
+            summary = scan.summary()
+        with stage('page'):
+            if page.from_start:
+                table_rows, next_cursor = page_row_set(store, scan.first_rows, page)
+            else:
+                table_rows, next_cursor = page_search(store, page, search_filter, filters)
+    else:
+        with stage('summary'):
+            summary = store.cube.summarize(hotel_codes, city_codes, first_day, last_day, len(store.categories))
+        with stage('page'):
+            table_rows, next_cursor = page_sorted(store, page, lambda rows: store.filter_mask(*filters, rows))
     
     # Calculate KPIs
-    total_reviews = len(filtered_reviews)
-    positive_reviews = len([r for r in filtered_reviews if r.get('sentiment', 0) > 0.1])
-    negative_reviews = len([r for r in filtered_reviews if r.get('sentiment', 0) < -0.1])
-    neutral_reviews = len([r for r in filtered_reviews if -0.1 <= r.get('sentiment', 0) <= 0.1])
+    buckets = summary['buckets']
+    total_reviews = int(buckets.sum())
+    positive_reviews = int(buckets[POSITIVE])
+    negative_reviews = int(buckets[NEGATIVE])
+    neutral_reviews = int(buckets[NEUTRAL])
     
     positive_percentage = (positive_reviews / total_reviews * 100) if total_reviews > 0 else 0
     negative_percentage = (negative_reviews / total_reviews * 100) if total_reviews > 0 else 0
     net_sentiment = positive_percentage - negative_percentage
     
     # Get unique hotels and cities
-    hotels = sorted(list(set([r.get('hotel_name', '') for r in filtered_reviews if r.get('hotel_name')])))
-    cities = sorted(list(set([r.get('city', '') for r in filtered_reviews if r.get('city')])))
+    with stage('facets'):
+        hotels = sorted(set(store.hotels.values[code] for code in summary['hotels']) - {''})
+        cities = sorted(set(store.cities.values[code] for code in summary['cities']) - {''})
     
     # Get top keywords
-    top_keywords = get_top_keywords(filtered_reviews)
+    with stage('keywords'):
+        if scan is not None:
+            top_keywords = keyword_list(store, *scan.top_keywords(20))
+        else:
+            top_keywords = get_top_keywords(store, filters=filters, capacity=capacity)
     
     # Get category sentiment data
-    category_data = get_category_sentiment_data(filtered_reviews)
-    
-    # Get trend data (always use full dataset, not date-filtered)
-    trend_data = filter_trend_by_hotel_city(reviews_data, hotel_filter, city_filter)
-    
-    # Prepare table data (limit to 20 rows for performance)
-    table_data = []
-    for review in filtered_reviews[:20]:
-        table_data.append({
-            'hotel_name': review.get('hotel_name', ''),
-            'city': review.get('city', ''),
-            'review_text': review.get('review_text', '')[:200] + '...' if len(review.get('review_text', '')) > 200 else review.get('review_text', ''),
-            'sentiment': review.get('sentiment', 0),
-            'rating': review.get('rating', 0),
-            'date': review.get('date', ''),
-            'categories': review.get('categories', ''),
-            'keywords': review.get('keywords', '')
-        })
+    with stage('categories'):
+        category_data = get_category_sentiment_data(store, summary['category_buckets'])
+    
+    # Get trend data (always use full dataset, not date-filtered); partitioned
+    # data keeps it in the manifest, so date filters can leave partitions unloaded
+    with stage('trend'):
+        if partitioned_data is not None:
+            trend_data = get_year_over_year_data(partitioned_data.yearly(hotel_filter, city_filter))
+        else:
+            trend_data = filter_trend_by_hotel_city(store, hotel_codes, city_codes)
+    
+    # Prepare table data, one page at a time
+    with stage('table'):
+        table_data = []
+        for i in table_rows:
+            review = store.row(i)
+            table_data.append({
+                'hotel_name': review.get('hotel_name', ''),
+                'city': review.get('city', ''),
+                'review_text': review.get('review_text', '')[:200] + '...' if len(review.get('review_text', '')) > 200 else review.get('review_text', ''),
+                'sentiment': review.get('sentiment', 0),
+                'rating': review.get('rating', 0),
+                'date': review.get('date', ''),
+                'categories': review.get('categories', ''),
+                'keywords': review.get('keywords', '')
+            })
     
     return {
         'total_reviews': total_reviews,
@@ -362,19 +407,56 @@ def get_data(hotel_filter=None, city_filter=None, search_filter=None, start_date
         'category_data': category_data,
         'trend_data': trend_data,
         'table_data': table_data,
+        'next_cursor': next_cursor,
         'last_updated': last_updated.isoformat() if last_updated else None
     }
 
 # Load data on startup
 try:
-    reviews_data = load_real_data()
+    started = time.perf_counter()
+    ingest_store = load_real_data()
+    review_store = ingest_store.view()
     last_updated = datetime.now()
-    print(f"Data loaded successfully: {len(reviews_data)} reviews")
+    print(f"Data loaded successfully: {len(review_store)} reviews")
+    publish_shards(review_store)
+    load_duration = time.perf_counter() - started
 except Exception as e:
     print(f"Error loading data: {str(e)}")
-    reviews_data = []
+    ingest_store = ReviewStore()
+    review_store = ingest_store.view()
     last_updated = datetime.now()
 
+@app.before_request
+def start_timing():
+    """Time every request and sample its stacks when the profiler is on"""
+    start_request()
+    profiler.begin()
+
+@app.after_request
+def finish_timing(response):
+    """Record request latency and report stage timings as a Server-Timing header"""
+    timer = finish_request()
+    if timer is None:
+        return response
+    
+    elapsed = timer.elapsed()
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe(route, response.status_code, elapsed, timer.stages)
+    response.headers['Server-Timing'] = timer.server_timing(elapsed)
+    try:
+        path = profiler.end(route, elapsed)
+        if path:
+            print(f"Slow request {request.full_path} took {elapsed * 1000:.0f} ms; stacks written to {path}")
+    except Exception as e:
+        print(f"Could not write request profile: {str(e)}")
+    return response
+
+@app.teardown_request
+def abandon_timing(error=None):
+    """Drop the timer and samples of a request that failed before after_request"""
+    if finish_request() is not None:
+        profiler.end('', 0)
+
 @app.route('/')
 def index():
     """Serve the main dashboard"""
@@ -385,19 +467,18 @@ def index():
     except Exception as e:
         return f"Error loading dashboard: {str(e)}", 500
 
-@app.route('/api/data')
-def api_data():
-    """API endpoint for dashboard data"""
-    hotel_filter = request.args.get('hotel', 'all')
-    city_filter = request.args.get('city', 'all')
-    search_filter = request.args.get('search', '')
+def parse_filters(args):
+    """Hotel, city, search, start date and end date filters from query parameters"""
+    hotel_filter = args.get('hotel', 'all')
+    city_filter = args.get('city', 'all')
+    search_filter = args.get('search', '')
     
     # Parse date filters
     start_date = None
     end_date = None
     
-    start_date_str = request.args.get('startDate', '')
-    end_date_str = request.args.get('endDate', '')
+    start_date_str = args.get('startDate', '')
+    end_date_str = args.get('endDate', '')
     
     if start_date_str:
         try:
@@ -411,20 +492,155 @@ def api_data():
         except ValueError:
             pass
     
-    data = get_data(hotel_filter, city_filter, search_filter, start_date, end_date)
-    return jsonify(data)
+    return hotel_filter, city_filter, search_filter, start_date, end_date
+
+@app.route('/api/data')
+def api_data():
+    """API endpoint for dashboard data"""
+    with stage('parse'):
+        hotel_filter, city_filter, search_filter, start_date, end_date = parse_filters(request.args)
+        keyword_mode = request.args.get('keywordMode') or KEYWORD_MODE
+        try:
+            page = Page.from_args(request.args, 20)
+        except PageError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    # Filters are case-insensitive, and unparseable dates are ignored
+    version = data_version
+    key = (
+        version,
+        None if not hotel_filter or hotel_filter == 'all' else hotel_filter.lower(),
+        None if not city_filter or city_filter == 'all' else city_filter.lower(),
+        search_filter.lower(),
+        start_date.date().isoformat() if start_date else None,
+        end_date.date().isoformat() if end_date else None,
+        keyword_mode == 'approx',
+        page.key()
+    )
+    with stage('cache'):
+        entry = response_cache.get(key)
+    if entry is None:
+        # Concurrent requests for the same response share one computation on the query pool
+        entry = query_pool.run(
+            key, build_data_response, key, hotel_filter, city_filter, search_filter, start_date, end_date, keyword_mode, page
+        )
+    
+    with stage('encode'):
+        return cached_response(key, entry)
+
+def build_data_response(key, hotel_filter, city_filter, search_filter, start_date, end_date, keyword_mode, page):
+    """Compute, serialize and cache one /api/data response"""
+    data = get_data(hotel_filter, city_filter, search_filter, start_date, end_date, keyword_mode, page)
+    with stage('serialize'):
+        response = jsonify(data)
+        return response_cache.put(key, response.get_data(), response.mimetype)
+
+def cached_response(key, entry):
+    """Response for a cache entry, honouring If-None-Match and Accept-Encoding"""
+    response = app.response_class(entry.body, mimetype=entry.mimetype)
+    response.vary.add('Accept-Encoding')
+    
+    # Each encoding is a separate representation with its own ETag
+    if RESPONSE_GZIP and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.set_etag(entry.etag + '-gzip')
+        response.make_conditional(request)
+        if response.status_code != 304:
+            response.set_data(response_cache.gzip_body(key, entry))
+            response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response.set_etag(entry.etag)
+        response.make_conditional(request)
+    return response
+
+@app.route('/api/export')
+def export_data():
+    """Stream every review matching the /api/data filters as NDJSON (default) or CSV"""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    with stage('filters'):
+        hotel_filter, city_filter, search_filter, start_date, end_date = parse_filters(request.args)
+        first_day, last_day = get_day_range(start_date, end_date)
+        store = require_partitions(hotel_filter, city_filter, first_day, last_day)
+        hotel_codes, city_codes = get_filter_codes(store, hotel_filter, city_filter)
+    compress = RESPONSE_GZIP and 'gzip' in request.headers.get('Accept-Encoding', '')
+    
+    mimetype, filename = EXPORT_FORMATS[export_format]
+    chunks = export_reviews(store, (hotel_codes, city_codes, first_day, last_day), search_filter, export_format, compress)
+    response = app.response_class(chunks, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.vary.add('Accept-Encoding')
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@app.route('/api/cache-stats')
+def cache_stats():
+    """Response cache counters"""
+    return jsonify(dict(response_cache.stats(), data_version=data_version))
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Request latency, stage timings, data and cache figures in the Prometheus text format"""
+    cache = response_cache.stats()
+    pool = query_pool.stats()
+    partitions = len(partitioned_data.partitions) if partitioned_data is not None else 0
+    loaded_partitions = len(partitioned_data.loaded) if partitioned_data is not None else 0
+    values = [
+        ('reviews', 'gauge', 'Reviews in the published store', len(review_store)),
+        ('data_version', 'gauge', 'Stores published since startup', data_version),
+        ('load_duration_seconds', 'gauge', 'Duration of the last load or refresh', load_duration),
+        ('load_rows', 'gauge', 'Reviews read from the data file', load_stats.get('rows', 0)),
+        ('load_rejected_rows', 'gauge', 'Data file rows not loaded, by reason', {
+            (('reason', reason),): load_stats.get(reason, 0) for reason in ('malformed', 'skipped')
+        }),
+        ('partitions', 'gauge', 'Data file partitions, by whether they are loaded', {
+            (('state', 'loaded'),): loaded_partitions, (('state', 'unloaded'),): partitions - loaded_partitions
+        }),
+        ('load_ragged_rows', 'gauge', 'Reviews loaded from rows whose field count does not match the header',
+         load_stats.get('ragged', 0)),
+        ('load_unscored_rows', 'gauge', 'Reviews loaded without a sentiment', load_stats.get('unscored', 0)),
+        ('sentiment_scored_total', 'counter', 'Review texts scored, excluding cached scores',
+         sentiment_scorer.scored if sentiment_scorer is not None else 0),
+        ('last_updated_timestamp_seconds', 'gauge', 'When the published store was loaded',
+         last_updated.timestamp() if last_updated else 0.0),
+        ('response_cache_entries', 'gauge', 'Cached /api/data responses', cache['entries']),
+        ('response_cache_bytes', 'gauge', 'Bytes held by the response cache', cache['bytes']),
+        ('response_cache_events_total', 'counter', 'Response cache hits, misses, evictions and expirations', {
+            (('event', event),): cache[event] for event in ('hits', 'misses', 'evictions', 'expirations')
+        }),
+        ('shard_workers', 'gauge', 'Worker processes serving sharded queries',
+         sharded_executor.workers if sharded_executor.store is review_store else 0),
+        ('queries_in_flight', 'gauge', '/api/data responses being computed', pool['in_flight']),
+        ('queries_shared_total', 'counter', '/api/data requests answered by a concurrent identical request', pool['shared']),
+        ('refreshing', 'gauge', 'Whether a data refresh is running', int(refresh_lock.locked()))
+    ]
+    return app.response_class(metrics.render(values), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/keyword-search')
 def keyword_search():
     """Search for reviews containing specific keywords"""
     keyword = request.args.get('keyword', '')
     if not keyword:
-        return jsonify({'reviews': [], 'count': 0})
+        return jsonify({'reviews': [], 'count': 0, 'next_cursor': None})
+    
+    try:
+        page = Page.from_args(request.args, 50)
+    except PageError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Any partition can hold a match
+    store = require_partitions()
     
-    # Search in full dataset
-    matching_reviews = []
-    for review in reviews_data:
-        if keyword.lower() in review.get('review_text', '').lower():
+    # The search resumes after the cursor and stops after the page, in any order
+    with stage('search'):
+        rows, next_cursor = page_search(store, page, keyword)
+    
+    with stage('table'):
+        matching_reviews = []
+        for i in rows:
+            review = store.row(i)
             matching_reviews.append({
                 'hotel_name': review.get('hotel_name', ''),
                 'city': review.get('city', ''),
@@ -436,82 +652,109 @@ def keyword_search():
                 'keywords': review.get('keywords', '')
             })
     
-    # Limit results
-    matching_reviews = matching_reviews[:50]
-    
     return jsonify({
         'reviews': matching_reviews,
-        'count': len(matching_reviews)
+        'count': len(matching_reviews),
+        'next_cursor': next_cursor
     })
 
 @app.route('/api/negative-reviews')
 def get_negative_reviews():
-    """Get negative reviews grouped by category"""
-    negative_reviews = [r for r in reviews_data if r.get('sentiment', 0) < -0.1]
+    """Get the most negative reviews per category (pass category to page through one)
+    
+    Accepts the hotel, city and date filters of /api/data.
+    """
+    with stage('filters'):
+        hotel_filter, city_filter, _, start_date, end_date = parse_filters(request.args)
+        first_day, last_day = get_day_range(start_date, end_date)
+        store = require_partitions(hotel_filter, city_filter, first_day, last_day)
+        hotel_codes, city_codes = get_filter_codes(store, hotel_filter, city_filter)
+    filters = (hotel_codes, city_codes, first_day, last_day)
+    filtered = hotel_codes is not None or city_codes is not None or (first_day, last_day) != (MISSING_DAY, MAX_DAY)
+    
+    category = request.args.get('category')
+    if category:
+        return get_negative_category_page(store, category, filters if filtered else None)
+    
+    # Walk each category's severity-ordered list until 10 reviews pass the filters;
+    # a review naming a category twice is listed twice
+    with stage('lists'):
+        index = store.negative_index
+        predicate = (lambda rows: store.filter_mask(*filters, rows)) if filtered else None
+        limited_category_reviews = {}
+        for i, category in enumerate(CATEGORIES):
+            reviews = []
+            for row in index.top(i, 10, predicate):
+                reviews.extend([store.row(row)] * int(store.category_weights[store.category_code[row], i]))
+            limited_category_reviews[category] = reviews[:10]
+    
+    with stage('count'):
+        buckets = store.cube.summarize(*filters, len(store.categories))['buckets']
     
-    # Group by category
-    category_reviews = {}
-    categories = ['room_quality', 'service_staff', 'food_dining', 'location', 'facilities', 'digital_experience', 'business_services']
+    return jsonify({
+        'category_reviews': limited_category_reviews,
+        'total_negative_reviews': int(buckets[NEGATIVE])
+    })
+
+def get_negative_category_page(store, category, filters=None):
+    """One page of the negative reviews of a category, optionally filtered"""
+    if category not in CATEGORIES:
+        return jsonify({'error': f"category must be one of {', '.join(CATEGORIES)}"}), 400
+    try:
+        page = Page.from_args(request.args, 10)
+    except PageError as e:
+        return jsonify({'error': str(e)}), 400
     
-    for category in categories:
-        category_reviews[category] = []
+    weights = store.category_weights[:, CATEGORIES.index(category)]
     
-    for review in negative_reviews:
-        review_categories = review.get('categories', '')
-        category_list = []
-        
-        if review_categories:
-            for delimiter in [';', ',', ' and ', ' & ']:
-                if delimiter in review_categories:
-                    category_list = [cat.strip().lower() for cat in review_categories.split(delimiter)]
-                    break
-            
-            if not category_list:
-                category_list = [review_categories.strip().lower()]
-        
-        # Map to standard categories
-        mapped_categories = []
-        for cat in category_list:
-            clean_cat = cat.strip().lower()
-            if any(keyword in clean_cat for keyword in ['room', 'bed', 'bathroom', 'clean', 'comfort', 'space', 'size']):
-                mapped_categories.append('room_quality')
-            elif any(keyword in clean_cat for keyword in ['business', 'meeting', 'conference', 'corporate', 'work', 'office']):
-                mapped_categories.append('business_services')
-            elif any(keyword in clean_cat for keyword in ['service', 'staff', 'concierge', 'reception', 'hospitality', 'helpful', 'friendly']):
-                mapped_categories.append('service_staff')
-            elif any(keyword in clean_cat for keyword in ['food', 'dining', 'restaurant', 'breakfast', 'meal', 'cuisine', 'bar']):
-                mapped_categories.append('food_dining')
-            elif any(keyword in clean_cat for keyword in ['location', 'area', 'neighborhood', 'access', 'convenient', 'central', 'near']):
-                mapped_categories.append('location')
-            elif any(keyword in clean_cat for keyword in ['facility', 'facilities', 'amenity', 'amenities', 'pool', 'gym', 'spa', 'fitness', 'wellness', 'equipment', 'infrastructure']):
-                mapped_categories.append('facilities')
-            elif any(keyword in clean_cat for keyword in ['digital', 'online', 'app', 'wifi', 'internet', 'technology', 'booking', 'mobile', 'web', 'electronic']):
-                mapped_categories.append('digital_experience')
-        
-        if not mapped_categories:
-            mapped_categories = ['room_quality']
-        
-        for category in mapped_categories:
-            if category in category_reviews:
-                category_reviews[category].append(review)
+    def predicate(rows):
+        mask = (store.sentiment[rows] < -0.1) & (weights[store.category_code[rows]] > 0)
+        if filters is not None:
+            mask &= store.filter_mask(*filters, rows)
+        return mask
+    
+    with stage('page'):
+        rows, next_cursor = page_sorted(store, page, predicate)
     
-    # Limit results
-    limited_category_reviews = {}
-    for category, reviews in category_reviews.items():
-        limited_category_reviews[category] = reviews[:10]
+    # A review naming the category twice is listed twice; limit counts distinct reviews
+    with stage('table'):
+        reviews = []
+        for i in rows:
+            reviews.extend([store.row(i)] * int(weights[store.category_code[i]]))
     
     return jsonify({
-        'category_reviews': limited_category_reviews,
-        'total_negative_reviews': len(negative_reviews)
+        'category': category,
+        'reviews': reviews,
+        'next_cursor': next_cursor
     })
 
 @app.route('/api/refresh')
 def refresh_data():
-    """Refresh data from source"""
-    global last_updated, reviews_data
-    reviews_data = load_real_data()
-    last_updated = datetime.now()
-    return jsonify({'status': 'success', 'message': 'Data refreshed successfully'})
+    """Refresh data from source (pass mode=full to force a full reload)
+    
+    With background=1 the refresh runs on its own thread and the call returns
+    at once; requests keep being served from the current data until the new
+    store is published.
+    """
+    full = request.args.get('mode') == 'full'
+    if request.args.get('background') == '1':
+        started = refresh_in_background(full)
+        return jsonify({
+            'status': 'started' if started else 'running',
+            'message': 'Refresh started' if started else 'A refresh is already running',
+            'mode': 'full' if full else 'incremental',
+            'total_reviews': len(review_store)
+        }), 202
+    
+    with stage('refresh'):
+        mode = refresh_reviews(full=full)
+    return jsonify({
+        'status': 'success',
+        'message': 'Data refreshed successfully',
+        'mode': mode,
+        'total_reviews': len(review_store),
+        'load_stats': load_stats
+    })
 
 # Vercel entry point
 def handler(request):
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+API benchmark
+Loads a synthetic dataset into the app and measures load time, peak RSS and
+p50/p99 latency of /api/data, /api/keyword-search and /api/negative-reviews
+over a mix of filters, through the Flask test client. Results are written as
+JSON and can be compared with an earlier run.
+
+Usage: python benchmarks/api_benchmark.py --rows 1000000 [--output new.json] [--compare old.json] [options]
+
+Generated datasets are kept in --data-dir and reused by later runs with the
+same generator options. The response cache is disabled unless --cache is
+given, so repeated requests measure the query path.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from synthetic_data import add_arguments, generator_options, write_csv
+
+REGRESSION_RATIO = 1.2
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+def dataset(data_dir, options):
+    """Path of the generated CSV for options, generating it on first use"""
+    key = hashlib.sha1(json.dumps(options, sort_keys=True).encode('utf-8')).hexdigest()[:10]
+    path = os.path.join(data_dir, f"reviews-{options['rows']}-{key}.csv")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        start = time.perf_counter()
+        write_csv(path + '.tmp', **options)
+        os.replace(path + '.tmp', path)
+        print(f"Generated {options['rows']:,} reviews into {path} in {time.perf_counter() - start:.1f}s")
+    return path
+
+def request_cases(app_module, options):
+    """(endpoint, case, query parameters) requests covering typical filter combinations"""
+    store = app_module.review_store
+    first = store.row(0) if len(store) else {'hotel_name': 'Hotel 00000', 'city': 'City 0000'}
+    last_day = np.datetime64('2020-01-01') + options['days'] - 1
+    quarter = {'startDate': str(last_day - 90), 'endDate': str(last_day)}
+    rare_word = f"w{max(options['vocabulary'] - 40, 0)}"
+
+    cases = [
+        ('/api/data', 'all', {}),
+        ('/api/data', 'hotel', {'hotel': first['hotel_name']}),
+        ('/api/data', 'city', {'city': first['city']}),
+        ('/api/data', 'last quarter', quarter),
+        ('/api/data', 'hotel+quarter', dict(quarter, hotel=first['hotel_name'])),
+        ('/api/data', 'search common', {'search': 'clean'}),
+        ('/api/data', 'search rare', {'search': rare_word}),
+        ('/api/data', 'search+city', {'search': 'breakfast', 'city': first['city']}),
+        ('/api/data', 'newest first', {'sort': 'date', 'order': 'desc'}),
+        ('/api/keyword-search', 'common', {'keyword': 'clean'}),
+        ('/api/keyword-search', 'rare', {'keyword': rare_word}),
+        ('/api/keyword-search', 'by rating', {'keyword': 'noisy', 'sort': 'rating'}),
+        ('/api/negative-reviews', 'by category', {}),
+        ('/api/negative-reviews', 'category page', {'category': 'service_staff'}),
+        ('/api/negative-reviews', 'category newest', {'category': 'room_quality', 'sort': 'date', 'order': 'desc'})
+    ]
+
+    # The second page of a sorted listing exercises cursors
+    client = app_module.app.test_client()
+    cursor = client.get('/api/data', query_string={'sort': 'date', 'order': 'desc'}).get_json().get('next_cursor')
+    if cursor:
+        cases.insert(9, ('/api/data', 'next page', {'cursor': cursor}))
+    return cases
+
+def percentiles(latencies):
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+        'mean_ms': round(float(latencies.mean()), 3),
+        'max_ms': round(float(latencies.max()), 3)
+    }
+
+def measure(app_module, cases, repeat):
+    """Latency summaries per case and per endpoint"""
+    client = app_module.app.test_client()
+    by_case = {}
+    by_endpoint = {}
+    for endpoint, case, params in cases:
+        response = client.get(endpoint, query_string=params)  # Warm-up
+        if response.status_code != 200:
+            raise RuntimeError(f'{endpoint} {case} returned {response.status_code}')
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            client.get(endpoint, query_string=params).get_data()
+            latencies.append(time.perf_counter() - start)
+        by_case[f'{endpoint} {case}'] = percentiles(latencies)
+        by_endpoint.setdefault(endpoint, []).extend(latencies)
+    return by_case, {endpoint: percentiles(latencies) for endpoint, latencies in by_endpoint.items()}
+
+def environment():
+    """Interpreter, library and commit the results came from"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit
+    }
+
+def run(args):
+    options = generator_options(args)
+    csv_file = os.path.abspath(dataset(args.data_dir, options))
+
+    # The app loads data.csv (and data.snapshot) from the working directory on import
+    workdir = tempfile.mkdtemp(prefix='sentiment-benchmark-')
+    try:
+        os.symlink(csv_file, os.path.join(workdir, 'data.csv'))
+        if args.snapshot:
+            # Compiled in a child process so it does not count towards peak RSS
+            subprocess.run([sys.executable, os.path.join(REPO_DIR, 'snapshot.py'), 'data.csv', 'data.snapshot'],
+                           cwd=workdir, check=True, stdout=subprocess.DEVNULL)
+        if not args.cache:
+            os.environ['RESPONSE_CACHE_MB'] = '0'
+        os.chdir(workdir)
+
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        import app as app_module
+        load_seconds = time.perf_counter() - start
+        load_rss = peak_rss_mb()
+
+        cases = request_cases(app_module, options)
+        by_case, by_endpoint = measure(app_module, cases, args.repeat)
+        rows = len(app_module.review_store)
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'dataset': dict(options, snapshot=args.snapshot, cache=args.cache, repeat=args.repeat),
+        'load': {
+            'seconds': round(load_seconds, 3),
+            'rows': rows,
+            'peak_rss_mb': round(load_rss, 1),
+            'rss_growth_mb': round(load_rss - rss_before, 1)
+        },
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'endpoints': by_endpoint,
+        'cases': by_case
+    }
+
+def report(results, baseline=None):
+    """Print results, with the ratio to baseline when given"""
+    load = results['load']
+    print(f"\n{load['rows']:,} reviews: load {load['seconds']:.2f}s, "
+          f"peak RSS {load['peak_rss_mb']:.0f} MB after load, {results['peak_rss_mb']:.0f} MB overall")
+    if baseline:
+        print(f"baseline load {baseline['load']['seconds']:.2f}s, peak RSS {baseline['peak_rss_mb']:.0f} MB")
+
+    header = f"{'request':<44}{'p50 ms':>10}{'p99 ms':>10}"
+    print(header + (f"{'p50 x':>9}{'p99 x':>9}" if baseline else ''))
+    for section in ('endpoints', 'cases'):
+        for name, stats in results[section].items():
+            line = f"{name:<44}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+            previous = baseline.get(section, {}).get(name) if baseline else None
+            if previous:
+                p50 = stats['p50_ms'] / max(previous['p50_ms'], 1e-9)
+                p99 = stats['p99_ms'] / max(previous['p99_ms'], 1e-9)
+                flag = '  slower' if p50 > REGRESSION_RATIO else ''
+                line += f'{p50:>9.2f}{p99:>9.2f}{flag}'
+            print(line)
+        print()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard API on synthetic reviews')
+    add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=20, help='timed requests per case')
+    parser.add_argument('--snapshot', action='store_true', help='load from a compiled snapshot instead of the CSV')
+    parser.add_argument('--cache', action='store_true', help='keep the response cache enabled')
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARK_DIR, 'data'), help='where generated datasets are kept')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    results = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
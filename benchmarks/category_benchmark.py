@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Category classifier benchmark
+Compares the CategoryClassifier used at ingest with the per-token chains of
+substring any() tests it replaced, on category strings that repeat heavily
+(as exported reviews do) and on mostly distinct ones, and checks that all
+of them map every string alike
+
+Usage: python benchmarks/category_benchmark.py [strings ...]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from category_classifier import CATEGORIES, CategoryClassifier
+
+LABELS = ['Room', 'Cleanliness', 'Bed comfort', 'Bathroom', 'Staff', 'Service', 'Front desk reception',
+          'Breakfast', 'Restaurant', 'Bar', 'Location', 'Neighborhood', 'Public transport access', 'Pool',
+          'Spa & wellness', 'Gym', 'WiFi', 'Online booking', 'Mobile app', 'Business center', 'Meeting rooms',
+          'Value', 'Noise', 'Parking', 'room_quality', 'service_staff', 'food_dining', 'facilities']
+JOINERS = [', ', '; ', ' & ', ' and ', ',']
+DEFAULT_SIZES = [1_000_000]
+
+def generate_strings(count, distinct, seed=42):
+    """Seeded category strings drawn from a Zipf-weighted pool of distinct ones"""
+    rng = random.Random(seed)
+    pool = []
+    for i in range(distinct):
+        labels = rng.sample(LABELS, rng.randint(1, 3))
+        if rng.random() < 0.3:
+            labels[-1] = f'{labels[-1]} {i}'  # Free-text variants make the pool as large as asked
+        pool.append(rng.choice(JOINERS).join(labels))
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    return rng.choices(pool, weights=weights, k=count)
+
+CHAINS = [
+    ('room_quality', ['room', 'bed', 'bathroom', 'clean', 'comfort', 'space', 'size']),
+    ('business_services', ['business', 'meeting', 'conference', 'corporate', 'work', 'office']),
+    ('service_staff', ['service', 'staff', 'concierge', 'reception', 'hospitality', 'helpful', 'friendly']),
+    ('food_dining', ['food', 'dining', 'restaurant', 'breakfast', 'meal', 'cuisine', 'bar']),
+    ('location', ['location', 'area', 'neighborhood', 'access', 'convenient', 'central', 'near']),
+    ('facilities', ['facility', 'facilities', 'amenity', 'amenities', 'pool', 'gym', 'spa', 'fitness', 'wellness', 'equipment', 'infrastructure']),
+    ('digital_experience', ['digital', 'online', 'app', 'wifi', 'internet', 'technology', 'booking', 'mobile', 'web', 'electronic'])
+]
+
+def chained_weights(review_categories):
+    """Baseline: split on each delimiter in turn, then test every rule's keywords with any()"""
+    category_list = []
+    if review_categories:
+        for delimiter in [';', ',', ' and ', ' & ']:
+            if delimiter in review_categories:
+                category_list = [cat.strip().lower() for cat in review_categories.split(delimiter)]
+                break
+        if not category_list:
+            category_list = [review_categories.strip().lower()]
+
+    weights = [0] * len(CATEGORIES)
+    for cat in category_list:
+        for category, keywords in CHAINS:
+            if any(keyword in cat for keyword in keywords):
+                weights[CATEGORIES.index(category)] += 1
+                break
+    if not any(weights):
+        weights[CATEGORIES.index('room_quality')] = 1
+    return tuple(weights)
+
+def timed(func, strings):
+    start = time.perf_counter()
+    results = [func(string) for string in strings]
+    return time.perf_counter() - start, results
+
+def run(count):
+    for distinct in [1_000, count // 2]:
+        strings = generate_strings(count, distinct)
+        print(f"\n{count:,} category strings, {len(set(strings)):,} distinct")
+        print(f"{'method':<28}{'seconds':>10}{'strings/s':>14}{'speedup':>10}")
+
+        baseline, expected = timed(chained_weights, strings)
+        compiled = CategoryClassifier(memo_size=0)
+        memoized = CategoryClassifier()
+        rows = [('any() chains', baseline, expected)]
+        for name, classifier in [('compiled regex', compiled), ('compiled regex + memo', memoized)]:
+            seconds, results = timed(lambda string: classifier.classify(string)[0], strings)
+            rows.append((name, seconds, results))
+
+        for name, seconds, results in rows:
+            if results != expected:
+                raise AssertionError(f"{name} disagrees with the any() chains")
+            print(f"{name:<28}{seconds:>10.2f}{count / seconds:>14,.0f}{baseline / seconds:>9.1f}x")
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for size in sizes:
+        run(size)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Filtered search benchmark
+Compares the fused row scan behind a searched /api/data request with the
+separate passes it replaced (filter mask, search, summary, keyword counts):
+time, column elements read per store row, and peak memory allocated
+
+Usage: python benchmarks/filter_benchmark.py [rows ...]
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from review_store import MISSING_DAY, MAX_DAY, ReviewStore, to_epoch_day
+from row_scan import scan_rows
+
+HOTELS = [f'Hotel {i}' for i in range(50)]
+CITIES = ['London', 'Paris', 'Rome', 'Berlin', 'Madrid', 'Lisbon', 'Vienna', 'Prague']
+WORDS = ['room', 'clean', 'staff', 'friendly', 'breakfast', 'pool', 'wifi', 'noisy', 'dirty', 'great',
+         'terrible', 'location', 'the', 'and', 'was', 'very', 'slow', 'spa', 'view', 'quiet']
+CATEGORIES = ['Service', 'Cleanliness', 'Location', 'Food', 'Service, Food', 'Room, Cleanliness']
+PAGE = 21
+DEFAULT_SIZES = [100_000, 1_000_000]
+
+def generate_reviews(rows, seed=42):
+    """Seeded synthetic reviews"""
+    rng = random.Random(seed)
+    first_day = date(2021, 1, 1)
+    for _ in range(rows):
+        words = rng.choices(WORDS, k=rng.randint(5, 25))
+        yield (
+            rng.choice(HOTELS), rng.choice(CITIES), ' '.join(words), rng.uniform(-1, 1), rng.randint(1, 5),
+            (first_day + timedelta(days=rng.randrange(1095))).isoformat(), rng.choice(CATEGORIES),
+            ', '.join(words[:3])
+        )
+
+class TallyArray(np.ndarray):
+    """Column that counts the elements read through indexing"""
+    reads = 0
+
+    def __getitem__(self, index):
+        result = np.asarray(super().__getitem__(index))
+        TallyArray.reads += result.size
+        return result
+
+class TallyStore(ReviewStore):
+    """ReviewStore whose filter and summary columns count their reads"""
+    hotel_code = property(lambda self: self._hotel_code.values.view(TallyArray))
+    city_code = property(lambda self: self._city_code.values.view(TallyArray))
+    category_code = property(lambda self: self._category_code.values.view(TallyArray))
+    day = property(lambda self: self._day.values.view(TallyArray))
+    sentiment = property(lambda self: self._sentiment.values.view(TallyArray))
+
+def separate_passes(store, filters, search):
+    """Previous implementation: every figure from its own pass over the rows"""
+    rows = store.search(search, store.filter_mask(*filters))
+    summary = store.summarize_rows(rows)
+    keywords = store.top_keywords(rows, 20)
+    return rows[:PAGE], summary, keywords
+
+def fused_scan(store, filters, search):
+    """One scan_rows pass"""
+    scan = scan_rows(store, filters, search, head=PAGE)
+    return scan.first_rows, scan.summary(), scan.top_keywords(20)
+
+def measure(func, repeat=3):
+    """Best time, column reads and peak traced allocation of func()"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    TallyArray.reads = 0
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, TallyArray.reads, peak, result
+
+def run(rows):
+    start = time.perf_counter()
+    store = ReviewStore()
+    store.extend(generate_reviews(rows))
+    store.__class__ = TallyStore
+    print(f"\n{rows:,} reviews (load {time.perf_counter() - start:.1f}s)")
+
+    cases = {
+        'all': ((None, None, MISSING_DAY, MAX_DAY), 'clean'),
+        'hotel': ((store.hotels.codes_matching('Hotel 7'), None, MISSING_DAY, MAX_DAY), 'breakfast was'),
+        'city+2022': ((None, store.cities.codes_matching('Paris'),
+                       to_epoch_day(date(2022, 1, 1)), to_epoch_day(date(2022, 12, 31))), 'the'),
+        'rare': ((None, None, MISSING_DAY, MAX_DAY), 'spa view quiet')
+    }
+    print(f"{'case':<12}{'method':<11}{'ms':>10}{'reads/row':>11}{'peak MB':>10}")
+    for name, (filters, search) in cases.items():
+        expected = None
+        for method, func in [('separate', separate_passes), ('fused', fused_scan)]:
+            elapsed, reads, peak, result = measure(lambda: func(store, filters, search))
+            head, summary, (ids, totals) = result
+            found = (head.tolist(), summary['category_buckets'].tolist(), summary['hotels'].tolist(),
+                     summary['cities'].tolist(), ids.tolist(), totals.tolist())
+            if expected is None:
+                expected = found
+            assert found == expected, f"fused scan disagrees with the separate passes for {name}"
+            print(f"{name if method == 'separate' else '':<12}{method:<11}{elapsed * 1000:>10.1f}"
+                  f"{reads / len(store):>11.2f}{peak / 2 ** 20:>10.1f}")
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for size in sizes:
+        run(size)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Top keyword benchmark
+Compares counting the filtered rows' keywords with merging the per-hotel/day
+keyword counters, exactly and through bounded summaries of several capacities
+
+Usage: python benchmarks/keyword_benchmark.py [rows ...]
+"""
+
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from review_store import MISSING_DAY, MAX_DAY, ReviewStore, to_epoch_day
+
+HOTELS = [f'Hotel {i}' for i in range(50)]
+CITIES = ['London', 'Paris', 'Rome', 'Berlin', 'Madrid', 'Lisbon', 'Vienna', 'Prague']
+VOCABULARY_SIZE = 50_000
+CAPACITIES = [256, 1024, 4096]
+LIMIT = 20
+DEFAULT_SIZES = [100_000, 1_000_000]
+
+def generate_reviews(rows, seed=42):
+    """Seeded synthetic reviews with Zipf-distributed keywords"""
+    rng = random.Random(seed)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(VOCABULARY_SIZE)))
+    words = [f'word{i}' for i in range(VOCABULARY_SIZE)]
+    first_day = date(2021, 1, 1)
+    for _ in range(rows):
+        keywords = rng.choices(words, cum_weights=cum_weights, k=rng.randint(1, 8))
+        yield (
+            rng.choice(HOTELS), rng.choice(CITIES), 'review', rng.uniform(-1, 1), rng.randint(1, 5),
+            (first_day + timedelta(days=rng.randrange(1095))).isoformat(), 'Service', ', '.join(keywords)
+        )
+
+def row_counts(store, rows, limit):
+    """Baseline: sum every filtered row's keyword counts"""
+    keyword_ids, counts = store.keyword_entries(rows)
+    unique_ids, first_seen, inverse = np.unique(keyword_ids, return_index=True, return_inverse=True)
+    totals = np.bincount(inverse, weights=counts, minlength=len(unique_ids)).round().astype(np.int64)
+    order = np.lexsort((first_seen, -totals))[:limit]
+    return unique_ids[order], totals[order]
+
+def timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run(rows):
+    start = time.perf_counter()
+    store = ReviewStore()
+    store.extend(generate_reviews(rows))
+    load = time.perf_counter() - start
+    start = time.perf_counter()
+    cells = store.keyword_cells
+    build = time.perf_counter() - start
+    print(f"\n{rows:,} reviews (load {load:.1f}s, counters {build:.1f}s, {len(cells):,} cells)")
+
+    filters = {
+        'all': (None, None, MISSING_DAY, MAX_DAY),
+        'hotel': (store.hotels.codes_matching('Hotel 7'), None, MISSING_DAY, MAX_DAY),
+        'city+2022': (None, store.cities.codes_matching('Paris'), to_epoch_day(date(2022, 1, 1)), to_epoch_day(date(2022, 12, 31)))
+    }
+    print(f"{'filter':<12}{'method':<14}{'ms':>10}{'recall':>9}{'max error':>11}")
+    for name, (hotel_codes, city_codes, first_day, last_day) in filters.items():
+        mask = (store.day >= first_day) & (store.day <= last_day)
+        if hotel_codes is not None:
+            mask &= np.isin(store.hotel_code, hotel_codes)
+        if city_codes is not None:
+            mask &= np.isin(store.city_code, city_codes)
+        rows_selected = np.flatnonzero(mask)
+
+        scan_time, (expected_ids, expected_totals) = timed(lambda: row_counts(store, rows_selected, LIMIT))
+        expected = dict(zip(expected_ids.tolist(), expected_totals.tolist()))
+        print(f"{name:<12}{'row scan':<14}{scan_time * 1000:>10.1f}")
+
+        methods = [('exact', None)] + [(f'approx {capacity}', capacity) for capacity in CAPACITIES]
+        for method, capacity in methods:
+            elapsed, (ids, totals) = timed(lambda: cells.top(hotel_codes, city_codes, first_day, last_day, LIMIT, capacity))
+            found = dict(zip(ids.tolist(), totals.tolist()))
+            if capacity is None:
+                assert ids.tolist() == expected_ids.tolist(), f"exact merge disagrees with the row scan for {name}"
+            recall = len(found.keys() & expected.keys()) / max(len(expected), 1)
+            max_error = max((expected[k] - found.get(k, 0) for k in expected), default=0)
+            print(f"{'':<12}{method:<14}{elapsed * 1000:>10.1f}{recall:>9.2f}{max_error:>11}")
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for size in sizes:
+        run(size)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Concurrent load test
+Starts serve.py on a synthetic dataset and drives it with many concurrent
+dashboard clients, each loading /api/data and /api/negative-reviews for a
+random filter and now and then searching keywords. Reports throughput and
+latency percentiles per endpoint, optionally while full reloads run in the
+background, and compares with a single-threaded server.
+
+Usage: python benchmarks/load_test.py --rows 1000000 --clients 100 [--duration 30] [--serial] [--output load.json]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+
+from api_benchmark import dataset, environment, percentiles
+from synthetic_data import add_arguments, generator_options
+
+def dashboard_views(options, seed):
+    """Filter combinations a dashboard user might pick"""
+    rng = random.Random(seed)
+    last_day = date(2020, 1, 1) + timedelta(days=options['days'] - 1)
+    views = [{}]
+    for _ in range(30):
+        view = {}
+        if rng.random() < 0.5:
+            view['hotel'] = f"Hotel {rng.randrange(min(options['hotels'], 20)):05d}"
+        elif rng.random() < 0.5:
+            view['city'] = f"City {rng.randrange(min(options['cities'], 10)):04d}"
+        if rng.random() < 0.4:
+            view['startDate'] = (last_day - timedelta(days=rng.choice([30, 90, 365]))).isoformat()
+            view['endDate'] = last_day.isoformat()
+        views.append(view)
+    return views
+
+class Server:
+    """serve.py running in a child process on a dataset"""
+
+    def __init__(self, csv_file, threads, query_workers, cache):
+        self.workdir = tempfile.mkdtemp(prefix='sentiment-load-')
+        os.symlink(csv_file, os.path.join(self.workdir, 'data.csv'))
+        env = dict(os.environ, QUERY_WORKERS=str(query_workers), PYTHONUNBUFFERED='1')
+        if not cache:
+            env['RESPONSE_CACHE_MB'] = '0'
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(REPO_DIR, 'serve.py'), '--host', '127.0.0.1', '--port', '0', '--threads', str(threads)],
+            cwd=self.workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        self.port = None
+        for line in self.process.stdout:
+            if line.startswith('Serving on'):
+                self.port = int(line.rsplit(':', 1)[1].split()[0])
+                break
+        if self.port is None:
+            self.close()
+            raise RuntimeError('serve.py exited before serving')
+        # Keep draining output so the child never blocks on a full pipe
+        threading.Thread(target=self.process.stdout.read, daemon=True).start()
+
+    def get(self, path, params=None, timeout=120):
+        """(status, seconds) of one GET request"""
+        start = time.perf_counter()
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=timeout)
+        try:
+            connection.request('GET', path + ('?' + urlencode(params) if params else ''))
+            response = connection.getresponse()
+            response.read()
+            return response.status, time.perf_counter() - start
+        finally:
+            connection.close()
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+def client(server, views, seed, deadline, results):
+    """One dashboard user reloading views until deadline"""
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        view = rng.choice(views)
+        requests = [('/api/data', view), ('/api/negative-reviews', view)]
+        if rng.random() < 0.2:
+            requests.append(('/api/keyword-search', {'keyword': rng.choice(['clean', 'breakfast', 'noisy', 'wifi'])}))
+        for path, params in requests:
+            try:
+                status, seconds = server.get(path, params)
+            except OSError:
+                status, seconds = None, None
+            results.append((path, status, seconds))
+
+def refresher(server, interval, deadline, reloads):
+    """Start a background full reload every interval seconds"""
+    while time.perf_counter() + interval < deadline:
+        time.sleep(interval)
+        status, seconds = server.get('/api/refresh', {'mode': 'full', 'background': '1'})
+        reloads.append({'status': status, 'ms': round(seconds * 1000, 2)})
+
+def run_load(name, csv_file, options, args, threads, query_workers):
+    server = Server(csv_file, threads, query_workers, args.cache)
+    try:
+        views = dashboard_views(options, args.seed)
+        for view in views[:5]:
+            server.get('/api/data', view)  # Warm up the server
+        results = []
+        reloads = []
+        start = time.perf_counter()
+        deadline = start + args.duration
+        workers = [
+            threading.Thread(target=client, args=(server, views, args.seed + i, deadline, results))
+            for i in range(args.clients)
+        ]
+        if args.reload_every:
+            workers.append(threading.Thread(target=refresher, args=(server, args.reload_every, deadline, reloads)))
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.close()
+
+    ok = [(path, seconds) for path, status, seconds in results if status == 200]
+    by_endpoint = {}
+    for path, seconds in ok:
+        by_endpoint.setdefault(path, []).append(seconds)
+    summary = {
+        'threads': threads,
+        'query_workers': query_workers,
+        'requests': len(results),
+        'errors': len(results) - len(ok),
+        'seconds': round(elapsed, 2),
+        'throughput_rps': round(len(ok) / elapsed, 1),
+        'overall': percentiles([seconds for _, seconds in ok]) if ok else None,
+        'endpoints': {path: percentiles(latencies) for path, latencies in by_endpoint.items()},
+        'reloads': reloads
+    }
+    if summary['overall']:
+        summary['overall']['p95_ms'] = round(float(np.percentile(np.array([s for _, s in ok]) * 1000, 95)), 3)
+    print(f"\n{name}: {threads} connection threads, {query_workers} query workers, {args.clients} clients, "
+          f"{len(reloads)} background reloads")
+    print(f"{summary['throughput_rps']:.1f} requests/s, {summary['errors']} errors")
+    print(f"{'endpoint':<26}{'requests':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for path, stats in [('all', summary['overall'])] + list(summary['endpoints'].items()):
+        if stats:
+            print(f"{path:<26}{stats['requests']:>10}{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test serve.py with concurrent dashboard clients')
+    add_arguments(parser)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=30, help='seconds per run')
+    parser.add_argument('--threads', type=int, default=32, help='server connection threads')
+    parser.add_argument('--query-workers', type=int, default=4, help='server query pool threads')
+    parser.add_argument('--reload-every', type=float, default=0, help='seconds between background full reloads')
+    parser.add_argument('--cache', action='store_true', help='keep the response cache enabled')
+    parser.add_argument('--serial', action='store_true', help='also run a single-threaded server for comparison')
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARK_DIR, 'data'), help='where generated datasets are kept')
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    options = generator_options(args)
+    csv_file = os.path.abspath(dataset(args.data_dir, options))
+    runs = {'pooled': run_load('pooled', csv_file, options, args, args.threads, args.query_workers)}
+    if args.serial:
+        runs['serial'] = run_load('serial', csv_file, options, args, 1, 0)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'environment': environment(),
+                'dataset': options,
+                'clients': args.clients,
+                'duration': args.duration,
+                'cache': args.cache,
+                'runs': runs
+            }, f, indent=2)
+        print(f"Results written to {args.output}")
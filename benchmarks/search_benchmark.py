@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Search benchmark
+Compares the TextIndex used by /api/keyword-search and the search filter with
+the linear lowercase-and-scan it replaced
+
+Usage: python benchmarks/search_benchmark.py [rows ...]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from search_index import TextIndex
+
+WORDS = ['room', 'clean', 'staff', 'friendly', 'breakfast', 'pool', 'wifi', 'noisy', 'dirty', 'great',
+         'terrible', 'location', 'central', 'the', 'and', 'was', 'very', 'slow', 'booking', 'spa', 'gym',
+         'bar', 'view', 'quiet', 'comfortable', 'bed', 'shower', 'parking', 'elevator', 'lobby']
+QUERIES = ['clean', 'breakfast was', 'elevator', 'om cl', 'zzz']
+DEFAULT_SIZES = [100_000, 1_000_000, 5_000_000]
+
+def generate_texts(rows, seed=42):
+    """Seeded synthetic review texts"""
+    rng = random.Random(seed)
+    # Common hotel vocabulary plus a long tail of rare words
+    vocabulary = WORDS * 200 + [f'word{i}' for i in range(5000)]
+    return [' '.join(rng.choices(vocabulary, k=rng.randint(5, 40))) for _ in range(rows)]
+
+def scan(texts, query, limit=None):
+    """Baseline: lowercase every review and test for the substring"""
+    query = query.lower()
+    matches = []
+    for row, text in enumerate(texts):
+        if query in text.lower():
+            matches.append(row)
+            if limit and len(matches) >= limit:
+                break
+    return matches
+
+def timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run(rows):
+    texts = generate_texts(rows)
+    start = time.perf_counter()
+    index = TextIndex()
+    for row, text in enumerate(texts):
+        index.add(row, text)
+    build = time.perf_counter() - start
+    print(f"\n{rows:,} reviews (index build {build:.1f}s)")
+    print(f"{'query':<16}{'limit':>7}{'matches':>10}{'scan ms':>12}{'index ms':>12}{'speedup':>10}")
+
+    for query in QUERIES:
+        for limit in (50, None):
+            scan_time, expected = timed(lambda: scan(texts, query, limit))
+            index_time, found = timed(lambda: index.search(query, texts, limit=limit))
+            assert list(found) == expected, f"index and scan disagree for {query!r}"
+            speedup = scan_time / index_time if index_time else float('inf')
+            print(f"{query:<16}{str(limit or '-'):>7}{len(found):>10}{scan_time * 1000:>12.1f}{index_time * 1000:>12.1f}{speedup:>9.1f}x")
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for size in sizes:
+        run(size)
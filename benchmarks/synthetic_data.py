@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Synthetic review data
+Seeded generator of reviews in the data.csv schema, with configurable size,
+hotel and city cardinality, review length and vocabulary sizes. The same
+arguments always produce the same file.
+
+Usage: python benchmarks/synthetic_data.py --rows 1000000 --output data.csv [options]
+       python benchmarks/synthetic_data.py --rows 1000000 --partition-by month --output data/ [options]
+"""
+
+import argparse
+import csv
+import os
+import sys
+
+import numpy as np
+
+FIELDS = ['hotel_name', 'city', 'review_text', 'sentiment', 'rating', 'date', 'categories', 'keywords']
+CATEGORIES = ['room_quality', 'service_staff', 'food_dining', 'location', 'facilities', 'digital_experience', 'business_services']
+COMMON_WORDS = ['the', 'and', 'was', 'very', 'room', 'clean', 'staff', 'friendly', 'breakfast', 'pool', 'wifi',
+                'noisy', 'dirty', 'great', 'terrible', 'location', 'central', 'slow', 'booking', 'spa', 'view',
+                'quiet', 'comfortable', 'bed', 'shower', 'parking', 'elevator', 'lobby', 'bar', 'gym']
+FIRST_DAY = np.datetime64('2020-01-01')
+CHUNK_ROWS = 50_000
+
+DEFAULTS = {
+    'rows': 100_000,
+    'seed': 42,
+    'hotels': 200,
+    'cities': 40,
+    'min_words': 8,
+    'max_words': 60,
+    'vocabulary': 5000,
+    'keyword_vocabulary': 2000,
+    'days': 5 * 365
+}
+
+def zipf_weights(size):
+    """Probabilities falling off as 1 / rank, like word frequencies"""
+    weights = 1 / np.arange(1, size + 1)
+    return weights / weights.sum()
+
+def vocabulary_words(size):
+    """Common hotel words followed by a long tail of generated ones"""
+    tail = [f'w{i}' for i in range(max(size - len(COMMON_WORDS), 0))]
+    return np.array((COMMON_WORDS + tail)[:size], dtype=object)
+
+def generate_rows(rows=DEFAULTS['rows'], seed=DEFAULTS['seed'], hotels=DEFAULTS['hotels'], cities=DEFAULTS['cities'],
+                  min_words=DEFAULTS['min_words'], max_words=DEFAULTS['max_words'], vocabulary=DEFAULTS['vocabulary'],
+                  keyword_vocabulary=DEFAULTS['keyword_vocabulary'], days=DEFAULTS['days']):
+    """Yield review rows (lists of strings) in FIELDS order
+
+    Every hotel belongs to one city; hotels, words and keywords follow Zipf-like
+    popularity. About 1% of sentiments are missing and 1% of dates unparseable.
+    """
+    rng = np.random.default_rng(seed)
+    hotel_names = np.array([f'Hotel {i:05d}' for i in range(hotels)], dtype=object)
+    city_names = np.array([f'City {i:04d}' for i in range(cities)], dtype=object)
+    hotel_city = rng.integers(cities, size=hotels)
+    hotel_weights = zipf_weights(hotels)
+    words = vocabulary_words(vocabulary)
+    word_weights = zipf_weights(len(words))
+    keywords = vocabulary_words(keyword_vocabulary)
+    keyword_weights = zipf_weights(len(keywords))
+    category_names = np.array(CATEGORIES, dtype=object)
+
+    for start in range(0, rows, CHUNK_ROWS):
+        n = min(CHUNK_ROWS, rows - start)
+        hotel = rng.choice(hotels, size=n, p=hotel_weights)
+        sentiment = np.round(rng.uniform(-1, 1, n), 3).astype(str).astype(object)
+        sentiment[rng.random(n) < 0.01] = ''
+        rating = rng.integers(1, 6, n).astype(str)
+        dates = (FIRST_DAY + rng.integers(days, size=n)).astype(str).astype(object)
+        dates[rng.random(n) < 0.01] = 'unknown'
+
+        text_lengths = rng.integers(min_words, max_words + 1, n)
+        text_ends = np.cumsum(text_lengths)
+        text_words = words[rng.choice(len(words), size=int(text_ends[-1]), p=word_weights)]
+
+        category_lengths = rng.integers(1, 4, n)
+        category_ends = np.cumsum(category_lengths)
+        row_categories = category_names[rng.integers(len(CATEGORIES), size=int(category_ends[-1]))]
+
+        keyword_lengths = rng.integers(0, 6, n)
+        keyword_ends = np.cumsum(keyword_lengths)
+        total_keywords = int(keyword_ends[-1]) if n else 0
+        row_keywords = keywords[rng.choice(len(keywords), size=total_keywords, p=keyword_weights)]
+        keyword_counts = rng.integers(1, 6, total_keywords).astype(str)
+
+        for i in range(n):
+            text_start = text_ends[i] - text_lengths[i]
+            category_start = category_ends[i] - category_lengths[i]
+            keyword_start = keyword_ends[i] - keyword_lengths[i]
+            yield [
+                hotel_names[hotel[i]], city_names[hotel_city[hotel[i]]],
+                ' '.join(text_words[text_start:text_ends[i]]), sentiment[i], rating[i], dates[i],
+                ';'.join(row_categories[category_start:category_ends[i]]),
+                ','.join(f'{keyword}:{count}' for keyword, count in zip(
+                    row_keywords[keyword_start:keyword_ends[i]], keyword_counts[keyword_start:keyword_ends[i]]
+                ))
+            ]
+
+def write_csv(path, **options):
+    """Write generated reviews to path as CSV with a header row"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        writer.writerows(generate_rows(**options))
+
+def partition_key(row, partition_by):
+    """Partition file name (without .csv) of a generated row"""
+    if partition_by == 'city':
+        return row[1].replace(' ', '_')
+    date = row[5]
+    return date[:7] if date[:4].isdigit() else 'undated'
+
+def write_partitions(directory, partition_by, **options):
+    """Write generated reviews to one CSV per month or city in directory"""
+    os.makedirs(directory, exist_ok=True)
+    files = {}
+    writers = {}
+    try:
+        for row in generate_rows(**options):
+            key = partition_key(row, partition_by)
+            writer = writers.get(key)
+            if writer is None:
+                files[key] = open(os.path.join(directory, key + '.csv'), 'w', newline='', encoding='utf-8')
+                writer = writers[key] = csv.writer(files[key])
+                writer.writerow(FIELDS)
+            writer.writerow(row)
+    finally:
+        for f in files.values():
+            f.close()
+
+def add_arguments(parser):
+    """Generator options shared with the benchmark harness"""
+    parser.add_argument('--rows', type=int, default=DEFAULTS['rows'], help='reviews to generate (up to 10M)')
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'])
+    parser.add_argument('--hotels', type=int, default=DEFAULTS['hotels'], help='distinct hotels')
+    parser.add_argument('--cities', type=int, default=DEFAULTS['cities'], help='distinct cities')
+    parser.add_argument('--min-words', type=int, default=DEFAULTS['min_words'], help='shortest review, in words')
+    parser.add_argument('--max-words', type=int, default=DEFAULTS['max_words'], help='longest review, in words')
+    parser.add_argument('--vocabulary', type=int, default=DEFAULTS['vocabulary'], help='distinct review words')
+    parser.add_argument('--keyword-vocabulary', type=int, default=DEFAULTS['keyword_vocabulary'], help='distinct keywords')
+    parser.add_argument('--days', type=int, default=DEFAULTS['days'], help='date range, in days from 2020-01-01')
+
+def generator_options(args):
+    """generate_rows keyword arguments from parsed arguments"""
+    return {name: getattr(args, name) for name in DEFAULTS}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic reviews')
+    add_arguments(parser)
+    parser.add_argument('--output', default='-', help='CSV file to write, - for stdout')
+    parser.add_argument('--partition-by', choices=['month', 'city'],
+                        help='write one CSV per month or city into the --output directory')
+    args = parser.parse_args()
+    if args.partition_by:
+        write_partitions(args.output, args.partition_by, **generator_options(args))
+    elif args.output == '-':
+        writer = csv.writer(sys.stdout)
+        writer.writerow(FIELDS)
+        writer.writerows(generate_rows(**generator_options(args)))
+    else:
+        write_csv(args.output, **generator_options(args))
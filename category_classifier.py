@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Category classifier
+Maps raw review category strings such as "Room, Staff & Breakfast" onto the
+standard dashboard categories with one compiled regex over every keyword of a
+configurable rule table, remembering the result per distinct raw string
+"""
+
+import hashlib
+import json
+import re
+
+CATEGORIES = ['room_quality', 'service_staff', 'food_dining', 'location', 'facilities', 'digital_experience', 'business_services']
+
+# Standard category per keyword, in priority order: a token naming keywords of
+# several categories counts for the first of them
+DEFAULT_RULES = [
+    ('room_quality', ['room', 'bed', 'bathroom', 'clean', 'comfort', 'space', 'size']),
+    ('business_services', ['business', 'meeting', 'conference', 'corporate', 'work', 'office']),
+    ('service_staff', ['service', 'staff', 'concierge', 'reception', 'hospitality', 'helpful', 'friendly']),
+    ('food_dining', ['food', 'dining', 'restaurant', 'breakfast', 'meal', 'cuisine', 'bar']),
+    ('location', ['location', 'area', 'neighborhood', 'access', 'convenient', 'central', 'near']),
+    ('facilities', ['facility', 'facilities', 'amenity', 'amenities', 'pool', 'gym', 'spa', 'fitness', 'wellness', 'equipment', 'infrastructure']),
+    ('digital_experience', ['digital', 'online', 'app', 'wifi', 'internet', 'technology', 'booking', 'mobile', 'web', 'electronic'])
+]
+DEFAULT_CATEGORY = 'room_quality'  # For strings with no matching token
+# A string is split on the first of these it contains
+DELIMITERS = [';', ',', ' and ', ' & ']
+
+MEMO_SIZE = 1 << 16  # Distinct raw strings (and tokens) remembered before a memo starts over
+
+def starts_inside(keyword, other):
+    """Whether keyword can start strictly inside an occurrence of other"""
+    return any(other[i:].startswith(keyword) or keyword.startswith(other[i:]) for i in range(1, len(other)))
+
+class CategoryClassifier:
+    """Compiled category rules with a memo of raw strings to weights
+
+    rules is a list of (category, keywords) pairs in priority order, and every
+    keyword is one branch of a single alternation tried in that order, so the
+    branch matching at a position is the best keyword starting there. One
+    findall then finds a token's best keyword unless a match hides a better
+    keyword starting inside it; tokens matching such a keyword are rescanned
+    with the lookahead form of the alternation, which reports every position.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, default=DEFAULT_CATEGORY, delimiters=DELIMITERS, memo_size=MEMO_SIZE):
+        self.rules = [(category, list(keywords)) for category, keywords in rules]
+        self.default = default
+        self.delimiters = list(delimiters)
+        self.memo_size = memo_size
+        if default not in CATEGORIES:
+            raise ValueError(f"Unknown default category {default!r}")
+
+        self._rank = {}  # Keyword -> position of its rule
+        self._rule_category = []  # Rule position -> index into CATEGORIES
+        for category, keywords in self.rules:
+            if category not in CATEGORIES:
+                raise ValueError(f"Unknown category {category!r}, expected one of {', '.join(CATEGORIES)}")
+            for keyword in keywords:
+                if not isinstance(keyword, str) or not keyword.strip():
+                    raise ValueError(f"Keywords of {category} must be non-empty strings")
+                self._rank.setdefault(keyword.strip().lower(), len(self._rule_category))
+            self._rule_category.append(CATEGORIES.index(category))
+        # Higher-priority keywords first, longer first within a rule
+        keywords = sorted(self._rank, key=lambda keyword: (self._rank[keyword], -len(keyword)))
+        alternation = '|'.join(map(re.escape, keywords))
+        self._pattern = re.compile(alternation) if keywords else None
+        self._overlapping = re.compile('(?=(' + alternation + '))') if keywords else None
+        self._hiding = {
+            keyword for keyword in keywords
+            if any(self._rank[other] < self._rank[keyword] and starts_inside(other, keyword) for other in keywords)
+        }
+        self._memo = {}  # Raw string -> (weights, bits)
+        self._token_memo = {}  # Token -> index into CATEGORIES, or None
+
+        if (self.rules, self.default, self.delimiters) == (DEFAULT_RULES, DEFAULT_CATEGORY, DELIMITERS):
+            self.rules_id = None  # Built-in table, as recorded by older load stats
+        else:
+            table = json.dumps([self.rules, self.default, self.delimiters])
+            self.rules_id = hashlib.blake2b(table.encode('utf-8'), digest_size=8).hexdigest()
+
+    @classmethod
+    def from_file(cls, rules_file):
+        """Classifier for a JSON rule table
+
+        The file holds {"rules": {category: [keyword, ...], ...}} in priority
+        order, optionally with "default" and "delimiters".
+        """
+        with open(rules_file, encoding='utf-8') as f:
+            table = json.load(f)
+        if not isinstance(table, dict) or not isinstance(table.get('rules'), dict):
+            raise ValueError(f"{rules_file} must hold an object with a \"rules\" object")
+        return cls(
+            list(table['rules'].items()),
+            table.get('default', DEFAULT_CATEGORY),
+            table.get('delimiters', DELIMITERS)
+        )
+
+    def tokens(self, review_categories):
+        """Lowercased tokens of a raw categories string"""
+        if not review_categories:
+            return []
+        for delimiter in self.delimiters:
+            if delimiter in review_categories:
+                return [token.strip().lower() for token in review_categories.split(delimiter)]
+        return [review_categories.strip().lower()]
+
+    def token_category(self, token):
+        """Index into CATEGORIES of the first rule matching token, or None"""
+        if self._pattern is None:
+            return None
+        matches = self._pattern.findall(token)
+        if not matches:
+            return None
+        if self._hiding and not self._hiding.isdisjoint(matches):
+            matches = self._overlapping.findall(token)
+        return self._rule_category[min(map(self._rank.__getitem__, matches))]
+
+    def classify(self, review_categories):
+        """(weights, bits) of a raw categories string
+
+        weights counts the tokens naming each of CATEGORIES; bit i of bits is
+        set when CATEGORIES[i] is named at all.
+        """
+        result = self._memo.get(review_categories)
+        if result is not None:
+            return result
+
+        weights = [0] * len(CATEGORIES)
+        bits = 0
+        token_memo = self._token_memo
+        for token in self.tokens(review_categories):
+            index = token_memo.get(token, -1)
+            if index == -1:
+                index = self.token_category(token)
+                if len(token_memo) >= self.memo_size:
+                    token_memo.clear()
+                token_memo[token] = index
+            if index is not None:
+                weights[index] += 1
+                bits |= 1 << index
+        if not bits:
+            index = CATEGORIES.index(self.default)
+            weights[index] = 1
+            bits = 1 << index
+
+        result = (tuple(weights), bits)
+        if len(self._memo) >= self.memo_size:
+            self._memo.clear()
+        self._memo[review_categories] = result
+        return result
+
+DEFAULT_CLASSIFIER = CategoryClassifier()
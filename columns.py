@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Storage primitives
+Growable NumPy columns, dictionary-encoded string tables and UTF-8 text columns,
+all convertible to flat arrays for snapshots
+"""
+
+import copy
+import numpy as np
+
+def concat_ranges(starts, lengths):
+    """Indices of the concatenated ranges [start, start + length)"""
+    total = int(lengths.sum())
+    # Each index is its range's start plus its position within the range
+    range_base = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return range_base + np.arange(total)
+
+def encode_strings(values):
+    """Pack strings into (offsets, blob): value i is blob[offsets[i]:offsets[i + 1]] as UTF-8"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+def decode_strings(offsets, blob):
+    """Inverse of encode_strings"""
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+
+class StringTable:
+    """Dictionary encoding of repeated strings to integer codes"""
+
+    def __init__(self, values=None):
+        self.values = values if values is not None else []
+        self._codes = None
+        self._lower_codes = None
+        self._view = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def view(self):
+        """Fixed-length copy for readers; later encodes do not show up in it
+
+        The copy is reused until the table grows, so unchanged tables keep
+        their case-insensitive lookup across views.
+        """
+        if self._view is None or len(self._view) != len(self.values):
+            self._view = StringTable(self.values[:])
+        return self._view
+
+    def code(self, value):
+        """Code of value, or None if it has not been encoded yet"""
+        if self._codes is None:
+            self._codes = {entry: code for code, entry in enumerate(self.values)}
+        return self._codes.get(value)
+
+    def encode(self, value):
+        code = self.code(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+            self._lower_codes = None
+        return code
+
+    def codes_matching(self, value):
+        """Codes of every entry equal to value, ignoring case"""
+        if self._lower_codes is None:
+            lower_codes = {}
+            for code, entry in enumerate(self.values):
+                lower_codes.setdefault(entry.lower(), []).append(code)
+            self._lower_codes = lower_codes
+        return np.array(self._lower_codes.get(value.lower(), []), dtype=np.int32)
+
+    def to_arrays(self):
+        offsets, blob = encode_strings(self.values)
+        return {'offsets': offsets, 'blob': blob}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(decode_strings(arrays['offsets'], arrays['blob']))
+
+class TextColumn:
+    """Strings kept as one UTF-8 blob plus offsets and decoded on access
+
+    Rows appended after construction are held as Python strings.
+    """
+
+    def __init__(self, offsets=None, blob=None):
+        self._offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self._blob = blob if blob is not None else np.empty(0, dtype=np.uint8)
+        self._view = memoryview(self._blob)
+        self._base = len(self._offsets) - 1
+        self._tail = []
+        self._length = self._base
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if i < self._base:
+            return str(self._view[int(self._offsets[i]):int(self._offsets[i + 1])], 'utf-8')
+        return self._tail[i - self._base]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def append(self, value):
+        self._tail.append(value)
+        self._length += 1
+
+    def view(self):
+        """Fixed-length view sharing storage; later appends do not show up in it"""
+        return copy.copy(self)
+
+    def to_arrays(self):
+        tail = self._tail[:self._length - self._base]
+        if not tail:
+            return {'offsets': self._offsets, 'blob': self._blob}
+        offsets, blob = encode_strings(tail)
+        return {
+            'offsets': np.concatenate([self._offsets, offsets[1:] + self._offsets[-1]]),
+            'blob': np.concatenate([self._blob, blob])
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['offsets'], arrays['blob'])
+
+class Column:
+    """Append-only NumPy column with amortized growth"""
+
+    def __init__(self, dtype, capacity=1024):
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    @classmethod
+    def from_array(cls, data):
+        """Wrap existing (possibly read-only) data; the first append copies it"""
+        column = cls(data.dtype, 0)
+        column._data = data
+        column._size = len(data)
+        return column
+
+    def __len__(self):
+        return self._size
+
+    def append(self, value):
+        if self._size == len(self._data):
+            self._grow(self._size + 1)
+        self._data[self._size] = value
+        self._size += 1
+
+    def extend(self, values):
+        needed = self._size + len(values)
+        if needed > len(self._data):
+            self._grow(needed)
+        self._data[self._size:needed] = values
+        self._size = needed
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self._data), 1024)
+        data = np.empty(capacity, dtype=self._data.dtype)
+        data[:self._size] = self._data[:self._size]
+        self._data = data
+
+    @property
+    def values(self):
+        return self._data[:self._size]
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Streaming review export
+Serializes the reviews matching a filter as NDJSON or CSV a block of rows at a
+time, so memory stays flat however many reviews are exported
+"""
+
+import csv
+import io
+import json
+import math
+import zlib
+
+from row_scan import matching_blocks
+
+EXPORT_FIELDS = ['hotel_name', 'city', 'review_text', 'sentiment', 'rating', 'date', 'categories', 'keywords']
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'reviews.ndjson'),
+    'csv': ('text/csv', 'reviews.csv')
+}
+BLOCK_ROWS = 8192
+
+def export_record(review):
+    """Review dict with NaN sentiments as null, which strict JSON and CSV readers accept"""
+    if isinstance(review['sentiment'], float) and math.isnan(review['sentiment']):
+        review['sentiment'] = None
+    return review
+
+def ndjson_chunks(store, blocks):
+    """One JSON object per line"""
+    for rows in blocks:
+        yield ''.join(json.dumps(export_record(store.row(i)), ensure_ascii=False) + '\n' for i in rows)
+
+def csv_chunks(store, blocks):
+    """CSV with a header row"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, EXPORT_FIELDS)
+    writer.writeheader()
+    for rows in blocks:
+        for i in rows:
+            writer.writerow(export_record(store.row(i)))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def encode_chunks(chunks, compress=False, level=6):
+    """UTF-8 encode text chunks, gzip-compressing them on the fly if asked"""
+    if not compress:
+        for chunk in chunks:
+            if chunk:
+                yield chunk.encode('utf-8')
+        return
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_reviews(store, filters, search='', export_format='ndjson', compress=False):
+    """Byte chunks of the matching reviews in export_format"""
+    blocks = matching_blocks(store, filters, search, block_rows=BLOCK_ROWS)
+    chunks = csv_chunks(store, blocks) if export_format == 'csv' else ndjson_chunks(store, blocks)
+    return encode_chunks(chunks, compress)
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Streaming CSV ingestion
+Detects the file encoding once from a leading sample, then parses reviews in
+fixed-size chunks that are fed straight into a ReviewStore
+"""
+
+import codecs
+import csv
+import hashlib
+import io
+import os
+
+from review_store import ReviewStore
+
+SAMPLE_SIZE = 1 << 20
+CHUNK_SIZE = 50000
+FINGERPRINT_BLOCK = 1 << 16
+FINGERPRINT_BLOCKS = 16
+
+# Accepted column names per field, in order of preference
+COLUMN_ALIASES = {
+    'hotel_name': ['hotel_name', 'Hotel Name', 'hotel'],
+    'city': ['city', 'City', 'location'],
+    'review_text': ['review_text', 'Review Text', 'review'],
+    'sentiment': ['sentiment', 'Sentiment', 'sentiment_score'],
+    'rating': ['rating', 'Rating', 'score'],
+    'date': ['date', 'Date', 'review_date'],
+    'categories': ['categories', 'Categories', 'category'],
+    'keywords': ['keywords', 'Keywords', 'keyword']
+}
+
+def detect_encoding(csv_file, sample_size=SAMPLE_SIZE):
+    """Pick the file encoding from a leading sample"""
+    with open(csv_file, 'rb') as file:
+        sample = file.read(sample_size)
+
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # The sample may end inside a multi-byte character
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        # latin-1 decodes any byte sequence
+        return 'latin-1'
+
+def sample_digest(path, size):
+    """Digest of evenly spaced blocks from the first size bytes of a file, the first and last included"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        last_block = max(size - FINGERPRINT_BLOCK, 0)
+        for i in range(FINGERPRINT_BLOCKS):
+            offset = last_block * i // (FINGERPRINT_BLOCKS - 1)
+            file.seek(offset)
+            digest.update(file.read(min(FINGERPRINT_BLOCK, size - offset)))
+    return digest.hexdigest()
+
+def file_fingerprint(path, size=None, status=None):
+    """Sampled digest of the first size bytes of a file (all of it by default), plus its size, mtime and inode
+
+    status is the file's os.stat, taken before reading it. The stat fields let
+    file_unchanged recognize an untouched file without reading it, and
+    has_prefix tell a rewrite from an append.
+    """
+    status = status or os.stat(path)
+    if size is None:
+        size = status.st_size
+    return {
+        'size': size,
+        'digest': sample_digest(path, size),
+        'file_size': status.st_size,
+        'mtime_ns': status.st_mtime_ns,
+        'inode': status.st_ino
+    }
+
+def file_unchanged(status, fingerprint):
+    """Whether a file's os.stat still matches the one its fingerprint recorded"""
+    return (status.st_size, status.st_mtime_ns, status.st_ino) == (
+        fingerprint.get('file_size'), fingerprint.get('mtime_ns'), fingerprint.get('inode'))
+
+def has_prefix(path, fingerprint, status=None):
+    """Whether the bytes a fingerprint covers are still at the start of a file
+
+    An untouched file passes without a read. Appending only ever grows a
+    file in place, so one that kept or lost size, or was replaced by another
+    inode, was rewritten. Otherwise the sampled blocks are compared, which
+    reads the same few blocks however large the file is; a same-length edit
+    between them made along with an append goes unnoticed until a full
+    reload (/api/refresh?mode=full).
+    """
+    status = status or os.stat(path)
+    if file_unchanged(status, fingerprint):
+        return True
+    if status.st_size <= fingerprint.get('file_size', -1) or status.st_ino != fingerprint.get('inode', status.st_ino):
+        return False
+    return status.st_size >= fingerprint['size'] and sample_digest(path, fingerprint['size']) == fingerprint['digest']
+
+def parse_float(value):
+    """Convert a CSV value to float, defaulting to 0.0"""
+    try:
+        return float(value) if value else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+def parse_score(value):
+    """Convert a CSV sentiment to float, or None when it is empty or unparseable"""
+    try:
+        return float(value) if value else None
+    except (ValueError, TypeError):
+        return None
+
+def normalize_record(record, field_indexes):
+    """Turn one CSV record into ReviewStore.append arguments, or None to skip it
+
+    A missing sentiment is left as None for fill_scores.
+    """
+    values = []
+    for indexes in field_indexes:
+        # First non-empty value among the field's columns
+        value = ''
+        for i in indexes:
+            if i < len(record) and record[i]:
+                value = record[i]
+                break
+        values.append(value)
+    hotel_name, city, review_text, sentiment, rating, date, categories, keywords = values
+
+    # Skip empty rows
+    if not review_text or not hotel_name:
+        return None
+
+    return (
+        hotel_name.strip(),
+        city.strip(),
+        review_text.strip(),
+        parse_score(sentiment),
+        parse_float(rating),
+        date.strip(),
+        categories.strip(),
+        keywords.strip()
+    )
+
+class ByteRange(io.RawIOBase):
+    """Raw stream over bytes [start, end) of an open binary file"""
+
+    def __init__(self, file, start, end):
+        file.seek(start)
+        self._file = file
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self._file.readinto(memoryview(buffer)[:self._remaining])
+        self._remaining -= count
+        return count
+
+class RecordLines:
+    """Decoded lines of bytes [start, end) of an open binary file, for csv.reader
+
+    csv.reader asks for lines only as it needs them, so after each record it
+    returns, offset is where that record ends. complete is False when the
+    record ran into the end of the range: its last line has no line break, or
+    a quoted field was still open.
+    """
+
+    def __init__(self, file, start, end, encoding):
+        self._file = io.BufferedReader(ByteRange(file, start, end))
+        self._decode = codecs.getincrementaldecoder(encoding)().decode
+        self.offset = start
+        self.complete = True
+
+    def __iter__(self):
+        decode = self._decode
+        for line in iter(self._file.readline, b''):
+            self.offset += len(line)
+            self.complete = line.endswith(b'\n')
+            if line.endswith(b'\r\n'):
+                line = line[:-2] + b'\n'
+            yield decode(line)
+        self.complete = False
+
+def scorer_name(scorer):
+    """Name recorded in load stats for the scorer that filled in missing sentiments"""
+    return scorer.name if scorer is not None else None
+
+def fill_scores(chunk, scorer=None):
+    """Replace missing sentiments in a chunk of reviews with scorer's scores (0.0 without one)
+
+    Returns how many reviews were missing a sentiment.
+    """
+    missing = [i for i, review in enumerate(chunk) if review[3] is None]
+    if missing:
+        scores = scorer.score([chunk[i][2] for i in missing]) if scorer is not None else [0.0] * len(missing)
+        for i, score in zip(missing, scores):
+            chunk[i] = chunk[i][:3] + (score,) + chunk[i][4:]
+    return len(missing)
+
+def read_chunks(lines, stats, chunk_size=CHUNK_SIZE, header=None, scorer=None):
+    """Yield lists of normalized reviews parsed from RecordLines
+
+    stats counts rows read, malformed rows (unparseable, and dropped), ragged
+    rows (a field count that does not match the header, read as far as their
+    fields go), rows skipped for lacking a hotel or text and rows without a
+    sentiment, which scorer fills in. Pass header when
+    reading from the middle of a file. An incomplete last record is left
+    unread, and stats['offset'] is kept at the end of the last complete one.
+    """
+    reader = csv.reader(lines)
+    stats['offset'] = lines.offset
+    if header is None:
+        header = next(reader, None)
+        if header is None or not lines.complete:
+            return
+        stats['header'] = header
+        stats['offset'] = lines.offset
+
+    columns = {name: i for i, name in enumerate(header)}
+    field_indexes = [[columns[name] for name in aliases if name in columns] for aliases in COLUMN_ALIASES.values()]
+
+    chunk = []
+    while True:
+        try:
+            record = next(reader)
+        except StopIteration:
+            break
+        except csv.Error as e:
+            stats['malformed'] += 1
+            print(f"Malformed CSV row near line {reader.line_num}: {str(e)}")
+            stats['offset'] = lines.offset
+            continue
+
+        if not lines.complete:
+            break
+        stats['offset'] = lines.offset
+        if not record:
+            continue
+        if len(record) != len(header):
+            stats['ragged'] = stats.get('ragged', 0) + 1
+
+        review = normalize_record(record, field_indexes)
+        if review is None:
+            stats['skipped'] += 1
+            continue
+
+        chunk.append(review)
+        stats['rows'] += 1
+        if len(chunk) >= chunk_size:
+            stats['unscored'] = stats.get('unscored', 0) + fill_scores(chunk, scorer)
+            yield chunk
+            chunk = []
+
+    if chunk:
+        stats['unscored'] = stats.get('unscored', 0) + fill_scores(chunk, scorer)
+        yield chunk
+
+def read_range(csv_file, store, stats, start, end, header=None, chunk_size=CHUNK_SIZE, scorer=None):
+    """Parse the complete records in bytes [start, end) of csv_file into store in chunks"""
+    with open(csv_file, 'rb') as raw:
+        lines = RecordLines(raw, start, end, stats['encoding'])
+        for chunk in read_chunks(lines, stats, chunk_size, header, scorer):
+            store.extend(chunk)
+
+def new_stats(encoding, scorer=None):
+    """Load stats before any row has been read"""
+    return {'encoding': encoding, 'rows': 0, 'malformed': 0, 'ragged': 0, 'skipped': 0, 'unscored': 0,
+            'scorer': scorer_name(scorer)}
+
+def load_csv(csv_file, chunk_size=CHUNK_SIZE, scorer=None, classifier=None):
+    """Stream a reviews CSV into a new ReviewStore, returning (store, stats)
+
+    Besides row counts, stats records the encoding, header, offset where the
+    last complete record ends and a fingerprint of the bytes before it so append_csv can pick up where this load stopped, the
+    scorer that filled in missing sentiments and the category rules used.
+    """
+    store, stats = read_csv(csv_file, lambda: ReviewStore(classifier), chunk_size, scorer)
+    stats['category_rules'] = store.classifier.rules_id
+    return store, stats
+
+def read_csv(csv_file, new_sink, chunk_size=CHUNK_SIZE, scorer=None):
+    """Stream a whole reviews CSV into new_sink(), anything with an extend(reviews) method
+
+    Returns (sink, stats) like load_csv; a sink that was fed rows decoded in
+    the wrong encoding is dropped for a fresh one.
+    """
+    encoding = detect_encoding(csv_file)
+    status = os.stat(csv_file)
+    size = status.st_size
+
+    while True:
+        sink = new_sink()
+        stats = new_stats(encoding, scorer)
+        try:
+            read_range(csv_file, sink, stats, 0, size, chunk_size=chunk_size, scorer=scorer)
+            break
+        except UnicodeDecodeError as e:
+            # Only reachable when bytes past the sample are not valid in the detected encoding
+            if encoding == 'latin-1':
+                raise
+            print(f"Failed to decode {csv_file} as {encoding} past the sample ({str(e)}), retrying as latin-1")
+            encoding = 'latin-1'
+
+    if stats['offset'] < size:
+        # A writer is still adding the last row; the next refresh reads it
+        print(f"Left an incomplete last row of {csv_file} for the next refresh")
+    stats['fingerprint'] = file_fingerprint(csv_file, stats['offset'], status)
+    return sink, stats
+
+def append_csv(store, csv_file, stats, chunk_size=CHUNK_SIZE, scorer=None, end=None):
+    """Ingest complete rows appended to csv_file since stats was recorded
+
+    Returns the updated stats, or None when the file was truncated or rewritten,
+    or its rows were scored by another scorer or categorized by other rules
+    than store's, and it needs a full load instead. end stops the read at that
+    offset instead of the end of the file.
+    """
+    offset = stats.get('offset')
+    if offset is None or 'header' not in stats or stats.get('scorer') != scorer_name(scorer):
+        return None
+    if stats.get('category_rules') != store.classifier.rules_id:
+        return None
+
+    status = os.stat(csv_file)
+    size = status.st_size
+    if size < offset:
+        return None
+    if file_unchanged(status, stats['fingerprint']):
+        return stats
+    if not has_prefix(csv_file, stats['fingerprint'], status):
+        return None
+
+    if end is None:
+        end = size
+    elif end > size:
+        return None
+    stats = dict(stats)
+    if end > offset:
+        # A trailing incomplete record is left for the next refresh
+        read_range(csv_file, store, stats, offset, end, stats['header'], chunk_size, scorer)
+    stats['fingerprint'] = file_fingerprint(csv_file, stats['offset'], status)
+    return stats
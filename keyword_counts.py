@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Mergeable keyword counts
+Partial keyword counters per (hotel, city) and day that merge into top keyword
+lists for any hotel, city and date filter, exactly or within a memory bound
+"""
+
+import numpy as np
+
+from aggregates import _cell_keys
+from columns import concat_ranges
+
+BLOCK_ENTRIES = 1 << 16
+
+def merge_counts(ids, counts, first):
+    """Sum counts and keep the earliest first position per keyword id"""
+    if not len(ids):
+        return ids, counts, first
+    order = np.argsort(ids, kind='stable')
+    ids = ids[order]
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    return ids[starts], np.add.reduceat(counts[order], starts), np.minimum.reduceat(first[order], starts)
+
+def _ranked(counts, first, limit):
+    """Indices of the limit highest counts, ties broken by earliest first position"""
+    if limit < len(counts):
+        # Only entries reaching the limit-th largest count can make the list
+        threshold = np.partition(counts, len(counts) - limit)[len(counts) - limit]
+        candidates = np.flatnonzero(counts >= threshold)
+    else:
+        candidates = np.arange(len(counts))
+    return candidates[np.lexsort((first[candidates], -counts[candidates]))][:limit]
+
+def rank_counts(ids, counts, first, limit):
+    """Top keyword ids and counts of merged counters"""
+    order = _ranked(counts, first, limit)
+    return ids[order], counts[order]
+
+def top_counts(ids, counts, first, limit):
+    """Exact top keyword ids and totals from (id, count, first position) entries"""
+    return rank_counts(*merge_counts(ids, counts, first), limit)
+
+def bounded_counts(blocks, capacity):
+    """Merge entry blocks keeping at most capacity counters at a time
+
+    blocks yields (ids, counts, first) entry arrays. After each block only the
+    capacity largest counters survive, as in Misra-Gries summaries, so counts
+    are lower bounds. Returns merged (ids, counts, first, error) where error
+    bounds how far any count, or the count of a dropped keyword, may fall short.
+    """
+    ids = np.empty(0, dtype=np.int32)
+    counts = np.empty(0, dtype=np.int64)
+    first = np.empty(0, dtype=np.int64)
+    error = 0
+    for block_ids, block_counts, block_first in blocks:
+        ids, counts, first = merge_counts(
+            np.concatenate([ids, block_ids]), np.concatenate([counts, block_counts]), np.concatenate([first, block_first])
+        )
+        if len(ids) > capacity:
+            keep = _ranked(counts, first, capacity)
+            dropped = np.ones(len(ids), dtype=bool)
+            dropped[keep] = False
+            error += int(counts[dropped].max())
+            ids, counts, first = ids[keep], counts[keep], first[keep]
+    return ids, counts, first, error
+
+def entry_blocks(ids, counts, first, starts, lengths, block_entries=BLOCK_ENTRIES):
+    """Yield entries of the ranges [start, start + length) a block at a time
+
+    A first of None uses each entry's position as its first position.
+    """
+    ends = np.cumsum(lengths)
+    i = 0
+    while i < len(starts):
+        # Whole ranges per block, at least one
+        j = max(int(np.searchsorted(ends, ends[i] - lengths[i] + block_entries, 'right')), i + 1)
+        positions = concat_ranges(starts[i:j], lengths[i:j])
+        yield ids[positions], counts[positions], positions if first is None else first[positions]
+        i = j
+
+class KeywordCounts:
+    """Keyword counts per (hotel, city) group and epoch day
+
+    Every cell holds exact (keyword, count) pairs plus the position of the
+    keyword's earliest entry in the store, so merged top lists break ties the
+    same way as counting the rows directly. update() replaces arrays rather
+    than mutating them, so a shallow copy is a consistent read-only view.
+    """
+
+    def __init__(self):
+        self.rows = 0
+
+        # Groups: one per distinct (hotel, city) pair
+        self._group_ids = {}
+        self.group_hotel = np.empty(0, dtype=np.int32)
+        self.group_city = np.empty(0, dtype=np.int32)
+
+        # Cells sorted by (group, day); cell i owns entries offsets[i]:offsets[i + 1]
+        self._cell_keys = np.empty(0, dtype=np.int64)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._keyword_ids = np.empty(0, dtype=np.int32)
+        self._counts = np.empty(0, dtype=np.int64)
+        self._first = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._cell_keys)
+
+    def update(self, hotel_code, city_code, days, keyword_offsets, keyword_ids, keyword_counts):
+        """Fold newly appended rows into the counters
+
+        keyword_offsets holds the store's CSR offsets for the new rows (one more
+        than the number of rows); keyword_ids and keyword_counts are the store's
+        full entry arrays.
+        """
+        if not len(days):
+            return
+
+        pairs, inverse = np.unique(
+            (np.asarray(hotel_code, dtype=np.int64) << 32) | np.asarray(city_code, dtype=np.int64), return_inverse=True
+        )
+        group_ids = np.array([self._group_id((pair >> 32, pair & 0xFFFFFFFF)) for pair in pairs.tolist()], dtype=np.int64)
+        groups = group_ids[inverse.reshape(-1)]
+        self.group_hotel = np.array([group[0] for group in self._group_ids], dtype=np.int32)
+        self.group_city = np.array([group[1] for group in self._group_ids], dtype=np.int32)
+
+        # One entry per (row, keyword), tagged with its row's cell
+        lengths = np.diff(keyword_offsets)
+        positions = np.arange(keyword_offsets[0], keyword_offsets[-1])
+        cells = np.repeat(_cell_keys(groups, days), lengths)
+        self.rows += len(days)
+        if not len(cells):
+            return
+
+        # Only the new entries are sorted, then reduced to one per cell and keyword
+        ids = keyword_ids[positions]
+        order = np.lexsort((positions, ids, cells))
+        cells = cells[order]
+        ids = ids[order]
+        starts = np.flatnonzero(np.r_[True, (cells[1:] != cells[:-1]) | (ids[1:] != ids[:-1])])
+        cells = cells[starts]
+        ids = ids[starts]
+        counts = np.add.reduceat(keyword_counts[positions][order], starts)
+        first = positions[order][starts]
+
+        # Entries sort by (cell rank, keyword id); existing entries are already in that order
+        new_cells = np.unique(cells)
+        cell_slots = np.searchsorted(self._cell_keys, new_cells)
+        known = cell_slots < len(self._cell_keys)
+        known[known] = self._cell_keys[cell_slots[known]] == new_cells[known]
+        cell_keys = np.insert(self._cell_keys, cell_slots[~known], new_cells[~known])
+        old_ranks = np.repeat(np.searchsorted(cell_keys, self._cell_keys), np.diff(self._offsets))
+        old_keys = (old_ranks << 32) | self._keyword_ids
+        new_keys = (np.searchsorted(cell_keys, cells) << 32) | ids
+        slots = np.searchsorted(old_keys, new_keys)
+        found = slots < len(old_keys)
+        found[found] = old_keys[slots[found]] == new_keys[found]
+
+        # Existing entries keep their first position, which precedes any new row
+        merged_counts = self._counts.copy()
+        merged_counts[slots[found]] += counts[found]
+        added = ~found
+        self._keyword_ids = np.insert(self._keyword_ids, slots[added], ids[added])
+        self._counts = np.insert(merged_counts, slots[added], counts[added])
+        self._first = np.insert(self._first, slots[added], first[added])
+
+        ranks = np.insert(old_ranks, slots[added], new_keys[added] >> 32)
+        self._cell_keys = cell_keys
+        self._offsets = np.r_[np.flatnonzero(np.r_[True, ranks[1:] != ranks[:-1]]), len(ranks)].astype(np.int64)
+
+    def _group_id(self, group):
+        group_id = self._group_ids.get(group)
+        if group_id is None:
+            group_id = self._group_ids[group] = len(self._group_ids)
+        return group_id
+
+    def to_arrays(self):
+        return {
+            'rows': np.array([self.rows], dtype=np.int64),
+            'groups': np.array(list(self._group_ids), dtype=np.int32).reshape(-1, 2),
+            'cell_keys': self._cell_keys,
+            'offsets': self._offsets,
+            'keyword_ids': self._keyword_ids,
+            'counts': self._counts,
+            'first': self._first
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        counts = cls()
+        counts.rows = int(arrays['rows'][0])
+        groups = arrays['groups']
+        counts._group_ids = {group: group_id for group_id, group in enumerate(map(tuple, groups.tolist()))}
+        counts.group_hotel = np.ascontiguousarray(groups[:, 0])
+        counts.group_city = np.ascontiguousarray(groups[:, 1])
+        counts._cell_keys = arrays['cell_keys']
+        counts._offsets = arrays['offsets']
+        counts._keyword_ids = arrays['keyword_ids']
+        counts._counts = arrays['counts']
+        counts._first = arrays['first']
+        return counts
+
+    def entry_ranges(self, hotel_codes, city_codes, first_day, last_day):
+        """(starts, lengths) of the entries of cells matching the filters"""
+        mask = np.ones(len(self.group_hotel), dtype=bool)
+        if hotel_codes is not None:
+            mask &= np.isin(self.group_hotel, hotel_codes)
+        if city_codes is not None:
+            mask &= np.isin(self.group_city, city_codes)
+        groups = np.flatnonzero(mask)
+
+        lo = np.searchsorted(self._cell_keys, _cell_keys(groups, first_day), 'left')
+        hi = np.searchsorted(self._cell_keys, _cell_keys(groups, last_day), 'right')
+        # Cells of one group are contiguous, so each group is one run of entries
+        starts = self._offsets[lo]
+        return starts, self._offsets[hi] - starts
+
+    def top(self, hotel_codes, city_codes, first_day, last_day, limit, capacity=None):
+        """Top keyword ids and totals for the filters
+
+        With capacity set, counts are merged through a bounded summary and
+        may undercount; see bounded_counts.
+        """
+        starts, lengths = self.entry_ranges(hotel_codes, city_codes, first_day, last_day)
+        if capacity:
+            blocks = entry_blocks(self._keyword_ids, self._counts, self._first, starts, lengths)
+            ids, counts, first, _ = bounded_counts(blocks, capacity)
+            return rank_counts(ids, counts, first, limit)
+
+        positions = concat_ranges(starts, lengths)
+        return top_counts(self._keyword_ids[positions], self._counts[positions], self._first[positions], limit)
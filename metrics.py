@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Request instrumentation
+Per-stage request timers reported as Server-Timing, latency histograms
+rendered in the Prometheus text format, and an opt-in sampling profiler that
+keeps the stacks of slow requests
+"""
+
+import contextvars
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_timer = contextvars.ContextVar('request_timer', default=None)
+
+class RequestTimer:
+    """Durations of the named stages of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        """Server-Timing header value, durations in milliseconds"""
+        entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.stages.items()]
+        return ', '.join(entries + [f'total;dur={total * 1000:.2f}'])
+
+def start_request():
+    """Start timing the current request"""
+    timer = RequestTimer()
+    _timer.set(timer)
+    return timer
+
+def finish_request():
+    """Stop timing the current request, returning its timer (None if not timed)"""
+    timer = _timer.get()
+    _timer.set(None)
+    return timer
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as a stage of the current request, if one is timed"""
+    timer = _timer.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+def _labels(labels):
+    """Prometheus label set, e.g. {route="/api/data"}"""
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metrics:
+    """Request counts, latency histograms and stage totals per route
+
+    Values owned elsewhere (row counts, cache counters) are not stored;
+    render() takes their current values from the caller.
+    """
+
+    def __init__(self, prefix='sentiment', buckets=LATENCY_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = Counter()  # (route, status) -> requests
+        self._latency = {}  # route -> [count per bucket..., sum, count]
+        self._stages = {}  # (route, stage) -> [sum, count]
+
+    def observe(self, route, status, seconds, stages=None):
+        """Record one finished request and its stage durations"""
+        with self._lock:
+            self._requests[(route, status)] += 1
+            series = self._latency.setdefault(route, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+            for name, stage_seconds in (stages or {}).items():
+                totals = self._stages.setdefault((route, name), [0.0, 0])
+                totals[0] += stage_seconds
+                totals[1] += 1
+
+    def render(self, values=()):
+        """Prometheus text exposition of the metrics plus values
+
+        values yields (name, type, help, value) where type is gauge or counter
+        and value is a number or a dict of label tuples to numbers.
+        """
+        name = f'{self.prefix}_requests_total'
+        lines = [f'# HELP {name} Requests served by route and status', f'# TYPE {name} counter']
+        with self._lock:
+            for (route, status), count in sorted(self._requests.items()):
+                lines.append(f"{name}{_labels([('route', route), ('status', status)])} {count}")
+
+            name = f'{self.prefix}_request_duration_seconds'
+            lines += [f'# HELP {name} Request latency by route', f'# TYPE {name} histogram']
+            for route, series in sorted(self._latency.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{name}_bucket{_labels([('route', route), ('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{_labels([('route', route), ('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{name}_sum{_labels([('route', route)])} {series[-2]!r}")
+                lines.append(f"{name}_count{_labels([('route', route)])} {series[-1]}")
+
+            name = f'{self.prefix}_stage_duration_seconds'
+            lines += [f'# HELP {name} Time spent in each request stage', f'# TYPE {name} summary']
+            for (route, stage_name), (total, count) in sorted(self._stages.items()):
+                labels = _labels([('route', route), ('stage', stage_name)])
+                lines.append(f'{name}_sum{labels} {total!r}')
+                lines.append(f'{name}_count{labels} {count}')
+
+        for name, kind, help_text, value in values:
+            name = f'{self.prefix}_{name}'
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            series = value if isinstance(value, dict) else {(): value}
+            for labels, number in series.items():
+                lines.append(f'{name}{_labels(labels)} {_number(number)}')
+        return '\n'.join(lines) + '\n'
+
+def _folded(frame):
+    """Stack of frame, outermost first, as one folded-stack line"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class SlowRequestProfiler:
+    """Sampling profiler for requests slower than threshold_ms (0 disables it)
+
+    A background thread samples the stacks of in-flight requests every
+    interval_ms. The samples of a slow request are written to directory as
+    folded stacks ("frame;frame;frame count" lines), which flamegraph.pl and
+    speedscope read; the rest are dropped.
+    """
+
+    def __init__(self, threshold_ms=0, interval_ms=5, directory='profiles'):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self._samples = {}  # thread id -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def begin(self):
+        """Start sampling the calling request thread"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._samples[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def end(self, name, seconds):
+        """Stop sampling the calling thread; returns the stack file written, if slow"""
+        with self._lock:
+            samples = self._samples.pop(threading.get_ident(), None)
+        if not samples or seconds < self.threshold:
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', name).strip('-') or 'request'
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{seconds * 1000:.0f}ms.folded")
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in samples.most_common():
+                f.write(f'{stack} {count}\n')
+        return path
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._samples.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[_folded(frame)] += 1
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Negative review index
+Per-category posting lists of negative reviews, most severe first, so the
+worst reviews matching a filter are found without scanning the store
+"""
+
+import numpy as np
+
+NEGATIVE_THRESHOLD = -0.1
+FIRST_BLOCK = 256
+MAX_BLOCK = 1 << 16
+
+class NegativeIndex:
+    """Rows with sentiment below NEGATIVE_THRESHOLD per standard category
+
+    Lists are ordered by sentiment, most negative first; ties go to the newer
+    review, then to the earlier row. update() replaces the lists rather than
+    mutating them, so a shallow copy is a consistent read-only view.
+    """
+
+    def __init__(self, num_categories):
+        self.rows = 0
+        self.lists = [np.empty(0, dtype=np.int32) for _ in range(num_categories)]
+
+    def update(self, sentiment, day, category_mask):
+        """Fold rows appended since the last update, given the store's full columns"""
+        start = self.rows
+        if start == len(sentiment):
+            return
+
+        new_rows = start + np.flatnonzero(sentiment[start:] < NEGATIVE_THRESHOLD)
+        new_bits = category_mask[new_rows]
+        lists = []
+        for i, rows in enumerate(self.lists):
+            rows = np.concatenate([rows, new_rows[(new_bits >> i) & 1 == 1]])
+            order = np.lexsort((rows, -day[rows].astype(np.int64), sentiment[rows]))
+            lists.append(rows[order].astype(np.int32))
+        self.lists = lists
+        self.rows = len(sentiment)
+
+    def top(self, category, limit, predicate=None):
+        """First limit rows of a category's list that satisfy predicate
+
+        predicate maps an array of rows to a boolean mask. The list is tested
+        in growing blocks, so dense filters cost about limit rows.
+        """
+        rows = self.lists[category]
+        if predicate is None:
+            return rows[:limit]
+
+        found = []
+        count = 0
+        start = 0
+        block = max(FIRST_BLOCK, 2 * limit)
+        while count < limit and start < len(rows):
+            matches = rows[start:start + block]
+            matches = matches[predicate(matches)]
+            found.append(matches)
+            count += len(matches)
+            start += block
+            block = min(block * 2, MAX_BLOCK)
+        return np.concatenate(found)[:limit] if found else rows[:0]
+
+    def to_arrays(self):
+        arrays = {'rows': np.array([self.rows], dtype=np.int64)}
+        for i, rows in enumerate(self.lists):
+            arrays[f'list.{i}'] = rows
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, num_categories, arrays):
+        index = cls(num_categories)
+        index.rows = int(arrays['rows'][0])
+        index.lists = [arrays[f'list.{i}'] for i in range(num_categories)]
+        return index
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Keyset pagination
+Pages through reviews in a presorted order, resuming after the last review of
+the previous page instead of skipping an offset
+"""
+
+import base64
+import json
+
+import numpy as np
+
+from review_store import SORT_KEYS
+
+MAX_PAGE_SIZE = 500
+FIRST_BLOCK = 256
+MAX_BLOCK = 1 << 16
+SORTED_CANDIDATES = MAX_BLOCK  # Searches with at most this many candidate rows put them in order outright
+
+class PageError(ValueError):
+    """Raised for an unknown sort order, a bad page size or a malformed cursor"""
+
+def encode_cursor(sort, descending, value, row):
+    """Opaque cursor naming the last review of a page"""
+    data = json.dumps([sort, int(descending), value, int(row)]).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor, returning (sort, descending, (value, row))"""
+    try:
+        sort, descending, value, row = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if sort not in SORT_KEYS or not isinstance(row, int) or not isinstance(value, (int, float)):
+            raise ValueError
+        # JSON true and false decode as ints; a row outside the store's int32 range would overflow NumPy
+        if isinstance(row, bool) or isinstance(value, bool) or not 0 <= row < 1 << 31:
+            raise ValueError
+    except (ValueError, TypeError):
+        raise PageError('invalid cursor')
+    return sort, bool(descending), (value, row)
+
+def _rank(value):
+    """Comparable form of a sort value; NaN sorts after every number"""
+    return (1, 0.0) if value != value else (0, value)
+
+class Page:
+    """Sort order, resume point and size of one page of reviews"""
+
+    def __init__(self, sort='row', descending=False, after=None, limit=20):
+        self.sort = sort
+        self.descending = descending
+        self.after = after  # (value, row) of the previous page's last review
+        self.limit = limit
+
+    @classmethod
+    def from_args(cls, args, default_limit):
+        """Page from sort, order, limit and cursor query parameters
+
+        A cursor carries its own sort order, overriding sort and order.
+        """
+        cursor = args.get('cursor', '')
+        if cursor:
+            sort, descending, after = decode_cursor(cursor)
+        else:
+            sort = args.get('sort', 'row')
+            order = args.get('order', 'asc')
+            if sort not in SORT_KEYS:
+                raise PageError(f"sort must be one of {', '.join(SORT_KEYS)}")
+            if order not in ('asc', 'desc'):
+                raise PageError('order must be asc or desc')
+            descending = order == 'desc'
+            after = None
+
+        try:
+            limit = int(args.get('limit', default_limit))
+        except ValueError:
+            raise PageError('limit must be an integer')
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise PageError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+        return cls(sort, descending, after, limit)
+
+    @property
+    def from_start(self):
+        """Whether this is the first page in load order"""
+        return self.sort == 'row' and not self.descending and self.after is None
+
+    def key(self):
+        return (self.sort, self.descending, self.after, self.limit)
+
+    def finish(self, store, rows):
+        """Up to limit rows and the cursor of the next page, given up to limit + 1 rows"""
+        if len(rows) <= self.limit:
+            return rows, None
+        rows = rows[:self.limit]
+        last = int(rows[-1])
+        value = last if self.sort == 'row' else store.sort_values(self.sort)[last].item()
+        return rows, encode_cursor(self.sort, self.descending, value, last)
+
+def _ordered_before(store, sort, after, inclusive):
+    """Number of rows ascending-ordered before after, or up to and including it"""
+    value, row = after
+    if sort == 'row':
+        return min(row + 1 if inclusive else row, len(store))
+
+    order = store.sort_order(sort)
+    values = store.sort_values(sort)
+    target = (_rank(value), row)
+    lo, hi = 0, len(order)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        item = (_rank(values[order[mid]].item()), int(order[mid]))
+        if item < target or (inclusive and item == target):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def _ordered_rows(store, sort, lo, hi):
+    """Rows at positions [lo, hi) of the ascending order"""
+    if sort == 'row':
+        return np.arange(lo, hi)
+    return store.sort_order(sort)[lo:hi]
+
+def page_sorted(store, page, predicate=None):
+    """One page of the rows satisfying predicate, walking the presorted order
+
+    predicate maps an array of rows to a boolean mask. The walk starts at the
+    cursor and stops once the page is full, so dense filters cost about a page.
+    Returns (rows, next cursor or None).
+    """
+    total = len(store)
+    found = []
+    count = 0
+    block = max(FIRST_BLOCK, 2 * (page.limit + 1))
+    if page.descending:
+        position = total if page.after is None else _ordered_before(store, page.sort, page.after, False)
+    else:
+        position = 0 if page.after is None else _ordered_before(store, page.sort, page.after, True)
+
+    while count <= page.limit and (position > 0 if page.descending else position < total):
+        if page.descending:
+            rows = _ordered_rows(store, page.sort, max(position - block, 0), position)[::-1]
+            position -= len(rows)
+        else:
+            rows = _ordered_rows(store, page.sort, position, min(position + block, total))
+            position += len(rows)
+        if predicate is not None:
+            rows = rows[predicate(rows)]
+        found.append(rows)
+        count += len(rows)
+        block = min(block * 2, MAX_BLOCK)
+
+    rows = np.concatenate(found)[:page.limit + 1] if found else np.empty(0, dtype=np.int64)
+    return page.finish(store, rows)
+
+def page_row_set(store, rows, page):
+    """One page of an explicit set of rows given in row order
+
+    Returns (rows, next cursor or None).
+    """
+    return page.finish(store, _rows_after(store, rows, page)[:page.limit + 1])
+
+def _rows_after(store, rows, page):
+    """Rows given in row order, put in page order and cut to those past the cursor"""
+    rows = np.asarray(rows, dtype=np.int64)
+    if page.sort == 'row':
+        ordered = rows
+        keys = []
+    else:
+        values = store.sort_values(page.sort)[rows]
+        missing = np.isnan(values) if values.dtype.kind == 'f' else np.zeros(len(values), dtype=bool)
+        values = np.where(missing, 0, values)
+        order = np.lexsort((rows, values, missing))
+        ordered = rows[order]
+        keys = [missing[order], values[order]]
+    if page.descending:
+        ordered = ordered[::-1]
+        keys = [key[::-1] for key in keys]
+
+    if page.after is not None:
+        # Compare (missing, value, row) tuples with the cursor, least significant first
+        value, row = page.after
+        targets = [] if page.sort == 'row' else list(_rank(value))
+        later = ordered > row
+        earlier = ordered < row
+        for key, target in reversed(list(zip(keys, targets))):
+            later = (key > target) | ((key == target) & later)
+            earlier = (key < target) | ((key == target) & earlier)
+        # The rows past the cursor form a suffix of the page order
+        start = np.flatnonzero(earlier if page.descending else later)[:1]
+        ordered = ordered[int(start[0]) if len(start) else len(ordered):]
+    return ordered
+
+def page_search(store, page, search, filters=None):
+    """One page of the rows whose review text contains search and that match filters
+
+    filters is (hotel codes, city codes, first day, last day), or None. A few
+    candidate rows from the text index are put in page order and verified
+    until the page is full; otherwise page_sorted verifies rows as its walk
+    reaches them. Either way a page costs about a page of matches, however
+    many reviews match. Returns (rows, next cursor or None).
+    """
+    query = search.lower()
+    index = store.text_index
+    candidates = index.candidates(query)
+    if candidates is not None and len(candidates) <= SORTED_CANDIDATES:
+        # The index may hold rows added after store was published
+        rows = candidates[:np.searchsorted(candidates, len(store))]
+        if filters is not None:
+            rows = rows[store.filter_mask(*filters, rows)]
+        rows = index.first_matches(query, store.review_text, _rows_after(store, rows, page), page.limit + 1)
+        return page.finish(store, rows)
+
+    def predicate(rows):
+        mask = store.filter_mask(*filters, rows) if filters is not None else np.ones(len(rows), dtype=bool)
+        if candidates is not None:
+            positions = np.minimum(np.searchsorted(candidates, rows), len(candidates) - 1)
+            mask &= candidates[positions] == rows
+        mask[mask] = index.contains(query, store.review_text, rows[mask])
+        return mask
+
+    return page_sorted(store, page, predicate)
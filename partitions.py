@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Partitioned datasets
+Serves a directory or glob of review CSVs, such as one export per month or per
+city, as one dataset. A manifest keeps each partition's row counts, date range,
+hotels, cities and yearly sentiment counts, so requests load only the
+partitions their filters can match, each the first time one is needed.
+"""
+
+import glob
+import json
+import os
+import numpy as np
+
+from columns import Column, StringTable
+from ingest import CHUNK_SIZE, append_csv, file_unchanged, has_prefix, new_stats, read_csv, read_range, scorer_name
+from review_store import MISSING_DAY, MAX_DAY, NUM_BUCKETS, parse_date, sentiment_buckets
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+GLOB_CHARACTERS = '*?['
+
+def is_partitioned(path):
+    """Whether a data path names a directory or glob of CSV files rather than one file"""
+    return os.path.isdir(path) or any(character in path for character in GLOB_CHARACTERS)
+
+def partition_files(path):
+    """CSV files of a partitioned dataset, in name order"""
+    pattern = os.path.join(path, '*.csv') if os.path.isdir(path) else path
+    return sorted(file for file in glob.glob(pattern) if os.path.isfile(file))
+
+def default_manifest_file(path):
+    """Manifest location for a data path: inside the directory, or next to the glob's files"""
+    directory = path if os.path.isdir(path) else os.path.dirname(path)
+    return os.path.join(directory, MANIFEST_NAME)
+
+def day_to_iso(day):
+    return str(np.datetime64(int(day), 'D'))
+
+def iso_to_day(value):
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+class PartitionSummary:
+    """Collects the manifest figures of a partition from its normalized reviews"""
+
+    def __init__(self):
+        self.hotels = StringTable()
+        self.cities = StringTable()
+        self._date_days = {}
+        self.hotel_code = Column(np.int32)
+        self.city_code = Column(np.int32)
+        self.day = Column(np.int32)
+        self.sentiment = Column(np.float64)
+
+    def extend(self, reviews):
+        for hotel_name, city, _, sentiment, _, date, _, _ in reviews:
+            day = self._date_days.get(date)
+            if day is None:
+                day = self._date_days[date] = parse_date(date)
+            self.hotel_code.append(self.hotels.encode(hotel_name))
+            self.city_code.append(self.cities.encode(city))
+            self.day.append(day)
+            self.sentiment.append(sentiment)
+
+    def entry(self):
+        """Date range, hotels, cities and (hotel, city, year, bucket, count) rows of dated reviews"""
+        days = self.day.values
+        dated = days != MISSING_DAY
+        years = days[dated].astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+        keys = np.stack([
+            self.hotel_code.values[dated], self.city_code.values[dated], years,
+            sentiment_buckets(self.sentiment.values[dated])
+        ], axis=1).astype(np.int64)
+        groups, counts = np.unique(keys.reshape(-1, 4), axis=0, return_counts=True)
+        return {
+            'first_date': day_to_iso(days[dated].min()) if dated.any() else None,
+            'last_date': day_to_iso(days[dated].max()) if dated.any() else None,
+            'hotels': self.hotels.values,
+            'cities': self.cities.values,
+            'trend': np.column_stack([groups, counts]).tolist()
+        }
+
+def scan_partition(csv_file, scorer=None, chunk_size=CHUNK_SIZE):
+    """Manifest entry for one partition CSV
+
+    Besides the figures used for pruning it keeps the encoding and byte range
+    that were read, so loading the partition later reads exactly those rows.
+    """
+    summary, stats = read_csv(csv_file, PartitionSummary, chunk_size, scorer)
+    return dict(stats, file=csv_file, **summary.entry())
+
+def load_partition(store, entry, scorer=None, chunk_size=CHUNK_SIZE):
+    """Append the rows a manifest entry covers to store, returning load stats for append_csv"""
+    csv_file = entry['file']
+    offset = entry['offset']
+    if not has_prefix(csv_file, entry['fingerprint']):
+        raise ValueError(f"{csv_file} changed since the manifest was written")
+
+    stats = new_stats(entry['encoding'], scorer)
+    read_range(csv_file, store, stats, 0, offset, chunk_size=chunk_size, scorer=scorer)
+    stats['fingerprint'] = entry['fingerprint']
+    stats['category_rules'] = store.classifier.rules_id
+    return stats
+
+class PartitionIndex:
+    """Lookup form of a manifest entry"""
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.hotels = {hotel.lower() for hotel in entry['hotels']}
+        self.cities = {city.lower() for city in entry['cities']}
+        self.first_day = iso_to_day(entry['first_date']) if entry['first_date'] else None
+        self.last_day = iso_to_day(entry['last_date']) if entry['last_date'] else None
+        self.trend = np.array(entry['trend'], dtype=np.int64).reshape(-1, 5)
+        self.hotel_names = np.array([hotel.lower() for hotel in entry['hotels']], dtype=object)
+        self.city_names = np.array([city.lower() for city in entry['cities']], dtype=object)
+
+    def matches(self, hotel, city, first_day, last_day):
+        """Whether the partition can hold reviews matching lowercased filters (None for no filter)"""
+        if hotel is not None and hotel not in self.hotels:
+            return False
+        if city is not None and city not in self.cities:
+            return False
+        if (first_day, last_day) != (MISSING_DAY, MAX_DAY):
+            # Undated reviews never match a date filter
+            if self.first_day is None or self.first_day > last_day or self.last_day < first_day:
+                return False
+        return True
+
+    def trend_rows(self, hotel, city):
+        """(year, bucket, count) rows of the trend matching lowercased filters"""
+        mask = np.ones(len(self.trend), dtype=bool)
+        if hotel is not None:
+            mask &= self.hotel_names[self.trend[:, 0]] == hotel
+        if city is not None:
+            mask &= self.city_names[self.trend[:, 1]] == city
+        return self.trend[mask, 2:]
+
+def filter_value(value):
+    """Lowercased hotel or city filter, or None for no filter"""
+    return value.lower() if value and value != 'all' else None
+
+class PartitionedDataset:
+    """Manifest of a partitioned dataset plus the partitions loaded into a store
+
+    Partitions are appended to the store in the order requests first need
+    them, so that is also the load order of their rows.
+    """
+
+    def __init__(self, path, manifest_file=None, scorer=None, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.manifest_file = manifest_file or default_manifest_file(path)
+        self.scorer = scorer
+        self.chunk_size = chunk_size
+        self.partitions = []  # PartitionIndex per file, in name order
+        self.loaded = {}  # File -> load stats of each partition in the store
+
+    def read_manifest(self):
+        """Entries of the manifest file by partition file, or {} if it is missing or unreadable"""
+        try:
+            with open(self.manifest_file, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        return {entry['file']: entry for entry in manifest.get('partitions', [])}
+
+    def write_manifest(self):
+        temp_file = self.manifest_file + '.tmp'
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': MANIFEST_VERSION, 'partitions': [index.entry for index in self.partitions]}, f)
+            os.replace(temp_file, self.manifest_file)
+        except OSError as e:
+            # Read-only deployments rescan on every start instead
+            print(f"Could not write manifest {self.manifest_file}: {str(e)}")
+
+    def is_current(self, csv_file, entry):
+        """Whether entry still describes csv_file"""
+        return (
+            entry.get('scorer') == scorer_name(self.scorer) and
+            file_unchanged(os.stat(csv_file), entry['fingerprint'])
+        )
+
+    def update_manifest(self):
+        """Scan partitions that are new or changed since the manifest, returning (changed, removed) files"""
+        previous = {index.entry['file']: index.entry for index in self.partitions} or self.read_manifest()
+        partitions = []
+        changed = []
+        for csv_file in partition_files(self.path):
+            entry = previous.get(csv_file)
+            if entry is None or not self.is_current(csv_file, entry):
+                entry = scan_partition(csv_file, self.scorer, self.chunk_size)
+                changed.append(csv_file)
+            partitions.append(PartitionIndex(entry))
+
+        removed = sorted(previous.keys() - {index.entry['file'] for index in partitions})
+        self.partitions = partitions
+        if changed or removed or not os.path.exists(self.manifest_file):
+            self.write_manifest()
+        return changed, removed
+
+    def unloaded(self, hotel_filter=None, city_filter=None, first_day=MISSING_DAY, last_day=MAX_DAY):
+        """Manifest entries of partitions not loaded yet that can hold reviews matching the filters"""
+        hotel = filter_value(hotel_filter)
+        city = filter_value(city_filter)
+        return [
+            index.entry for index in self.partitions
+            if index.entry['file'] not in self.loaded and index.matches(hotel, city, first_day, last_day)
+        ]
+
+    def load(self, store, entries):
+        """Append partitions to store, returning how many reviews were added"""
+        before = len(store)
+        for entry in entries:
+            if entry['file'] not in self.loaded:
+                self.loaded[entry['file']] = load_partition(store, entry, self.scorer, self.chunk_size)
+        return len(store) - before
+
+    def holds_loaded(self, store):
+        """Whether store holds exactly the rows of the loaded partitions, and none of a failed load"""
+        return len(store) == sum(stats['rows'] for stats in self.loaded.values())
+
+    def reset(self):
+        """Forget loaded partitions, for a new empty store"""
+        self.loaded = {}
+
+    def refresh(self, store):
+        """Bring the manifest and the partitions loaded into store up to date
+
+        Rows appended to loaded partitions are appended to store. Returns False
+        when a loaded partition was rewritten or removed, so store has to be
+        replaced by an empty one.
+        """
+        changed, removed = self.update_manifest()
+        if any(csv_file in self.loaded for csv_file in removed):
+            return False
+
+        entries = {index.entry['file']: index.entry for index in self.partitions}
+        for csv_file in changed:
+            stats = self.loaded.get(csv_file)
+            if stats is None:
+                continue
+            entry = entries[csv_file]
+            stats = append_csv(store, csv_file, stats, self.chunk_size, self.scorer, end=entry['offset'])
+            if stats is None or stats['fingerprint']['digest'] != entry['fingerprint']['digest']:
+                return False
+            self.loaded[csv_file] = stats
+        return True
+
+    def yearly(self, hotel_filter=None, city_filter=None):
+        """Bucket counts per calendar year of dated reviews matching the filters, loaded or not"""
+        hotel = filter_value(hotel_filter)
+        city = filter_value(city_filter)
+        rows = np.concatenate([index.trend_rows(hotel, city) for index in self.partitions] or [np.empty((0, 3), dtype=np.int64)])
+        if not len(rows):
+            return {}
+
+        first_year = int(rows[:, 0].min())
+        num_years = int(rows[:, 0].max()) - first_year + 1
+        counts = np.bincount(
+            (rows[:, 0] - first_year) * NUM_BUCKETS + rows[:, 1], weights=rows[:, 2], minlength=num_years * NUM_BUCKETS
+        ).astype(np.int64).reshape(-1, NUM_BUCKETS)
+        return {first_year + int(i): counts[i] for i in np.flatnonzero(counts.sum(axis=1))}
+
+    def stats(self):
+        """Row counts summed over every partition, plus partition counts"""
+        stats = {
+            key: sum(index.entry.get(key, 0) for index in self.partitions)
+            for key in ('rows', 'malformed', 'ragged', 'skipped', 'unscored')
+        }
+        stats['partitions'] = len(self.partitions)
+        stats['loaded_partitions'] = len(self.loaded)
+        return stats
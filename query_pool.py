@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Query pool
+Runs heavy request work on a bounded pool of threads, so a burst of expensive
+queries cannot occupy every connection thread, and lets concurrent requests
+for the same result share one computation
+"""
+
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+class QueryPool:
+    """Bounded thread pool with per-key sharing of in-flight work
+
+    Work runs in a copy of the caller's context, so Flask's request context
+    and the request timer stay available. workers=0 runs work in the calling
+    thread, still sharing it with concurrent callers of the same key.
+    """
+
+    def __init__(self, workers=0):
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='query') if workers > 0 else None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.shared = 0  # Calls answered by another caller's computation
+
+    def run(self, key, func, *args):
+        """func(*args), or the result of an identical call already in flight for key"""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                if self._pool is None:
+                    future = Future()
+                else:
+                    future = self._pool.submit(contextvars.copy_context().run, func, *args)
+                self._inflight[key] = future
+            else:
+                self.shared += 1
+
+        if owner:
+            future.add_done_callback(lambda done: self._forget(key, done))
+            if self._pool is None:
+                try:
+                    future.set_result(func(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+        return future.result()
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self):
+        with self._lock:
+            return {'workers': self.workers, 'in_flight': len(self._inflight), 'shared': self.shared}
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Response cache
+LRU cache of finished JSON response bodies with a time-to-live and a memory
+bound, so repeated dashboard queries skip both computation and serialization
+"""
+
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+class CachedResponse:
+    """A serialized response body, its ETag and a lazily built gzip copy"""
+
+    def __init__(self, body, mimetype, expires):
+        self.body = body
+        self.mimetype = mimetype
+        self.expires = expires
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.gzip_body = None
+
+    @property
+    def size(self):
+        return len(self.body) + (len(self.gzip_body) if self.gzip_body is not None else 0)
+
+class ResponseCache:
+    """Thread-safe LRU of CachedResponse entries
+
+    Entries older than ttl seconds are treated as misses; the least recently
+    used entries are evicted once the stored bodies exceed max_bytes. A
+    max_bytes of 0 disables caching.
+    """
+
+    def __init__(self, max_bytes=32 << 20, ttl=300, compress_level=6):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.compress_level = compress_level
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Cached entry for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype):
+        """Store a response body under key, returning its entry"""
+        entry = CachedResponse(body, mimetype, time.monotonic() + self.ttl)
+        if entry.size > self.max_bytes:
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+        return entry
+
+    def gzip_body(self, key, entry):
+        """Gzip-compressed body of the entry stored under key, compressed on first use"""
+        if entry.gzip_body is None:
+            compressed = gzip.compress(entry.body, self.compress_level)
+            with self._lock:
+                if entry.gzip_body is None:
+                    entry.gzip_body = compressed
+                    # The entry may have been evicted while compressing
+                    if self._entries.get(key) is entry:
+                        self._bytes += len(compressed)
+                        self._evict()
+        return entry.gzip_body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key).size
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            self._bytes -= self._entries.popitem(last=False)[1].size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
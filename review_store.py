@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Columnar review store
+Keeps loaded reviews as NumPy columns with dictionary-encoded strings
+"""
+
+import copy
+import re
+from datetime import datetime, date
+import numpy as np
+
+from aggregates import AggregateCube
+from category_classifier import CATEGORIES, DEFAULT_CLASSIFIER, MEMO_SIZE
+from columns import Column, StringTable, TextColumn, concat_ranges
+from keyword_counts import KeywordCounts, bounded_counts, entry_blocks, merge_counts, rank_counts
+from negative_index import NegativeIndex
+from search_index import TextIndex
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MISSING_DAY = np.iinfo(np.int32).min
+MAX_DAY = np.iinfo(np.int32).max
+
+# Sentiment buckets, in the order the dashboard reports them. NaN scores get their
+# own bucket: category and trend panels count them as neutral, the neutral KPI does not
+POSITIVE, NEGATIVE, NEUTRAL, UNDEFINED = 0, 1, 2, 3
+NUM_BUCKETS = 4
+
+# Orders reviews can be listed in; 'row' is load order
+SORT_KEYS = ['row', 'date', 'sentiment', 'rating']
+
+STOP_WORDS = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our', 'their'}
+
+def parse_date(date_str):
+    """Parse a review date string into an epoch day (MISSING_DAY if unparseable)"""
+    if not date_str:
+        return MISSING_DAY
+    try:
+        # Handle different date formats
+        if '/' in date_str:
+            # Format: M/D/YYYY or MM/DD/YYYY
+            date_obj = datetime.strptime(date_str, '%m/%d/%Y')
+        else:
+            # Format: YYYY-MM-DD
+            date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+    except ValueError:
+        return MISSING_DAY
+    return date_obj.toordinal() - EPOCH_ORDINAL
+
+def extract_keywords(text):
+    """Extract keywords from text"""
+    if not text:
+        return []
+    
+    # Simple keyword extraction
+    words = re.findall(r'\b\w+\b', text.lower())
+    
+    # Filter out common stop words
+    keywords = [word for word in words if len(word) > 2 and word not in STOP_WORDS]
+    return keywords[:10]  # Return top 10 keywords
+
+def parse_keywords(keywords):
+    """Parse a "keyword1:count1, keyword2:count2" string into a keyword -> count dict"""
+    keyword_counts = {}
+    for pair in keywords.split(','):
+        if ':' in pair:
+            keyword, count = pair.split(':', 1)
+            keyword = keyword.strip()
+            try:
+                count = int(count.strip())
+                keyword_counts[keyword] = keyword_counts.get(keyword, 0) + count
+            except ValueError:
+                keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
+        else:
+            keyword = pair.strip()
+            if keyword:
+                keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
+    return keyword_counts
+
+def sentiment_buckets(sentiment):
+    """Vectorized sentiment bucket for each sentiment score"""
+    buckets = np.full(len(sentiment), NEUTRAL, dtype=np.int8)
+    buckets[sentiment > 0.1] = POSITIVE
+    buckets[sentiment < -0.1] = NEGATIVE
+    buckets[np.isnan(sentiment)] = UNDEFINED
+    return buckets
+
+def to_epoch_day(value):
+    """Convert a datetime filter value into an epoch day"""
+    return value.toordinal() - EPOCH_ORDINAL
+
+class ReviewStore:
+    """Column-oriented storage for reviews with integer-coded string fields"""
+
+    def __init__(self, classifier=None):
+        self.classifier = classifier or DEFAULT_CLASSIFIER  # Maps raw categories strings to CATEGORIES
+        self.hotels = StringTable()
+        self.cities = StringTable()
+        self.categories = StringTable()
+        self.dates = StringTable()
+        self.vocabulary = StringTable()
+        self._date_days = []
+
+        # Per distinct categories string: how often each standard category is named
+        self._category_weights = []
+        self._category_bits = []
+        self._category_matrix = None
+        self._parsed_keywords = {}  # Recent raw keywords strings -> (keyword id, count) pairs
+
+        self._hotel_code = Column(np.int32)
+        self._city_code = Column(np.int32)
+        self._category_code = Column(np.int32)
+        self._date_code = Column(np.int32)
+        self._day = Column(np.int32)
+        self._sentiment = Column(np.float64)
+        self._rating = Column(np.float64)
+        self._category_mask = Column(np.uint8)
+
+        # Parsed keywords in CSR layout: row i owns entries offsets[i]:offsets[i + 1]
+        self._keyword_offsets = Column(np.int64)
+        self._keyword_offsets.append(0)
+        self._keyword_ids = Column(np.int32)
+        self._keyword_counts = Column(np.int64)
+
+        # Free text, decoded on access and searchable through text_index
+        self.review_text = TextColumn()
+        self.keywords = TextColumn()
+        self.text_index = TextIndex()
+        self._cube = AggregateCube(NUM_BUCKETS)
+        self._keyword_cells = KeywordCounts()
+        self._negative_index = NegativeIndex(len(CATEGORIES))
+
+        # Per sort key other than 'row': rows ordered by (value, row), NaN last
+        self._sort_orders = {}
+
+    def __len__(self):
+        return len(self.review_text)
+
+    def append(self, hotel_name, city, review_text, sentiment, rating, date, categories, keywords):
+        """Append one normalized review
+
+        Everything that can raise runs before the first column grows, so a
+        review that fails leaves the columns as they were.
+        """
+        sentiment = float(sentiment)
+        rating = float(rating)
+
+        date_code = self.dates.code(date)
+        if date_code is None:
+            day = parse_date(date)
+            date_code = self.dates.encode(date)
+            self._date_days.append(day)
+
+        category_code = self.categories.code(categories)
+        if category_code is None:
+            weights, bits = self.classifier.classify(categories)
+            category_code = self.categories.encode(categories)
+            self._category_weights.append(weights)
+            self._category_bits.append(bits)
+            self._category_matrix = None
+
+        # Use existing keywords if available, otherwise extract them from the text
+        if keywords:
+            keyword_counts = self._parsed_keywords.get(keywords)
+            if keyword_counts is None:
+                keyword_counts = [(self.vocabulary.encode(k), c) for k, c in parse_keywords(keywords).items()]
+                if len(self._parsed_keywords) >= MEMO_SIZE:
+                    self._parsed_keywords.clear()
+                self._parsed_keywords[keywords] = keyword_counts
+        else:
+            extracted = {}
+            for keyword in extract_keywords(review_text):
+                extracted[keyword] = extracted.get(keyword, 0) + 1
+            keyword_counts = [(self.vocabulary.encode(k), c) for k, c in extracted.items()]
+
+        hotel_code = self.hotels.encode(hotel_name)
+        city_code = self.cities.encode(city)
+        # Tokenizes before it records anything; the columns below cannot fail
+        self.text_index.add(len(self.review_text), review_text)
+
+        self._hotel_code.append(hotel_code)
+        self._city_code.append(city_code)
+        self._category_code.append(category_code)
+        self._category_mask.append(self._category_bits[category_code])
+        self._date_code.append(date_code)
+        self._day.append(self._date_days[date_code])
+        self._sentiment.append(sentiment)
+        self._rating.append(rating)
+        for keyword_id, count in keyword_counts:
+            self._keyword_ids.append(keyword_id)
+            self._keyword_counts.append(count)
+        self._keyword_offsets.append(len(self._keyword_ids))
+        self.review_text.append(review_text)
+        self.keywords.append(keywords)
+
+    # Serialized layout: string tables, columns and text as flat arrays keyed by name
+    STRING_TABLES = ['hotels', 'cities', 'categories', 'dates', 'vocabulary']
+    COLUMNS = [
+        'hotel_code', 'city_code', 'category_code', 'date_code', 'day', 'sentiment', 'rating',
+        'category_mask', 'keyword_offsets', 'keyword_ids', 'keyword_counts'
+    ]
+    TEXT_COLUMNS = ['review_text', 'keywords']
+
+    def to_arrays(self):
+        """Flatten the store, its text index and aggregates into named arrays"""
+        self.update_aggregates()
+        self.update_keyword_cells()
+        self.update_negative_index()
+        self.update_sort_orders()
+        arrays = {
+            'date_days': np.array(self._date_days, dtype=np.int32),
+            'category_weights': self.category_weights,
+            'category_bits': np.array(self._category_bits, dtype=np.uint8)
+        }
+        for name in self.STRING_TABLES:
+            for key, array in getattr(self, name).to_arrays().items():
+                arrays[f'{name}.{key}'] = array
+        for name in self.COLUMNS:
+            arrays[name] = getattr(self, '_' + name).values
+        for name in self.TEXT_COLUMNS:
+            for key, array in getattr(self, name).to_arrays().items():
+                arrays[f'{name}.{key}'] = array
+        for key, array in self.text_index.to_arrays().items():
+            arrays[f'text_index.{key}'] = array
+        for key, array in self._cube.to_arrays().items():
+            arrays[f'cube.{key}'] = array
+        for key, array in self._keyword_cells.to_arrays().items():
+            arrays[f'keyword_cells.{key}'] = array
+        for key, array in self._negative_index.to_arrays().items():
+            arrays[f'negative_index.{key}'] = array
+        for key, array in self._sort_orders.items():
+            arrays[f'sort_order.{key}'] = array
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild a store from to_arrays output without copying column data"""
+        def prefixed(prefix):
+            return {key[len(prefix) + 1:]: array for key, array in arrays.items() if key.startswith(prefix + '.')}
+
+        store = cls()
+        store._date_days = arrays['date_days'].tolist()
+        store._category_weights = arrays['category_weights'].tolist()
+        store._category_bits = arrays['category_bits'].tolist()
+        for name in cls.STRING_TABLES:
+            setattr(store, name, StringTable.from_arrays(prefixed(name)))
+        for name in cls.COLUMNS:
+            setattr(store, '_' + name, Column.from_array(arrays[name]))
+        for name in cls.TEXT_COLUMNS:
+            setattr(store, name, TextColumn.from_arrays(prefixed(name)))
+        store.text_index = TextIndex.from_arrays(prefixed('text_index'))
+        store._cube = AggregateCube.from_arrays(NUM_BUCKETS, prefixed('cube'))
+        keyword_cells = prefixed('keyword_cells')
+        if keyword_cells:
+            store._keyword_cells = KeywordCounts.from_arrays(keyword_cells)
+        negative_index = prefixed('negative_index')
+        if negative_index:
+            store._negative_index = NegativeIndex.from_arrays(len(CATEGORIES), negative_index)
+        store._sort_orders = prefixed('sort_order')
+        return store
+
+    def view(self):
+        """Read-only view of the rows appended so far
+
+        The view shares storage with this store but later appends do not show
+        up in it, so it can be published to request handlers while this store
+        keeps ingesting.
+        """
+        self.update_aggregates()
+        self.update_keyword_cells()
+        self.update_negative_index()
+        self.update_sort_orders()
+        view = copy.copy(self)
+        for name in self.COLUMNS:
+            setattr(view, '_' + name, Column.from_array(getattr(self, '_' + name).values))
+        for name in self.TEXT_COLUMNS + self.STRING_TABLES:
+            setattr(view, name, getattr(self, name).view())
+        view._category_matrix = self.category_weights
+        view._parsed_keywords = {}
+        view._cube = copy.copy(self._cube)
+        view._keyword_cells = copy.copy(self._keyword_cells)
+        view._negative_index = copy.copy(self._negative_index)
+        view._sort_orders = dict(self._sort_orders)
+        return view
+
+    def extend(self, reviews):
+        """Append a chunk of normalized reviews and fold it into the aggregates"""
+        for review in reviews:
+            self.append(*review)
+        self.update_aggregates()
+
+    @property
+    def hotel_code(self):
+        return self._hotel_code.values
+
+    @property
+    def city_code(self):
+        return self._city_code.values
+
+    @property
+    def category_code(self):
+        return self._category_code.values
+
+    @property
+    def day(self):
+        return self._day.values
+
+    def update_aggregates(self):
+        """Fold rows appended since the last update into the aggregate cube"""
+        start = self._cube.rows
+        if start < len(self):
+            self._cube.update(
+                self.hotel_code[start:], self.city_code[start:], self.category_code[start:],
+                sentiment_buckets(self.sentiment[start:]), self.day[start:]
+            )
+
+    def update_keyword_cells(self):
+        """Fold rows appended since the last update into the keyword counters
+
+        Unlike the cube this is not kept current during ingestion, since every
+        update re-sorts all counters; views and snapshots bring it up to date.
+        """
+        start = self._keyword_cells.rows
+        if start < len(self):
+            self._keyword_cells.update(
+                self.hotel_code[start:], self.city_code[start:], self.day[start:],
+                self._keyword_offsets.values[start:], self._keyword_ids.values, self._keyword_counts.values
+            )
+
+    def update_negative_index(self):
+        """Fold rows appended since the last update into the negative review lists"""
+        if self._negative_index.rows < len(self):
+            self._negative_index.update(self.sentiment, self.day, self.category_mask)
+
+    def sort_values(self, key):
+        """Column that sort key orders rows by"""
+        return {'date': self.day, 'sentiment': self.sentiment, 'rating': self.rating}[key]
+
+    def update_sort_orders(self):
+        """Extend the presorted row orders with rows appended since the last update"""
+        for key in SORT_KEYS[1:]:
+            order = self._sort_orders.get(key)
+            start = len(order) if order is not None else 0
+            if order is not None and start == len(self):
+                continue
+
+            values = self.sort_values(key)
+            new_rows = (start + np.argsort(values[start:], kind='stable')).astype(np.int32)
+            if start:
+                # Appended rows go after existing rows with equal values
+                positions = np.searchsorted(values[order], values[new_rows], side='right')
+                new_rows = np.insert(order, positions, new_rows)
+            self._sort_orders[key] = new_rows
+
+    def sort_order(self, key):
+        """Rows ordered by a sort key other than 'row', ties in row order"""
+        order = self._sort_orders.get(key)
+        if order is None or len(order) < len(self):
+            self.update_sort_orders()
+            order = self._sort_orders[key]
+        return order
+
+    @property
+    def keyword_cells(self):
+        """Keyword counters per (hotel, city) and day over every row in the store"""
+        self.update_keyword_cells()
+        return self._keyword_cells
+
+    @property
+    def negative_index(self):
+        """Negative reviews per standard category, most severe first"""
+        self.update_negative_index()
+        return self._negative_index
+
+    @property
+    def cube(self):
+        """Aggregate cube over every row in the store"""
+        self.update_aggregates()
+        return self._cube
+
+    @property
+    def category_mask(self):
+        """Bitmask of standard categories per row (bit i is CATEGORIES[i])"""
+        return self._category_mask.values
+
+    @property
+    def category_weights(self):
+        """Matrix of standard category counts per distinct categories string"""
+        if self._category_matrix is None:
+            self._category_matrix = np.array(self._category_weights, dtype=np.int64).reshape(-1, len(CATEGORIES))
+        return self._category_matrix
+
+    @property
+    def sentiment(self):
+        return self._sentiment.values
+
+    @property
+    def rating(self):
+        return self._rating.values
+
+    def keyword_entries(self, rows):
+        """Vocabulary ids and counts of the parsed keywords of rows, in row order"""
+        offsets = self._keyword_offsets.values
+        starts = offsets[rows]
+        positions = concat_ranges(starts, offsets[rows + 1] - starts)
+        return self._keyword_ids.values[positions], self._keyword_counts.values[positions]
+
+    def keyword_totals(self, rows, capacity=None):
+        """Merged keyword counters (ids, totals, first positions, error) over rows
+
+        Counters of disjoint row sets merge with merge_counts. capacity bounds
+        the counters kept while counting (see bounded_counts); error is 0 otherwise.
+        """
+        offsets = self._keyword_offsets.values
+        starts = offsets[rows]
+        lengths = offsets[rows + 1] - starts
+        keyword_ids = self._keyword_ids.values
+        counts = self._keyword_counts.values
+        if capacity:
+            return bounded_counts(entry_blocks(keyword_ids, counts, None, starts, lengths), capacity)
+
+        positions = concat_ranges(starts, lengths)
+        return merge_counts(keyword_ids[positions], counts[positions], positions) + (0,)
+
+    def top_keywords(self, rows, limit, capacity=None):
+        """Top keyword ids and totals over rows; ties go to the keyword seen first"""
+        keyword_ids, totals, first, _ = self.keyword_totals(rows, capacity)
+        return rank_counts(keyword_ids, totals, first, limit)
+
+    def filter_mask(self, hotel_codes, city_codes, first_day, last_day, rows=slice(None)):
+        """Mask over rows (a slice or index array) for hotel, city and date filters
+
+        None codes mean any hotel or city.
+        """
+        days = self.day[rows]
+        mask = (days >= first_day) & (days <= last_day)
+        if hotel_codes is not None:
+            mask &= np.isin(self.hotel_code[rows], hotel_codes)
+        if city_codes is not None:
+            mask &= np.isin(self.city_code[rows], city_codes)
+        return mask
+
+    def search(self, query, mask=None, limit=None, start=0):
+        """Rows whose review text contains query (case-insensitive), in row order
+
+        See TextIndex.search for how start and mask select the rows searched.
+        """
+        return self.text_index.search(query, self.review_text, mask, limit, start)
+
+    def summarize_rows(self, rows):
+        """Row-level equivalent of AggregateCube.summarize for an explicit row set"""
+        buckets = sentiment_buckets(self.sentiment[rows])
+        codes = self.category_code[rows].astype(np.int64)
+        return {
+            'buckets': np.bincount(buckets, minlength=NUM_BUCKETS),
+            'category_buckets': np.bincount(
+                codes * NUM_BUCKETS + buckets, minlength=len(self.categories) * NUM_BUCKETS
+            ).reshape(-1, NUM_BUCKETS),
+            'hotels': np.unique(self.hotel_code[rows]),
+            'cities': np.unique(self.city_code[rows])
+        }
+
+    def row(self, i):
+        """Materialize one review as a dict"""
+        return {
+            'hotel_name': self.hotels.values[self._hotel_code.values[i]],
+            'city': self.cities.values[self._city_code.values[i]],
+            'review_text': self.review_text[i],
+            'sentiment': float(self._sentiment.values[i]),
+            'rating': float(self._rating.values[i]),
+            'date': self.dates.values[self._date_code.values[i]],
+            'categories': self.categories.values[self._category_code.values[i]],
+            'keywords': self.keywords[i]
+        }
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Fused row scan
+One blocked pass over the store that applies the hotel, city, date and search
+predicates and feeds the matching rows to an accumulator of every row-level
+dashboard figure, so no store-sized temporaries are built
+"""
+
+import numpy as np
+
+from keyword_counts import bounded_counts, merge_counts, rank_counts
+from review_store import NUM_BUCKETS, sentiment_buckets
+
+BLOCK_ROWS = 1 << 16
+
+def matching_blocks(store, filters, search='', start=0, end=None, block_rows=BLOCK_ROWS):
+    """Yield the rows in [start, end) matching filters and search, one block at a time
+
+    filters is (hotel codes, city codes, first day, last day). The cheap column
+    predicates run first; only their survivors have their text searched.
+    """
+    end = len(store) if end is None else end
+    query = search.lower()
+    candidates = store.text_index.candidates(query) if query else None
+    for block_start in range(start, end, block_rows):
+        mask = store.filter_mask(*filters, slice(block_start, min(block_start + block_rows, end)))
+        if query:
+            rows = store.text_index.verify(query, candidates, store.review_text, mask, start=block_start)
+        else:
+            rows = block_start + np.flatnonzero(mask)
+        if len(rows):
+            yield rows
+
+class RowAccumulator:
+    """Sentiment, facet and keyword totals of rows added in row order
+
+    Accumulators over consecutive row ranges merge in order, which is how
+    shards combine. capacity bounds the keyword counters (see bounded_counts).
+    """
+
+    def __init__(self, store, capacity=None, head=0):
+        self.capacity = capacity
+        self.head = head
+        self.category_buckets = np.zeros((len(store.categories), NUM_BUCKETS), dtype=np.int64)
+        self.hotels = np.zeros(len(store.hotels), dtype=bool)
+        self.cities = np.zeros(len(store.cities), dtype=bool)
+        self.keywords = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), 0)
+        self.first_rows = np.empty(0, dtype=np.int64)
+
+    def add(self, store, rows):
+        """Fold one block of matching rows in"""
+        buckets = sentiment_buckets(store.sentiment[rows])
+        self.category_buckets += np.bincount(
+            store.category_code[rows].astype(np.int64) * NUM_BUCKETS + buckets, minlength=self.category_buckets.size
+        ).reshape(self.category_buckets.shape)
+        self.hotels[store.hotel_code[rows]] = True
+        self.cities[store.city_code[rows]] = True
+        self._add_keywords(store.keyword_totals(rows, self.capacity))
+        if len(self.first_rows) < self.head:
+            self.first_rows = np.concatenate([self.first_rows, rows[:self.head - len(self.first_rows)]])
+
+    def merge(self, other):
+        """Fold in an accumulator over rows that come after this one's"""
+        self.category_buckets += other.category_buckets
+        self.hotels |= other.hotels
+        self.cities |= other.cities
+        self._add_keywords(other.keywords)
+        self.first_rows = np.concatenate([self.first_rows, other.first_rows])[:self.head]
+
+    def _add_keywords(self, keywords):
+        ids, counts, first = (np.concatenate([a, b]) for a, b in zip(self.keywords[:3], keywords[:3]))
+        error = self.keywords[3] + keywords[3]
+        if self.capacity:
+            ids, counts, first, dropped = bounded_counts([(ids, counts, first)], self.capacity)
+            error += dropped
+        else:
+            ids, counts, first = merge_counts(ids, counts, first)
+        self.keywords = (ids, counts, first, error)
+
+    def summary(self):
+        """Same layout as ReviewStore.summarize_rows"""
+        return {
+            'buckets': self.category_buckets.sum(axis=0),
+            'category_buckets': self.category_buckets,
+            'hotels': np.flatnonzero(self.hotels),
+            'cities': np.flatnonzero(self.cities)
+        }
+
+    def top_keywords(self, limit):
+        """Top keyword ids and totals"""
+        return rank_counts(*self.keywords[:3], limit)
+
+def scan_rows(store, filters, search='', capacity=None, head=0, start=0, end=None):
+    """Accumulate the rows in [start, end) that match filters and search"""
+    accumulator = RowAccumulator(store, capacity, head)
+    for rows in matching_blocks(store, filters, search, start, end):
+        accumulator.add(store, rows)
+    return accumulator
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Full-text search index
+Inverted token index over lowercased review text, with a trigram index over the
+token vocabulary so substring queries keep their original semantics
+"""
+
+import re
+import threading
+from array import array
+import numpy as np
+
+from columns import decode_strings, encode_strings
+
+TOKEN_RE = re.compile(r'\w+')
+
+def _csr(lists):
+    """Pack a list of int sequences into (offsets, values)"""
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(values) for values in lists], out=offsets[1:])
+    values = np.concatenate([np.asarray(values, dtype=np.int32) for values in lists]) if lists else np.empty(0, dtype=np.int32)
+    return offsets, values
+
+class TextIndex:
+    """Inverted index mapping word tokens to the sorted rows that contain them
+
+    A snapshot-loaded index keeps its postings as frozen CSR arrays; tokens and
+    rows added afterwards go to per-token arrays merged in at query time. One
+    writer may add rows while other threads search: searches copy those arrays
+    under _append_lock, which the writer holds while appending to them, since
+    an array cannot grow while a copy is reading its buffer.
+    """
+
+    def __init__(self):
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._append_lock = threading.Lock()
+
+        # Frozen postings and trigram lists, indexed by token id / trigram slot
+        self._posting_offsets = np.zeros(1, dtype=np.int64)
+        self._posting_rows = np.empty(0, dtype=np.int32)
+        self._gram_offsets = np.zeros(1, dtype=np.int64)
+        self._gram_tokens = np.empty(0, dtype=np.int32)
+        self._frozen = None
+
+        # Vocabulary, decoded lazily from the frozen arrays on first use
+        self._tokens = []
+        self._token_ids = {}
+        self._gram_slots = {}
+
+        # Additions since the index was frozen
+        self._postings = {}
+        self._trigrams = {}
+
+    def __len__(self):
+        return self._rows
+
+    def _vocabulary(self):
+        if self._frozen is not None:
+            with self._lock:
+                if self._frozen is not None:
+                    frozen = self._frozen
+                    self._tokens = decode_strings(frozen['token_offsets'], frozen['token_blob'])
+                    self._token_ids = {token: token_id for token_id, token in enumerate(self._tokens)}
+                    grams = decode_strings(frozen['gram_offsets_text'], frozen['gram_blob'])
+                    self._gram_slots = {gram: slot for slot, gram in enumerate(grams)}
+                    self._frozen = None
+        return self._tokens
+
+    def add(self, row, text):
+        """Index one review; rows must be added in increasing order"""
+        self._vocabulary()
+        tokens = set(TOKEN_RE.findall(text.lower()))
+        with self._append_lock:
+            for token in tokens:
+                token_id = self._token_ids.get(token)
+                if token_id is None:
+                    token_id = self._add_token(token)
+                postings = self._postings.get(token_id)
+                if postings is None:
+                    postings = self._postings[token_id] = array('i')
+                postings.append(row)
+            self._rows = row + 1
+
+    def _add_token(self, token):
+        token_id = len(self._tokens)
+        self._token_ids[token] = token_id
+        self._tokens.append(token)
+        for gram in {token[i:i + 3] for i in range(len(token) - 2)}:
+            self._trigrams.setdefault(gram, array('i')).append(token_id)
+        return token_id
+
+    def _token_rows(self, token_id):
+        """Sorted rows containing a token"""
+        parts = []
+        if token_id < len(self._posting_offsets) - 1:
+            parts.append(self._posting_rows[self._posting_offsets[token_id]:self._posting_offsets[token_id + 1]])
+        postings = self._postings.get(token_id)
+        if postings is not None:
+            # Copy: the writer may be appending to this array
+            with self._append_lock:
+                parts.append(np.array(postings, dtype=np.int32))
+        return np.concatenate(parts).astype(np.int64) if parts else np.empty(0, dtype=np.int64)
+
+    def _gram_token_ids(self, gram):
+        """Sorted ids of tokens containing a trigram"""
+        parts = []
+        slot = self._gram_slots.get(gram)
+        if slot is not None:
+            parts.append(self._gram_tokens[self._gram_offsets[slot]:self._gram_offsets[slot + 1]])
+        token_ids = self._trigrams.get(gram)
+        if token_ids is not None:
+            with self._append_lock:
+                parts.append(np.array(token_ids, dtype=np.int32))
+        return np.concatenate(parts) if parts else None
+
+    def _tokens_containing(self, piece):
+        """Ids of vocabulary tokens that contain piece as a substring"""
+        tokens = self._vocabulary()
+        if len(piece) < 3:
+            return [token_id for token_id, token in enumerate(tokens) if piece in token]
+
+        token_ids = None
+        for gram in {piece[i:i + 3] for i in range(len(piece) - 2)}:
+            ids = self._gram_token_ids(gram)
+            if ids is None:
+                return []
+            token_ids = ids if token_ids is None else np.intersect1d(token_ids, ids, assume_unique=True)
+            if not len(token_ids):
+                return []
+        return [token_id for token_id in token_ids if piece in tokens[token_id]]
+
+    def candidates(self, query):
+        """Sorted rows that may contain query, or None if the index cannot narrow it"""
+        # Every word run of the query must sit inside one token of a matching review
+        pieces = TOKEN_RE.findall(query.lower())
+        if not pieces:
+            return None
+
+        rows = None
+        for piece in sorted(set(pieces), key=len, reverse=True):
+            # Short pieces match most of the vocabulary; verification handles them
+            if rows is not None and len(piece) < 3:
+                break
+            token_ids = self._tokens_containing(piece)
+            if len(token_ids) == 1:
+                piece_rows = self._token_rows(token_ids[0])
+            elif token_ids:
+                piece_rows = np.unique(np.concatenate([self._token_rows(token_id) for token_id in token_ids]))
+            else:
+                piece_rows = np.empty(0, dtype=np.int64)
+            rows = piece_rows if rows is None else np.intersect1d(rows, piece_rows, assume_unique=True)
+            if not len(rows):
+                break
+        return rows
+
+    def search(self, query, texts, mask=None, limit=None, start=0):
+        """Rows whose lowercased text contains query, in row order
+
+        Only rows from start on are considered; mask optionally restricts them
+        further, mask[i] standing for row start + i, and rows past the end of
+        mask are skipped. limit stops the search after that many matches.
+        """
+        query = query.lower()
+        return self.verify(query, self.candidates(query), texts, mask, limit, start)
+
+    def verify(self, query, rows, texts, mask=None, limit=None, start=0):
+        """Search given the candidates(query) result, which may be reused across row ranges"""
+        # texts may be a view taken before rows were added to the index
+        end = start + len(mask) if mask is not None else len(texts)
+        if rows is None:
+            rows = np.arange(start, end)
+        else:
+            rows = rows[np.searchsorted(rows, start):np.searchsorted(rows, end)]
+        if mask is not None:
+            rows = rows[mask[rows - start]]
+
+        matches = []
+        for row in rows:
+            if query in texts[row].lower():
+                matches.append(row)
+                if limit and len(matches) >= limit:
+                    break
+        return np.array(matches, dtype=np.int64)
+
+    def contains(self, query, texts, rows):
+        """Mask of the rows, in any order, whose lowercased text contains a lowercased query"""
+        return np.array([query in texts[row].lower() for row in rows], dtype=bool)
+
+    def first_matches(self, query, texts, rows, limit):
+        """Up to limit of the rows, in their given order, whose lowercased text contains a lowercased query"""
+        matches = []
+        for row in rows:
+            if query in texts[row].lower():
+                matches.append(row)
+                if len(matches) >= limit:
+                    break
+        return np.array(matches, dtype=np.int64)
+
+    def to_arrays(self):
+        tokens = self._vocabulary()
+        token_offsets, token_blob = encode_strings(tokens)
+        posting_offsets, posting_rows = _csr([self._token_rows(token_id) for token_id in range(len(tokens))])
+
+        grams = list(self._gram_slots) + [gram for gram in self._trigrams if gram not in self._gram_slots]
+        gram_offsets_text, gram_blob = encode_strings(grams)
+        gram_offsets, gram_tokens = _csr([self._gram_token_ids(gram) for gram in grams])
+        return {
+            'rows': np.array([self._rows], dtype=np.int64),
+            'token_offsets': token_offsets,
+            'token_blob': token_blob,
+            'posting_offsets': posting_offsets,
+            'posting_rows': posting_rows,
+            'gram_offsets_text': gram_offsets_text,
+            'gram_blob': gram_blob,
+            'gram_offsets': gram_offsets,
+            'gram_tokens': gram_tokens
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        index = cls()
+        index._rows = int(arrays['rows'][0])
+        index._posting_offsets = arrays['posting_offsets']
+        index._posting_rows = arrays['posting_rows']
+        index._gram_offsets = arrays['gram_offsets']
+        index._gram_tokens = arrays['gram_tokens']
+        index._frozen = arrays
+        return index
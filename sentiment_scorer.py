@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Offline sentiment scoring
+Lexicon-based scorer for reviews ingested without a sentiment value, in the
+style of VADER: word valences, negation and intensifiers, summed per review
+and squashed into [-1, 1]. Batches are scored with NumPy, large jobs across a
+process pool, and scores are cached by text hash so no review is scored twice.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Word valences on VADER's -4..4 scale, tuned for hotel reviews
+LEXICON = {
+    'amazing': 2.8, 'awesome': 3.1, 'beautiful': 2.9, 'best': 3.2, 'clean': 1.9, 'comfortable': 2.2,
+    'comfy': 2.0, 'convenient': 1.7, 'cozy': 1.9, 'delicious': 2.7, 'excellent': 3.2, 'exceptional': 3.0,
+    'fantastic': 3.2, 'fresh': 1.3, 'friendly': 2.2, 'generous': 2.0, 'good': 1.9, 'gorgeous': 3.0,
+    'great': 3.1, 'happy': 2.7, 'helpful': 1.9, 'impressed': 2.1, 'impressive': 2.3, 'love': 3.2,
+    'loved': 2.9, 'lovely': 2.8, 'modern': 1.0, 'nice': 1.8, 'peaceful': 2.0, 'perfect': 2.7,
+    'pleasant': 2.3, 'polite': 1.8, 'professional': 1.5, 'quiet': 1.2, 'recommend': 1.5, 'relaxing': 2.2,
+    'spacious': 1.8, 'spotless': 2.4, 'stunning': 3.0, 'superb': 3.1, 'tasty': 2.2, 'welcoming': 2.1,
+    'wonderful': 2.7, 'attentive': 1.9, 'efficient': 1.6, 'enjoyed': 2.3, 'value': 1.0, 'central': 0.8,
+    'awful': -3.1, 'bad': -2.5, 'broken': -2.1, 'cold': -0.8, 'complaint': -1.8, 'cramped': -1.7,
+    'dated': -1.2, 'dirty': -2.4, 'disappointed': -2.2, 'disappointing': -2.3, 'disgusting': -3.0,
+    'expensive': -1.1, 'filthy': -3.0, 'horrible': -3.1, 'issue': -1.1, 'issues': -1.1, 'leak': -1.6,
+    'loud': -1.3, 'mediocre': -1.3, 'mold': -2.4, 'mouldy': -2.4, 'moldy': -2.4, 'nasty': -2.9,
+    'noise': -1.3, 'noisy': -1.7, 'overpriced': -1.9, 'poor': -2.1, 'problem': -1.7, 'problems': -1.7,
+    'rude': -2.6, 'slow': -1.3, 'smell': -1.5, 'smelly': -2.1, 'stained': -1.9, 'terrible': -3.1,
+    'uncomfortable': -2.0, 'unfriendly': -2.1, 'unhelpful': -2.0, 'unpleasant': -2.2, 'worst': -3.1,
+    'worn': -1.2, 'bugs': -2.4, 'cockroach': -2.8, 'delay': -1.3, 'delayed': -1.3, 'refund': -1.2,
+    'unacceptable': -2.6, 'waste': -2.1, 'avoid': -1.8
+}
+NEGATIONS = {'not', 'no', 'never', 'nothing', 'nobody', 'none', 'nor', 'neither', 'without', 'hardly',
+             "isn't", "wasn't", "weren't", "aren't", "don't", "didn't", "doesn't", "won't", "wouldn't",
+             "couldn't", "can't", 'cannot', 'isnt', 'wasnt', 'dont', 'didnt', 'doesnt', 'cant'}
+BOOSTERS = {'very': 0.293, 'really': 0.293, 'extremely': 0.293, 'incredibly': 0.293, 'so': 0.293,
+            'super': 0.293, 'absolutely': 0.293, 'totally': 0.293, 'quite': 0.15, 'slightly': -0.293,
+            'somewhat': -0.293, 'barely': -0.293, 'bit': -0.15}
+
+NEGATION_SCALE = -0.74  # Valence multiplier for a word after a negation
+NEGATION_WINDOW = 3  # Words after a negation that it reaches
+NORMALIZE_ALPHA = 15
+TOKEN = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+BATCH_SIZE = 20000
+START_METHOD = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Token id per known word: valence words, then negations, then boosters
+_WORDS = list(LEXICON) + sorted(NEGATIONS - LEXICON.keys()) + sorted(BOOSTERS.keys() - LEXICON.keys() - NEGATIONS)
+_WORD_IDS = {word: i + 1 for i, word in enumerate(_WORDS)}  # 0: any other word
+_VALENCE = np.array([0.0] + [LEXICON.get(word, 0.0) for word in _WORDS])
+_NEGATION = np.array([False] + [word in NEGATIONS for word in _WORDS])
+_BOOST = np.array([0.0] + [BOOSTERS.get(word, 0.0) for word in _WORDS])
+
+def score_texts(texts):
+    """Sentiment in [-1, 1] for each text, rounded to 3 decimals"""
+    token_ids = []
+    lengths = np.empty(len(texts), dtype=np.int64)
+    for i, text in enumerate(texts):
+        tokens = TOKEN.findall(text.lower())
+        lengths[i] = len(tokens)
+        token_ids.extend(_WORD_IDS.get(token, 0) for token in tokens)
+    ids = np.array(token_ids, dtype=np.int64)
+    rows = np.repeat(np.arange(len(texts)), lengths)
+    # Position of each token within its text, so lookbacks stop at the text start
+    position = np.arange(len(ids)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    valence = _VALENCE[ids]
+    negation = _NEGATION[ids]
+    boost = _BOOST[ids]
+
+    # A booster right before a word strengthens (or dampens) it in its own direction
+    previous_boost = np.zeros(len(ids))
+    previous_boost[1:] = np.where(position[1:] >= 1, boost[:-1], 0.0)
+    valence = valence + np.sign(valence) * previous_boost
+
+    negated = np.zeros(len(ids), dtype=bool)
+    for shift in range(1, NEGATION_WINDOW + 1):
+        negated[shift:] |= negation[:-shift] & (position[shift:] >= shift)
+    valence = np.where(negated, valence * NEGATION_SCALE, valence)
+
+    totals = np.bincount(rows, weights=valence, minlength=len(texts))
+    return np.round(totals / np.sqrt(totals * totals + NORMALIZE_ALPHA), 3)
+
+def text_hash(text):
+    """64-bit digest of a review text"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+class LexiconScorer:
+    """Scores review texts, remembering every score by text hash
+
+    Jobs of at least two batches are split across workers processes when
+    workers > 1. cache_file, if given, keeps the cache across restarts.
+    """
+    name = 'lexicon'
+
+    def __init__(self, workers=0, cache_file=None, batch_size=BATCH_SIZE):
+        self.workers = workers
+        self.cache_file = cache_file
+        self.batch_size = batch_size
+        self.cache = {}
+        self.scored = 0  # Texts scored, as opposed to found in the cache
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with np.load(cache_file) as arrays:
+                    self.cache = dict(zip(arrays['hashes'].tolist(), arrays['scores'].tolist()))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring sentiment cache {cache_file}: {str(e)}")
+
+    def score(self, texts):
+        """Scores for texts, computing only those not seen before"""
+        hashes = [text_hash(text) for text in texts]
+        missing = {}
+        for text, key in zip(texts, hashes):
+            if key not in self.cache and key not in missing:
+                missing[key] = text
+        if missing:
+            keys = list(missing)
+            scores = self._score_batches(list(missing.values()))
+            self.cache.update(zip(keys, scores.tolist()))
+            self.scored += len(keys)
+        return [self.cache[key] for key in hashes]
+
+    def _score_batches(self, texts):
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if self.workers > 1 and len(batches) > 1:
+            context = multiprocessing.get_context(START_METHOD)
+            with ProcessPoolExecutor(min(self.workers, len(batches)), context) as pool:
+                return np.concatenate(list(pool.map(score_texts, batches)))
+        return np.concatenate([score_texts(batch) for batch in batches])
+
+    def save(self):
+        """Write the cache to cache_file, if one is configured"""
+        if not self.cache_file:
+            return
+        hashes = np.fromiter(self.cache.keys(), dtype=np.uint64, count=len(self.cache))
+        scores = np.fromiter(self.cache.values(), dtype=np.float64, count=len(self.cache))
+        temporary = self.cache_file + '.tmp'
+        with open(temporary, 'wb') as f:
+            np.savez(f, hashes=hashes, scores=scores)
+        os.replace(temporary, self.cache_file)
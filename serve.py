@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Production server
+Serves the dashboard from a fixed pool of connection threads, while uncached
+/api/data responses are computed on the app's query pool (QUERY_WORKERS) and
+the data file is optionally re-read in the background every RELOAD_INTERVAL
+seconds. A reload builds a new store and publishes it with one assignment, so
+requests never wait for it.
+
+Usage: python serve.py [--host 0.0.0.0] [--port 8000] [--threads 32] [--reload-interval 0]
+"""
+
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from app import app, refresh_reviews
+
+class RequestHandler(WSGIRequestHandler):
+    # One request per connection, so idle keep-alive clients cannot hold pool threads
+    protocol_version = 'HTTP/1.0'
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server handling connections on a fixed pool of threads"""
+    multithread = True
+
+    def __init__(self, host, port, wsgi_app, threads):
+        super().__init__(host, port, wsgi_app, handler=RequestHandler)
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix='http')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.handle_connection, request, client_address)
+
+    def handle_connection(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        super().server_close()
+
+def reload_periodically(interval):
+    """Pick up rows appended to the data file every interval seconds"""
+    while True:
+        time.sleep(interval)
+        try:
+            refresh_reviews()
+        except Exception as e:
+            print(f"Background reload failed: {str(e)}")
+
+def make_server(host='0.0.0.0', port=8000, threads=32, reload_interval=0):
+    """Pooled server for the dashboard, with the background reloader started if asked"""
+    if reload_interval > 0:
+        threading.Thread(target=reload_periodically, args=(reload_interval,), name='reload', daemon=True).start()
+    return PooledWSGIServer(host, port, app, threads)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the dashboard with a pool of request threads')
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8000)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('SERVER_THREADS', 32)),
+                        help='connection threads')
+    parser.add_argument('--reload-interval', type=float, default=float(os.environ.get('RELOAD_INTERVAL', 0)),
+                        help='seconds between background reloads of the data file (0 disables them)')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.threads, args.reload_interval)
+    print(f"Serving on http://{args.host}:{server.server_port} with {args.threads} threads")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
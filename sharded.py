@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Sharded query execution
+Publishes the review store to shared memory and splits the fused row scan
+(filtering, search, summaries, keyword counting) across a process pool, one row
+range per shard, then merges the partial accumulators in row order
+"""
+
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from review_store import ReviewStore
+from row_scan import RowAccumulator, scan_rows
+from snapshot import layout_arrays, map_arrays
+
+# fork lets workers start without re-importing the app; spawn elsewhere
+START_METHOD = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Store attached in a worker process: (segment name, SharedMemory, ReviewStore)
+_attached = None
+
+def _attach(segment):
+    """Store published under segment, mapped into this worker on first use"""
+    global _attached
+    name, entries = segment
+    if _attached is None or _attached[0] != name:
+        if _attached is not None:
+            previous = _attached[1]
+            _attached = None
+            try:
+                previous.close()
+            except BufferError:
+                pass  # Arrays of the old store are still referenced; let it be collected
+        memory = shared_memory.SharedMemory(name=name)
+        _attached = (name, memory, ReviewStore.from_arrays(map_arrays(memory.buf, 0, entries)))
+    return _attached[2]
+
+def _warm_up():
+    return None
+
+def query_shard(segment, start, end, filters, search, capacity, head):
+    """RowAccumulator over rows [start, end) of a published store"""
+    return scan_rows(_attach(segment), filters, search, capacity, head, start, end)
+
+class ShardedExecutor:
+    """Process pool for row-level query work on stores of at least threshold rows
+
+    publish() copies a store into a shared memory segment that the workers map
+    without copying. Fewer than two workers disables sharding.
+    """
+
+    def __init__(self, workers=0, threshold=1_000_000):
+        self.workers = workers
+        self.threshold = threshold
+        self.store = None
+        self._segment = None
+        self._memory = []
+        self._pool = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def enabled_for(self, store):
+        return self.workers > 1 and len(store) >= self.threshold
+
+    def publish(self, store):
+        """Make store available to the workers; returns False if it is not sharded"""
+        if not self.enabled_for(store):
+            return False
+
+        arrays = {name: np.ascontiguousarray(array) for name, array in store.to_arrays().items()}
+        entries, size = layout_arrays(arrays)
+        memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for name, array in arrays.items():
+            if array.nbytes:
+                np.ndarray(array.shape, array.dtype, buffer=memory.buf, offset=entries[name]['offset'])[...] = array
+
+        with self._lock:
+            # Keep the previous segment for queries still running against it
+            for stale in self._memory[:-1]:
+                stale.close()
+                stale.unlink()
+            self._memory = self._memory[-1:] + [memory]
+            self._segment = (memory.name, entries)
+            self.store = store
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, multiprocessing.get_context(START_METHOD))
+                # Start the workers now rather than from a request thread
+                self._pool.submit(_warm_up).result()
+        return True
+
+    def query(self, store, filters, search, capacity, head):
+        """scan_rows over a published store, or None if store is not published
+
+        filters is (hotel codes, city codes, first day, last day). Each worker
+        scans one row range; their accumulators merge in row order.
+        """
+        with self._lock:
+            if store is not self.store:
+                return None
+            segment = self._segment
+            pool = self._pool
+
+        bounds = np.linspace(0, len(store), self.workers + 1).astype(np.int64)
+        futures = [
+            pool.submit(query_shard, segment, int(start), int(end), filters, search, capacity, head)
+            for start, end in zip(bounds[:-1], bounds[1:]) if end > start
+        ]
+        accumulator = RowAccumulator(store, capacity, head)
+        for future in futures:
+            accumulator.merge(future.result())
+        return accumulator
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+            for memory in self._memory:
+                memory.close()
+                memory.unlink()
+            self._memory = []
+            self.store = None
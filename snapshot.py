@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Binary review snapshots
+Compiles the reviews CSV into one file of aligned NumPy arrays that the app
+memory-maps at startup instead of parsing CSV
+
+Usage: python snapshot.py [data.csv] [data.snapshot]
+
+SENTIMENT_SCORER, SCORER_WORKERS, SENTIMENT_CACHE_FILE and CATEGORY_RULES_FILE
+are read as app.py reads them, so the app finds the snapshot current.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+import numpy as np
+
+from category_classifier import CategoryClassifier
+from ingest import append_csv, file_unchanged, load_csv, scorer_name
+from review_store import ReviewStore
+from sentiment_scorer import LexiconScorer
+
+MAGIC = b'RVWSNAP\x00'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# Magic, header length, CRC32 of the JSON header
+PREAMBLE = struct.Struct('<8sQI')
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is unreadable or written by another format version"""
+
+def _aligned(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def layout_arrays(arrays):
+    """Aligned offsets for storing arrays back to back, returning (entries, total size)"""
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        entries[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+    return entries, offset
+
+def map_arrays(buffer, start, entries):
+    """Arrays stored at start of buffer as described by entries, without copying"""
+    arrays = {}
+    for name, entry in entries.items():
+        dtype = np.dtype(entry['dtype'])
+        shape = tuple(entry['shape'])
+        count = int(np.prod(shape))
+        offset = start + entry['offset']
+        if offset + count * dtype.itemsize > len(buffer):
+            raise SnapshotError(f'array {name} extends past the end of the file')
+        if count:
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+        else:
+            arrays[name] = np.empty(shape, dtype=dtype)
+    return arrays
+
+def write_snapshot(store, snapshot_file, source=None, load_stats=None):
+    """Write store to snapshot_file, recording the fingerprint of its source CSV"""
+    arrays = {name: np.ascontiguousarray(array) for name, array in store.to_arrays().items()}
+    entries, offset = layout_arrays(arrays)
+
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'rows': len(store),
+        'source': source,
+        'load_stats': load_stats or {},
+        'arrays': entries
+    }).encode('utf-8')
+    data_start = _aligned(PREAMBLE.size + len(header))
+
+    # Write next to the target and rename, so readers never see a partial file
+    temp_file = snapshot_file + '.tmp'
+    with open(temp_file, 'wb') as file:
+        file.write(PREAMBLE.pack(MAGIC, len(header), zlib.crc32(header)))
+        file.write(header)
+        for name, array in arrays.items():
+            file.seek(data_start + entries[name]['offset'])
+            file.write(array.tobytes())
+        file.truncate(data_start + offset)
+    os.replace(temp_file, snapshot_file)
+
+def read_snapshot(snapshot_file):
+    """Memory-map a snapshot, returning (store, header)"""
+    with open(snapshot_file, 'rb') as file:
+        preamble = file.read(PREAMBLE.size)
+        if len(preamble) < PREAMBLE.size:
+            raise SnapshotError('truncated preamble')
+        magic, header_length, checksum = PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise SnapshotError('not a review snapshot')
+
+        header_bytes = file.read(header_length)
+        if len(header_bytes) < header_length or zlib.crc32(header_bytes) != checksum:
+            raise SnapshotError('header checksum mismatch')
+        header = json.loads(header_bytes)
+        if header.get('version') != FORMAT_VERSION:
+            raise SnapshotError(f"format version {header.get('version')}, expected {FORMAT_VERSION}")
+
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    arrays = map_arrays(mapped, _aligned(PREAMBLE.size + header_length), header['arrays'])
+    return ReviewStore.from_arrays(arrays), header
+
+def build_snapshot(csv_file, snapshot_file, scorer=None, classifier=None):
+    """Parse csv_file and compile it into snapshot_file, returning (store, load_stats)"""
+    store, load_stats = load_csv(csv_file, scorer=scorer, classifier=classifier)
+    write_snapshot(store, snapshot_file, load_stats['fingerprint'], load_stats)
+    return store, load_stats
+
+def load_dataset(csv_file, snapshot_file, scorer=None, classifier=None):
+    """Load reviews from snapshot_file when it is current, otherwise from csv_file
+
+    When csv_file has only grown since the snapshot was compiled, the appended
+    rows are ingested on top of it; any other change to csv_file, to the
+    scorer filling in missing sentiments or to the category rules rebuilds the
+    snapshot. Without csv_file the snapshot is trusted as is.
+    """
+    status = os.stat(csv_file) if os.path.exists(csv_file) else None
+
+    if os.path.exists(snapshot_file):
+        try:
+            store, header = read_snapshot(snapshot_file)
+            if classifier is not None:
+                store.classifier = classifier
+            same_rules = (header['load_stats'].get('scorer') == scorer_name(scorer) and
+                          header['load_stats'].get('category_rules') == store.classifier.rules_id)
+            if status is None or (file_unchanged(status, header['source'] or {}) and same_rules):
+                print(f"Loaded {header['rows']} reviews from snapshot {snapshot_file}")
+                return store, dict(header['load_stats'], snapshot=snapshot_file)
+
+            load_stats = append_csv(store, csv_file, header['load_stats'], scorer=scorer)
+            if load_stats is not None:
+                print(f"Appended {len(store) - header['rows']} reviews from {csv_file} to snapshot {snapshot_file}")
+                try:
+                    write_snapshot(store, snapshot_file, load_stats['fingerprint'], load_stats)
+                except OSError as e:
+                    print(f"Could not update snapshot {snapshot_file}: {str(e)}")
+                return store, dict(load_stats, snapshot=snapshot_file)
+            print(f"Snapshot {snapshot_file} is stale, rebuilding from {csv_file}")
+        except (SnapshotError, OSError, ValueError) as e:
+            print(f"Ignoring snapshot {snapshot_file}: {str(e)}")
+
+        try:
+            return build_snapshot(csv_file, snapshot_file, scorer, classifier)
+        except OSError as e:
+            # Read-only deployments can still serve from the CSV
+            print(f"Could not rebuild snapshot {snapshot_file}: {str(e)}")
+
+    return load_csv(csv_file, scorer=scorer, classifier=classifier)
+
+if __name__ == '__main__':
+    csv_file = sys.argv[1] if len(sys.argv) > 1 else 'data.csv'
+    snapshot_file = sys.argv[2] if len(sys.argv) > 2 else 'data.snapshot'
+    scorer = None
+    if os.environ.get('SENTIMENT_SCORER', 'none') == 'lexicon':
+        scorer = LexiconScorer(int(os.environ.get('SCORER_WORKERS', 0)), os.environ.get('SENTIMENT_CACHE_FILE'))
+    rules_file = os.environ.get('CATEGORY_RULES_FILE')
+    classifier = CategoryClassifier.from_file(rules_file) if rules_file else None
+
+    store, load_stats = build_snapshot(csv_file, snapshot_file, scorer, classifier)
+    if scorer is not None:
+        scorer.save()
+    print(f"Compiled {len(store)} reviews from {csv_file} into {snapshot_file} "
+          f"({os.path.getsize(snapshot_file)} bytes, {load_stats['malformed']} malformed rows, "
+          f"{load_stats['ragged']} rows with a field count that does not match the header)")
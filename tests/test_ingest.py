@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+CSV ingestion tests
+"""
+
+import os
+
+from ingest import append_csv, load_csv
+
+HEADER = 'hotel_name,city,review_text,sentiment,rating,date,categories,keywords\r\n'
+FIRST = 'Harbor Inn,Lisbon,Lovely view,0.8,5,2024-03-01,Room,view:2\r\n'
+QUOTED = 'Harbor Inn,Lisbon,"Noisy at night,\r\nbut friendly staff",-0.2,3,2024-03-02,Staff,staff:1\r\n'
+
+def edited(row_text, count, row):
+    """count copies of row_text with the review of one row rewritten in place"""
+    return row_text * row + row_text.replace('Lovely', 'Lonely') + row_text * (count - row - 1)
+
+def write(path, text, mode='w'):
+    with open(path, mode, encoding='utf-8', newline='') as f:
+        f.write(text)
+
+def texts(store):
+    return [store.row(i)['review_text'] for i in range(len(store))]
+
+def test_load_stops_before_incomplete_last_row(tmp_path):
+    csv_file = str(tmp_path / 'reviews.csv')
+    partial = QUOTED[:20]
+    write(csv_file, HEADER + FIRST + partial)
+
+    store, stats = load_csv(csv_file)
+    assert len(store) == stats['rows'] == 1
+    assert stats['offset'] == len(HEADER + FIRST)
+
+    write(csv_file, QUOTED[20:], 'a')
+    stats = append_csv(store, csv_file, stats)
+    assert texts(store) == ['Lovely view', 'Noisy at night,\nbut friendly staff']
+    assert stats['rows'] == 2
+
+def test_load_stops_inside_open_quoted_field(tmp_path):
+    csv_file = str(tmp_path / 'reviews.csv')
+    # Ends with a line break, but inside the quoted review text
+    write(csv_file, HEADER + FIRST + QUOTED[:QUOTED.index('\n') + 1])
+
+    store, stats = load_csv(csv_file)
+    assert len(store) == 1
+    assert stats['offset'] == len(HEADER + FIRST)
+
+def test_append_keeps_quoted_newline_for_next_refresh(tmp_path):
+    csv_file = str(tmp_path / 'reviews.csv')
+    write(csv_file, HEADER + FIRST)
+    store, stats = load_csv(csv_file)
+
+    split = QUOTED.index('\n') + 1
+    write(csv_file, QUOTED[:split], 'a')
+    stats = append_csv(store, csv_file, stats)
+    assert len(store) == 1
+    assert stats['offset'] == len(HEADER + FIRST)
+
+    write(csv_file, QUOTED[split:] + FIRST, 'a')
+    stats = append_csv(store, csv_file, stats)
+    assert texts(store) == ['Lovely view', 'Noisy at night,\nbut friendly staff', 'Lovely view']
+    assert stats['offset'] == len(HEADER + FIRST + QUOTED + FIRST)
+
+def test_append_detects_in_place_edit(tmp_path):
+    csv_file = str(tmp_path / 'reviews.csv')
+    write(csv_file, HEADER + FIRST * 30000)
+    store, stats = load_csv(csv_file)
+
+    # Same size, one review rewritten far from the start and end of the file
+    write(csv_file, HEADER + edited(FIRST, 30000, 1500))
+    status = os.stat(csv_file)
+    os.utime(csv_file, ns=(status.st_atime_ns, status.st_mtime_ns + 1))
+    assert append_csv(store, csv_file, stats) is None
+
+def test_append_detects_edit_in_sampled_block(tmp_path):
+    csv_file = str(tmp_path / 'reviews.csv')
+    write(csv_file, HEADER + FIRST * 30000)
+    store, stats = load_csv(csv_file)
+
+    # The last row read before is rewritten, then a row appended
+    write(csv_file, HEADER + edited(FIRST, 30000, 29999) + FIRST)
+    assert append_csv(store, csv_file, stats) is None
+
+def test_append_of_unchanged_file_reads_nothing(tmp_path):
+    csv_file = str(tmp_path / 'reviews.csv')
+    write(csv_file, HEADER + FIRST)
+    store, stats = load_csv(csv_file)
+    assert append_csv(store, csv_file, stats) is stats
+
+def test_field_count_mismatch_is_counted_apart_from_malformed(tmp_path):
+    csv_file = str(tmp_path / 'reviews.csv')
+    short = 'Harbor Inn,Lisbon,Short row,0.1,4\r\n'
+    long = FIRST.replace('\r\n', ',extra\r\n')
+    write(csv_file, HEADER + FIRST + short + long)
+
+    store, stats = load_csv(csv_file)
+    assert texts(store) == ['Lovely view', 'Short row', 'Lovely view']
+    assert stats['ragged'] == 2
+    assert stats['malformed'] == 0
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Keyword counts tests
+"""
+
+import numpy as np
+
+from aggregates import DAY_BITS, DAY_OFFSET
+from keyword_counts import KeywordCounts
+
+def random_rows(count, seed=3):
+    rng = np.random.default_rng(seed)
+    hotel_code = rng.integers(0, 4, count)
+    city_code = rng.integers(0, 2, count)
+    days = rng.integers(19000, 19040, count)
+    lengths = rng.integers(0, 4, count)
+    keyword_offsets = np.r_[0, np.cumsum(lengths)]
+    keyword_ids = rng.integers(0, 12, keyword_offsets[-1]).astype(np.int32)
+    keyword_counts = rng.integers(1, 5, keyword_offsets[-1]).astype(np.int32)
+    return hotel_code, city_code, days, keyword_offsets, keyword_ids, keyword_counts
+
+def entries(keyword_counts):
+    """(hotel, city, day, keyword id) -> (count, first position) of every entry"""
+    arrays = keyword_counts.to_arrays()
+    groups = arrays['cell_keys'] >> DAY_BITS
+    days = (arrays['cell_keys'] & ((1 << DAY_BITS) - 1)) + DAY_OFFSET
+    result = {}
+    for cell, (start, end) in enumerate(zip(arrays['offsets'][:-1], arrays['offsets'][1:])):
+        hotel, city = arrays['groups'][groups[cell]]
+        for i in range(start, end):
+            key = (int(hotel), int(city), int(days[cell]), int(arrays['keyword_ids'][i]))
+            result[key] = (int(arrays['counts'][i]), int(arrays['first'][i]))
+    return result
+
+def test_chunked_updates_match_one_update():
+    hotel_code, city_code, days, keyword_offsets, keyword_ids, keyword_counts = random_rows(2000)
+    whole = KeywordCounts()
+    whole.update(hotel_code, city_code, days, keyword_offsets, keyword_ids, keyword_counts)
+
+    chunked = KeywordCounts()
+    bounds = [0, 1, 7, 300, 301, 1200, 2000]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        chunked.update(hotel_code[start:end], city_code[start:end], days[start:end],
+                       keyword_offsets[start:end + 1], keyword_ids, keyword_counts)
+
+    # Group ids follow first appearance, so compare entries by hotel and city
+    assert len(chunked) == len(whole)
+    assert np.all(np.diff(chunked.to_arrays()['cell_keys']) > 0)
+    assert entries(chunked) == entries(whole)
+    filters = (np.array([1, 2]), None, 19010, 19030)
+    for capacity in [None, 5]:
+        ids, totals = chunked.top(*filters, 8, capacity)
+        expected_ids, expected_totals = whole.top(*filters, 8, capacity)
+        assert ids.tolist() == expected_ids.tolist()
+        assert totals.tolist() == expected_totals.tolist()
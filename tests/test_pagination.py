@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Pagination tests
+"""
+
+import base64
+import json
+import random
+
+import pytest
+
+import pagination
+from pagination import Page, PageError, decode_cursor, encode_cursor, page_row_set, page_search, page_sorted
+from review_store import MAX_DAY, ReviewStore
+
+WORDS = ['clean', 'noisy', 'room', 'staff', 'view', 'breakfast']
+
+def sample_store(count=300, seed=7):
+    rng = random.Random(seed)
+    store = ReviewStore()
+    store.extend([
+        (f'Hotel {rng.randint(1, 3)}', 'Lisbon', ' '.join(rng.sample(WORDS, 2)), rng.choice([0.5, -0.5, float('nan')]),
+         float(rng.randint(1, 5)), f'2024-01-{rng.randint(1, 28):02d}', 'Room', '')
+        for _ in range(count)
+    ])
+    return store.view()
+
+def walk(page_rows, page):
+    """Every row of every page, following cursors"""
+    rows = []
+    while True:
+        page_result, cursor = page_rows(page)
+        rows.extend(int(row) for row in page_result)
+        if cursor is None:
+            return rows
+        sort, descending, after = decode_cursor(cursor)
+        page = Page(sort, descending, after, page.limit)
+
+def test_page_search_matches_sorted_result_set(monkeypatch):
+    store = sample_store()
+    filters = (store.hotels.codes_matching('hotel 2'), None, 0, MAX_DAY)
+    for sorted_candidates in [pagination.SORTED_CANDIDATES, 0]:
+        # 0 makes every search walk the presorted order
+        monkeypatch.setattr(pagination, 'SORTED_CANDIDATES', sorted_candidates)
+        for sort in ['row', 'date', 'sentiment', 'rating']:
+            for descending in [False, True]:
+                for search, search_filters in [('clean', None), ('oom', filters), ('zzz', None)]:
+                    matches = store.search(search, store.filter_mask(*search_filters) if search_filters else None)
+                    page = Page(sort, descending, limit=7)
+                    expected = walk(lambda page: page_row_set(store, matches, page), page)
+                    assert walk(lambda page: page_search(store, page, search, search_filters), page) == expected
+                    assert len(expected) == len(matches)
+
+def raw_cursor(fields):
+    return base64.urlsafe_b64encode(json.dumps(fields).encode('utf-8')).decode('ascii')
+
+def test_decode_cursor_rejects_rows_outside_the_store():
+    assert decode_cursor(encode_cursor('date', True, 19800, 12)) == ('date', True, (19800, 12))
+    for fields in [['row', 0, 0, -1000000000000], ['row', 0, 0, -1], ['row', 0, 0, 1 << 40],
+                   ['row', 0, 0, True], ['date', 0, False, 3], ['rating', 0, '5', 3]]:
+        with pytest.raises(PageError):
+            decode_cursor(raw_cursor(fields))
+
+def test_cursor_on_empty_store():
+    store = ReviewStore().view()
+    for sort in ['row', 'date', 'sentiment', 'rating']:
+        page = Page(sort, False, (0, 0), limit=5)
+        assert page_sorted(store, page, lambda rows: rows >= 0)[0].tolist() == []
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Review store tests
+"""
+
+import numpy as np
+
+from review_store import MAX_DAY, MISSING_DAY, ReviewStore
+from row_scan import scan_rows
+
+NO_FILTERS = (None, None, MISSING_DAY, MAX_DAY)
+
+def review(hotel, city, categories, sentiment=0.5, date='2024-03-01', keywords='staff:2'):
+    return (hotel, city, f'Stayed at {hotel}', sentiment, 4.0, date, categories, keywords)
+
+def test_view_ignores_later_appends():
+    store = ReviewStore()
+    store.extend([review('Harbor Inn', 'Lisbon', 'Room, Staff'), review('Harbor Inn', 'Lisbon', 'Breakfast', -0.5)])
+    view = store.view()
+
+    # New strings in every table after the view was taken
+    store.extend([review('Alpine Lodge', 'Zurich', 'Pool & Spa', 0.9, '2024-04-01', 'sauna:3')])
+
+    assert len(view) == 2
+    assert len(view.categories) == len(view.category_weights) == 2
+    assert len(view.hotels.codes_matching('alpine lodge')) == 0
+
+    summary = view.cube.summarize(*NO_FILTERS, len(view.categories))
+    totals = view.category_weights.T @ summary['category_buckets']
+    assert totals.sum() == 3  # Room, Staff and Breakfast
+
+    accumulator = scan_rows(view, NO_FILTERS)
+    assert accumulator.category_buckets.shape == summary['category_buckets'].shape
+    assert np.array_equal(accumulator.category_buckets, summary['category_buckets'])
+    assert view.vocabulary.values == ['staff']
+
+def test_view_tables_shared_until_growth():
+    store = ReviewStore()
+    store.extend([review('Harbor Inn', 'Lisbon', 'Room')])
+    first = store.view()
+    assert store.view().hotels is first.hotels
+
+    store.extend([review('Alpine Lodge', 'Zurich', 'Room')])
+    second = store.view()
+    assert second.hotels is not first.hotels
+    assert second.hotels.values == ['Harbor Inn', 'Alpine Lodge']
+    assert first.hotels.values == ['Harbor Inn']
+
+def test_failed_append_leaves_columns_unchanged():
+    store = ReviewStore()
+    store.extend([review('Harbor Inn', 'Lisbon', 'Room')])
+    for field, value in [(4, 'n/a'), (2, None)]:
+        broken = list(review('Alpine Lodge', 'Zurich', 'Pool & Spa'))
+        broken[field] = value
+        try:
+            store.append(*broken)
+        except (TypeError, ValueError, AttributeError):
+            pass
+        else:
+            raise AssertionError('append accepted a broken review')
+
+    store.extend([review('Alpine Lodge', 'Zurich', 'Pool & Spa')])
+    view = store.view()
+    assert len(view) == len(view.rating) == len(view.hotel_code) == len(view.text_index) == 2
+    assert len(view.categories) == len(view.category_weights) == 2
+    assert list(view.search('alpine')) == [1]
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Snapshot tests
+"""
+
+import os
+
+from snapshot import build_snapshot, load_dataset
+from test_ingest import FIRST, HEADER, edited, texts, write
+
+def test_in_place_edit_rebuilds_snapshot(tmp_path):
+    csv_file = str(tmp_path / 'reviews.csv')
+    snapshot_file = str(tmp_path / 'reviews.snapshot')
+    write(csv_file, HEADER + FIRST * 30000)
+    build_snapshot(csv_file, snapshot_file)
+
+    # Same size, one review rewritten far from the start and end of the file
+    write(csv_file, HEADER + edited(FIRST, 30000, 1500))
+    status = os.stat(csv_file)
+    os.utime(csv_file, ns=(status.st_atime_ns, status.st_mtime_ns + 1))
+
+    store, stats = load_dataset(csv_file, snapshot_file)
+    assert store.row(1500)['review_text'] == 'Lonely view'
+    assert 'snapshot' not in stats
+
+def test_appended_rows_extend_snapshot(tmp_path):
+    csv_file = str(tmp_path / 'reviews.csv')
+    snapshot_file = str(tmp_path / 'reviews.snapshot')
+    write(csv_file, HEADER + FIRST)
+    build_snapshot(csv_file, snapshot_file)
+
+    write(csv_file, FIRST.replace('Lovely', 'Lonely'), 'a')
+    store, stats = load_dataset(csv_file, snapshot_file)
+    assert texts(store) == ['Lovely view', 'Lonely view']
+    assert stats['snapshot'] == snapshot_file
+
+    store, stats = load_dataset(csv_file, snapshot_file)
+    assert len(store) == 2